@@ -0,0 +1,254 @@
+""" This module reduces rasters over non-overlapping blocks of cells with NumPy
+
+A block of f x g cells is reduced by reshaping the array to (rows/f, f, cols/g, g)
+and reducing the two within-block axes in one vectorised operation, so several
+statistics and cell factors are produced from a single read of the source.
+
+As with the Spatial Analyst Aggregate and Block Statistics tools the blocks start
+at the lower left corner of the raster. Rows or columns that do not fill a block
+at the top or right are padded with NoData (EXPAND) or dropped (TRUNCATE).
+
+Aggregated outputs have one cell per block (Aggregate). Block statistics outputs
+keep the source cells, each set to the value of its block (Block Statistics).
+
+"""
+from base import blocks
+from copy import copy
+from fractions import gcd
+import numpy as np
+
+
+block_statistics = ["SUM", "MEAN", "MAXIMUM", "MINIMUM", "MEDIAN", "RANGE", "STD"]
+
+MAX_STEP = 4 * blocks.BLOCK_SIZE  # factors with a larger common multiple are read in separate passes
+
+
+def lcm(values):
+    """ The least common multiple of integers
+
+    Args:
+        values: The integers
+
+    Returns:
+        int
+
+    """
+
+    return reduce(lambda a, b: a * b // gcd(a, b), values, 1)
+
+
+def aggregated_grid(grid, factor_rows, factor_cols, expand=True):
+    """ The grid of an aggregated raster
+
+    Args:
+        grid: RasterGrid of the source
+        factor_rows: Rows per block
+        factor_cols: Columns per block
+        expand: Round partial blocks up (EXPAND) rather than down (TRUNCATE)
+
+    Returns:
+        RasterGrid with the lower left corner of the source
+
+    """
+
+    rnd = (lambda n, f: -(-n // f)) if expand else (lambda n, f: n // f)
+
+    out = copy(grid)
+    out.rows = rnd(grid.rows, factor_rows)
+    out.cols = rnd(grid.cols, factor_cols)
+    out.cell_width = grid.cell_width * factor_cols
+    out.cell_height = grid.cell_height * factor_rows
+    out.x_max = grid.x_min + out.cols * out.cell_width
+    out.y_max = grid.y_min + out.rows * out.cell_height
+
+    return out
+
+
+def reduced_dtype(statistic, dtype):
+    """ The cell type of a block statistic
+
+    Args:
+        statistic: Name from block_statistics
+        dtype: The source cell type
+
+    Returns:
+        numpy dtype
+
+    """
+
+    dtype = np.dtype(dtype)
+
+    if dtype.kind in "iub" and statistic in ["MAXIMUM", "MINIMUM"]:
+        return dtype
+
+    if dtype.kind in "iub" and statistic in ["SUM", "RANGE"]:
+        return np.dtype("int32")
+
+    return np.dtype("float32")
+
+
+def block_cells(block, factor_rows, factor_cols, expand=True, pad_is_nodata=True):
+    """ View a block as (block rows, block cols, cells per block)
+
+    Args:
+        block: Masked array, its bottom left cell starts a block
+        factor_rows: Rows per block
+        factor_cols: Columns per block
+        expand: Pad partial blocks at the top and right with masked cells, else drop them
+        pad_is_nodata: Count padding cells as NoData
+
+    Returns:
+        (masked cells, NoData flag per block)
+
+    """
+
+    nrows, ncols = block.shape
+    mask = np.ma.getmaskarray(block)
+
+    if expand:
+        pad_rows, pad_cols = -nrows % factor_rows, -ncols % factor_cols
+        if pad_rows or pad_cols:
+            data = np.zeros((nrows + pad_rows, ncols + pad_cols), dtype=block.dtype)
+            padded = np.ones(data.shape, dtype=bool)
+            data[pad_rows:, :ncols] = np.ma.getdata(block)
+            padded[pad_rows:, :ncols] = mask
+            nodata = padded.copy()
+            if not pad_is_nodata:
+                nodata[:pad_rows, :] = False
+                nodata[:, ncols:] = False
+            block, mask = np.ma.masked_array(data, padded), nodata
+    else:
+        keep_rows, keep_cols = nrows - nrows % factor_rows, ncols - ncols % factor_cols
+        block, mask = block[nrows - keep_rows:, :keep_cols], mask[nrows - keep_rows:, :keep_cols]
+
+    r, c = block.shape[0] // factor_rows, block.shape[1] // factor_cols
+    shape = (r, factor_rows, c, factor_cols)
+
+    cells = block.reshape(shape).transpose(0, 2, 1, 3).reshape(r, c, factor_rows * factor_cols)
+    nodata = mask.reshape(shape).any(axis=3).any(axis=1)
+
+    return cells, nodata
+
+
+def reduce_cells(cells, statistic):
+    """ Reduce the last axis of masked cells
+
+    Args:
+        cells: Masked array from block_cells
+        statistic: Name from block_statistics
+
+    Returns:
+        Masked array, masked where a block has no values
+
+    """
+
+    if statistic == "SUM":
+        return cells.sum(axis=-1)
+    if statistic == "MEAN":
+        return cells.mean(axis=-1)
+    if statistic == "MAXIMUM":
+        return cells.max(axis=-1)
+    if statistic == "MINIMUM":
+        return cells.min(axis=-1)
+    if statistic == "RANGE":
+        return cells.max(axis=-1) - cells.min(axis=-1)
+    if statistic == "STD":
+        return cells.std(axis=-1)
+    if statistic == "MEDIAN":
+        return np.ma.median(cells, axis=-1)
+
+    raise ValueError("Block statistic '{}' is not one of {}".format(statistic, block_statistics))
+
+
+class BlockReduction(object):
+    """ One output of reduce_raster: a statistic over blocks of a given size
+    """
+
+    def __init__(self, out_raster, statistic, factor_rows, factor_cols=None):
+        """
+
+        Args:
+            out_raster: Path of the raster to create
+            statistic: Name from block_statistics
+            factor_rows: Rows per block
+            factor_cols: Columns per block, factor_rows if None
+        """
+
+        if statistic not in block_statistics:
+            raise ValueError("Block statistic '{}' is not one of {}".format(statistic, block_statistics))
+
+        self.out_raster = out_raster
+        self.statistic = statistic
+        self.factor_rows = int(factor_rows)
+        self.factor_cols = int(factor_cols or factor_rows)
+
+        return
+
+
+def reduce_raster(grid, reductions, ignore_nodata="DATA", expand=True, repeat=False, block_size=blocks.BLOCK_SIZE):
+    """ Read a raster once and write a raster for each block reduction
+
+    Args:
+        grid: RasterGrid of the source
+        reductions: list of BlockReduction
+        ignore_nodata: 'DATA' reduces the values in a block, 'NODATA' gives NoData for blocks holding NoData
+        expand: Pad partial blocks (EXPAND) rather than drop them (TRUNCATE)
+        repeat: Write each block value to all its cells (Block Statistics) rather than to one cell (Aggregate)
+        block_size: Approximate rows and columns read at a time
+
+    Returns:
+        list of output rasters
+
+    """
+
+    step = lcm([r.factor_rows for r in reductions] + [r.factor_cols for r in reductions])
+
+    by_factor = {}
+    for r in reductions:
+        by_factor.setdefault((r.factor_rows, r.factor_cols), []).append(r)
+
+    if step > MAX_STEP and len(by_factor) > 1:  # factors don't share a practical block size, read once per factor
+        for group in by_factor.itervalues():
+            reduce_raster(grid, group, ignore_nodata, expand, repeat, block_size)
+        return [r.out_raster for r in reductions]
+
+    size = max(step, block_size // step * step)
+
+    writers = []
+    for r in reductions:
+        out_grid = grid if repeat else aggregated_grid(grid, r.factor_rows, r.factor_cols, expand)
+        dtype = reduced_dtype(r.statistic, grid.dtype)
+        # MAXIMUM and MINIMUM are source values so the source NoData can't be one, other types are widened
+        nodata = grid.nodata if r.statistic in ["MAXIMUM", "MINIMUM"] and blocks.can_hold(dtype, grid.nodata) else None
+        writers.append((r, out_grid, blocks.BlockWriter(r.out_raster, out_grid, dtype, nodata)))
+
+    # windows run up from the bottom so every window starts on a block boundary for every factor
+    for bottom in xrange(grid.rows, 0, -size):
+        top = max(bottom - size, 0)
+
+        for col in xrange(0, grid.cols, size):
+            window = (top, col, bottom - top, min(size, grid.cols - col))
+            block = blocks.read_block(grid, window)
+
+            for r, out_grid, writer in writers:
+                cells, nodata = block_cells(block, r.factor_rows, r.factor_cols, expand or repeat, not repeat)
+                if not cells.size:
+                    continue
+
+                values = reduce_cells(cells, r.statistic)
+                if ignore_nodata == "NODATA":
+                    values = np.ma.masked_where(nodata, values)
+
+                if repeat:  # back to the source cells, dropping the padding
+                    values = values.repeat(r.factor_rows, axis=0).repeat(r.factor_cols, axis=1)
+                    writer.write(window, values[values.shape[0] - window[2]:, :window[3]])
+
+                else:
+                    out_rows, out_cols = values.shape
+                    out_row = out_grid.rows - (grid.rows - bottom) // r.factor_rows - out_rows
+                    writer.write((out_row, col // r.factor_cols, out_rows, out_cols), values)
+
+    for r, out_grid, writer in writers:
+        writer.close()
+
+    return [r.out_raster for r in reductions]
@@ -17,18 +17,24 @@ Implementation
 """
 
 from __future__ import print_function
-from utils import make_tuple, is_local_gdb
+from utils import make_tuple, is_local_gdb, describe_cache, DESCRIBE_CACHE_FILE, name_allocator
 from sys import exc_info
 from traceback import format_exception
+import os
 from os import environ, makedirs
 from os.path import join, exists
 from contextlib import contextmanager
 from functools import wraps
+from importlib import import_module
+import multiprocessing
+import sys
+import pickle
 import arcpy
 import logging
-from base.results import GgResult
+from base.results import GgResult, GgResultCollector
 from datetime import datetime
 from collections import OrderedDict
+from threading import BoundedSemaphore, Event
 
 
 debug = print  # updated to logger.debug after logging is configured
@@ -160,6 +166,13 @@ class ArcStreamHandler(logging.StreamHandler):
 class BaseTool(object):
     """ Tool base class
     """
+
+    # tools that accumulate state across rows (rather than returning or adding results) must set this False
+    supports_workers = True
+
+    # attributes that are never sent to pool workers
+    worker_excluded_attributes = ["parameters", "messages", "result", "logger", "debug", "info", "warn", "error", "execution_list"]
+
     def __init__(self, settings):
         """Add basic attributes and customise tool parameters from settings
 
@@ -445,6 +458,14 @@ class BaseTool(object):
         if not self.messages:  # stop run errors during ide tests
             return
 
+        describe_cache.clear()
+        describe_cache.reset_stats()
+        name_allocator.reset()
+        try:
+            describe_cache.open_store(join(self.appdata_path, DESCRIBE_CACHE_FILE))
+        except Exception as e:
+            self.warn("Describe cache store not available, caching in memory only: {}".format(e))
+
         self.info(["\n", "Parameter summary: {}".format(["{} ({}): {}".format(p.DisplayName, p.name, p.valueAsText) for p in self.parameters]), "\n"])
 
         # set the input parameters as local attributes
@@ -452,7 +473,7 @@ class BaseTool(object):
         self.info(["\n", "Tool attributes set {}".format(self.__dict__), "\n"])
 
         try:
-            self.result.initialise(self.get_parameter("result_table"), self.get_parameter("fail_table"), self.get_parameter("output_workspace").value, self.get_parameter("result_table_name").value, self.logger)
+            self.result.initialise(self.get_parameter("result_table"), self.get_parameter("fail_table"), self.get_parameter("output_workspace").value, self.get_parameter("result_table_name").value, self.logger, getattr(self, "resume", False))
 
             if hasattr(self, "output_file_workspace") and self.output_file_workspace in [None, "", "#"]:
                     self.output_file_workspace = self.result.output_workspace
@@ -460,9 +481,14 @@ class BaseTool(object):
         except AttributeError:
             pass
 
-        for f in self.execution_list:
-            f = log_error(f)
-            f()
+        try:
+            for f in self.execution_list:
+                f = log_error(f)
+                f()
+
+        except:
+            self.result.close()  # keep the records written so far
+            raise
 
         try:
             self.result.write()
@@ -470,6 +496,8 @@ class BaseTool(object):
         except (TypeError, AttributeError):
             pass
 
+        self.info(describe_cache.stats())
+
         return
 
     def get_parameter_dict(self, leave_as_object=(), parameters=()):
@@ -576,9 +604,14 @@ class BaseTool(object):
         self.info("fm = {}".format(field_map))
         self.info("fmv = {}".format(field_map.values()))
 
-        rows = [r for r in arcpy.da.SearchCursor(param.name, field_map.values())]
+        try:
+            total_rows = int(arcpy.GetCount_management(param.name).getOutput(0))
+        except Exception:
+            total_rows = None
+
+        key_name = field_alias[0] if field_alias else None  # the data type field e.g. 'raster'
 
-        self.do_iteration(func, rows, field_map, return_to_results)
+        self.do_iteration(func, iterate_cursor(param.name, field_map.values()), field_map, return_to_results, key_name, total_rows)
 
         return
 
@@ -612,51 +645,354 @@ class BaseTool(object):
 
         self.debug("Processing rows will be {}".format(rows))
 
+        key_name = key_names[0] if key_names else None
         key_names = {v: v for v in key_names}
 
-        self.do_iteration(func, rows, key_names, return_to_results)
+        self.do_iteration(func, rows, key_names, return_to_results, key_name)
 
         return
 
-    def do_iteration(self, func, rows, name_vals, return_to_results):
+    def do_iteration(self, func, rows, name_vals, return_to_results, key_name=None, total_rows=None):
         """ Iterates a function over the provided rows
 
         The function is usually defined in descendant classes, which can
         assume that the function is called for each row in the input table
 
+        Rows are consumed lazily so they can be streamed from a cursor, and
+        when resuming a run, rows already finished are skipped
+
         Args:
             func (function):
-            rows (list):
+            rows (iterable):
             name_vals (list):
             return_to_results (boolean): Flag indicating if returned object should be passed on as a result record
+            key_name (string): Name of the value identifying a row, used when resuming
+            total_rows (int): Number of rows if known, only used for progress messages
 
         Returns:
             :
         """
 
-        if not rows:
+        fname = func.__name__
+        names = name_vals.keys()
+
+        if self.result.resumed and not key_name:
+            raise ValueError("{} has no key to find the rows finished by the run being resumed".format(fname))
+
+        if total_rows is None and isinstance(rows, (list, tuple)):
+            total_rows = len(rows)
+
+        if total_rows is not None:
+            self.info("{} items to process".format(total_rows))
+
+        self.rows_read = self.rows_skipped = 0
+
+        def row_dicts():
+            """ Make row dictionaries on the fly, skipping finished rows when resuming """
+
+            for row in rows:
+                self.rows_read += 1
+                row = {k: v for k, v in zip(names, make_tuple(row))}
+
+                if self.result.resumed and self.result.is_finished(row, key_name):
+                    self.rows_skipped += 1
+                    continue
+
+                yield row
+
+        workers = getattr(self, "workers", None) or 1
+
+        if workers > 1 and not self.supports_workers:
+            self.warn("{} does not support worker processes, processing serially".format(self.tool_name))
+            workers = 1
+
+        elif workers > 1 and getattr(func, "__self__", None) is not self:
+            self.warn("{} is not a method of the tool, processing serially".format(fname))
+            workers = 1
+
+        if workers > 1:
+
+            self.do_pool_iteration(fname, row_dicts(), return_to_results, workers, total_rows)
+
+        else:
+
+            for row_num, row in enumerate(row_dicts(), start=1):
+                try:
+                    self.info("{} > Processing row {}".format(time_stamp("%H:%M:%S%f")[:-3], progress(row_num, total_rows, self.rows_skipped)))
+                    self.debug("Running {} with row={}".format(fname, row))
+
+                    res = func(row)
+
+                    if return_to_results:
+
+                        self.result.add_pass(res)
+
+                except Exception as e:
+
+                    self.error("error executing {}: {}".format(fname, str(e)))
+                    self.result.add_fail(row)
+
+        if not self.rows_read:
             raise ValueError("No values or records to process.")
 
-        fname = func.__name__
+        if self.rows_skipped:
+            self.info("{} of {} items were already processed".format(self.rows_skipped, self.rows_read))
+
+        return
+
+    def do_pool_iteration(self, fname, rows, return_to_results, workers, total_rows=None):
+        """ Iterates a tool method over the provided rows on a pool of worker processes
 
-        rows = [{k: v for k, v in zip(name_vals.keys(), make_tuple(row))} for row in rows]
-        total_rows = len(rows)
-        self.info("{} items to process".format(total_rows))
+        Each worker builds its own instance of the tool from the tool's
+        picklable attributes. Pass and fail records are sent back and written
+        to the result here, in input row order, so the final tables match a serial run
 
-        for row_num, row in enumerate(rows, start=1):
+        Rows are handed to the pool through a bounded window so a streamed
+        input is not read far ahead of the workers
+
+        Args:
+            fname (string): Name of the tool method
+            rows (iterable): Row dictionaries
+            return_to_results (boolean): Flag indicating if returned object should be passed on as a result record
+            workers (int): Requested number of worker processes
+            total_rows (int): Number of rows if known, only used for progress messages
+
+        Returns:
+            :
+        """
+
+        workers = min(workers, multiprocessing.cpu_count(), total_rows or workers)
+
+        self.info("Processing on {} worker processes".format(workers))
+
+        # in-process tools run inside ArcMap.exe, workers must be python processes
+        if not os.path.basename(sys.executable).lower().startswith("python"):
+            multiprocessing.set_executable(join(sys.exec_prefix, "pythonw.exe"))
+
+        # output name reservations are shared so workers cannot hand out the same name
+        manager = multiprocessing.Manager()
+        reserved = manager.dict(name_allocator.reserved)
+
+        cls = type(self)
+        init_args = (cls.__module__, cls.__name__, self.get_worker_state(), list(sys.path), self.log_file, reserved, manager.Lock())
+
+        window = BoundedSemaphore(workers * 4)
+        stop = Event()
+
+        def tasks():
+            """ Yield tasks, blocking while the window is full, until stopped """
+
+            for row in rows:
+                window.acquire()
+                if stop.is_set():
+                    return
+                yield fname, row, return_to_results
+
+        pool = multiprocessing.Pool(workers, pool_initialiser, init_args)
+
+        try:
+            for row_num, (row, records) in enumerate(pool.imap(pool_run_row, tasks()), start=1):
+
+                window.release()
+
+                self.info("{} > Processed row {}".format(time_stamp("%H:%M:%S%f")[:-3], progress(row_num, total_rows, self.rows_skipped)))
+
+                try:
+                    for kind, payload in records:
+                        if kind == "pass":
+                            self.result.add_pass(payload)
+                        else:
+                            self.result.add_fail(*payload)
+
+                except Exception as e:
+
+                    self.error("error recording result for row {}: {}".format(row_num, str(e)))
+                    self.result.add_fail(row)
+
+            pool.close()
+
+        except:
+            # terminate joins the pool's task thread, which may be waiting on the window in tasks()
+            stop.set()
             try:
-                self.info("{} > Processing row {} of {}".format(time_stamp("%H:%M:%S%f")[:-3], row_num, total_rows))
-                self.debug("Running {} with row={}".format(fname, row))
+                window.release()
+            except ValueError:  # the window is not full
+                pass
+            pool.terminate()
+            raise
+
+        finally:
+            pool.join()
+            name_allocator.reserved.update(reserved.items())
+            manager.shutdown()
 
-                res = func(row)
+        return
 
-                if return_to_results:
+    def get_worker_state(self):
+        """ Return the tool attributes that can be sent to a worker process
 
-                    self.result.add_pass(res)
+        Returns:
+            dict: name/value pairs
+        """
 
-            except Exception as e:
+        state = {}
+        dropped = []
 
-                self.error("error executing {}: {}".format(fname, str(e)))
-                self.result.add_fail(row)
+        for k, v in self.__dict__.iteritems():
+
+            if k in self.worker_excluded_attributes:
+                continue
+
+            try:
+                pickle.dumps(v, pickle.HIGHEST_PROTOCOL)
+                state[k] = v
+            except Exception:
+                dropped.append(k)
+
+        if dropped:
+            self.debug("Attributes not sent to workers: {}".format(dropped))
+
+        return state
+
+    def initialise_worker(self):
+        """ Hook for tools to rebuild attributes that could not be sent to a worker process
+
+        Returns:
+            :
+        """
 
         return
+
+    def configure_worker_logging(self):
+        """ Configure logging for the tool inside a worker process, to file only
+
+        Returns:
+            :
+        """
+
+        logger = logging.getLogger(self.tool_name)
+        logger.handlers = []
+        logger.setLevel(logging.DEBUG)
+
+        root, ext = os.path.splitext(self.log_file)
+        file_handler = logging.FileHandler("{}_worker_{}{}".format(root, os.getpid(), ext))
+        file_handler.setLevel(logging.DEBUG)
+        formatter = logging.Formatter(fmt="%(asctime)s.%(msecs)03d %(levelname)s %(module)s %(funcName)s %(lineno)s %(message)s", datefmt="%Y%m%d %H%M%S")
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
+
+        self.logger = logger
+        self.debug = logger.debug
+        self.info = logger.info
+        self.warn = logger.warn
+        self.error = logger.error
+
+        return
+
+
+worker_tool = None  # the tool instance in a worker process
+
+
+def pool_initialiser(module_name, class_name, state, paths, log_file, reserved, lock):
+    """ Pool initialiser, builds the tool instance for this worker process
+
+    Args:
+        module_name (string): Module of the tool class
+        class_name (string): Name of the tool class
+        state (dict): Tool attributes from the parent process
+        paths (list): sys.path of the parent process, so the tool modules resolve
+        log_file (string): Parent log file
+        reserved (dict): Output name reservations shared between the workers
+        lock (Lock): Lock for the reservations
+
+    Returns:
+        :
+    """
+
+    global worker_tool
+
+    for p in reversed(paths):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+
+    tool = getattr(import_module(module_name), class_name)()
+    tool.__dict__.update(state)
+    tool.log_file = log_file
+    tool.configure_worker_logging()
+    tool.result = GgResultCollector()
+
+    name_allocator.share(reserved, lock)
+
+    try:
+        describe_cache.open_store(join(tool.appdata_path, DESCRIBE_CACHE_FILE))
+    except Exception as e:
+        tool.warn("Describe cache store not available, caching in memory only: {}".format(e))
+
+    tool.initialise_worker()
+
+    worker_tool = tool
+
+    return
+
+
+def pool_run_row(task):
+    """ Run a tool method on a row inside a worker process
+
+    Args:
+        task (tuple): method name, row, return_to_results flag
+
+    Returns:
+        tuple: the row and its (kind, payload) result records
+    """
+
+    fname, row, return_to_results = task
+    tool = worker_tool
+
+    try:
+        tool.debug("Running {} with row={}".format(fname, row))
+
+        res = getattr(tool, fname)(row)
+
+        if return_to_results:
+
+            tool.result.add_pass(res)
+
+    except Exception as e:
+
+        tool.error("error executing {}: {}".format(fname, str(e)))
+        tool.result.add_fail(row)
+
+    return row, tool.result.drain()
+
+
+def iterate_cursor(table, field_names):
+    """ Yield rows from a search cursor, one at a time
+
+    Args:
+        table (string): Table or table view
+        field_names (list): Fields to read
+
+    Returns:
+        generator: rows
+    """
+
+    with arcpy.da.SearchCursor(table, field_names) as cursor:
+        for row in cursor:
+            yield row
+
+
+def progress(row_num, total_rows=None, skipped=0):
+    """ Format a progress string for a row
+
+    Args:
+        row_num (int): Number of rows processed, including this one
+        total_rows (int): Number of rows in the input, if known
+        skipped (int): Number of rows skipped so far (when resuming)
+
+    Returns:
+        string: e.g. '12 of 100'
+    """
+
+    row_num += skipped
+
+    return "{} of {}".format(row_num, total_rows) if total_rows else str(row_num)
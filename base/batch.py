@@ -0,0 +1,237 @@
+""" This module runs Grid Garage tools without ArcMap, driven by a job file
+
+A job file is JSON (or YAML, if PyYAML is installed) describing one job or a
+list of them. Each job names a registered tool class and gives its parameter
+values by parameter name, optionally with arcpy environment settings:
+
+    {"tool": "CopyRasterTool",
+     "environment": {"overwriteOutput": true},
+     "parameters": {"geodata_table": "C:/data/rasters.gdb/list",
+                    "raster_format": "tif",
+                    "output_workspace": "C:/data/out.gdb"}}
+
+Parameters that are left out keep the tool's defaults. Multi-value parameters
+can be given as lists. Run from the toolbox folder with:
+
+    python -m base.batch job.json [job2.json ...]
+
+The exit status is 0 if every job ran without a failure, 1 if any rows
+failed and 2 if a job could not be run at all.
+
+"""
+from __future__ import print_function
+from os.path import splitext
+import json
+import sys
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_ERROR = 2
+
+
+class ConsoleMessages(object):
+    """ Stand-in for the ArcGIS messages object that writes to the console
+    """
+
+    def __init__(self, out=sys.stdout, err=sys.stderr):
+        """
+
+        Args:
+            out: Stream for messages
+            err: Stream for warnings and errors
+        """
+
+        self.out = out
+        self.err = err
+        self.warning_count = 0
+        self.error_count = 0
+
+    def addMessage(self, message):
+        """ Print a message """
+
+        print(message, file=self.out)
+
+    def addWarningMessage(self, message):
+        """ Print and count a warning """
+
+        self.warning_count += 1
+        print("WARNING: {}".format(message), file=self.err)
+
+    def addErrorMessage(self, message):
+        """ Print and count an error """
+
+        self.error_count += 1
+        print("ERROR: {}".format(message), file=self.err)
+
+    def addIDMessage(self, message_type, message_id, add_argument1=None, add_argument2=None):
+        """ Print a message identified by an ArcGIS message id """
+
+        msg = "ID {} {}".format(message_id, " ".join(str(a) for a in (add_argument1, add_argument2) if a is not None))
+        {"ERROR": self.addErrorMessage, "WARNING": self.addWarningMessage}.get(message_type, self.addMessage)(msg)
+
+    def addGPMessages(self):
+        """ Geoprocessing messages are already in the log, nothing to do """
+
+        pass
+
+
+def load_jobs(job_file):
+    """ Read the jobs from a JSON or YAML job file
+
+    Args:
+        job_file: Path to the job file
+
+    Returns:
+        list of job dictionaries
+
+    """
+
+    with open(job_file) as f:
+        if splitext(job_file)[1].lower() in (".yaml", ".yml"):
+            if not yaml:
+                raise ValueError("Reading '{}' requires PyYAML".format(job_file))
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    if isinstance(spec, dict):
+        spec = spec.get("jobs", [spec])
+
+    for job in spec:
+        if not isinstance(job, dict) or "tool" not in job:
+            raise ValueError("Each job in '{}' must name a 'tool'".format(job_file))
+
+    return spec
+
+
+def as_parameter_value(value):
+    """ Convert a job file value to something a Parameter accepts
+
+    Args:
+        value: The value from the job file
+
+    Returns:
+        The parameter value
+
+    """
+
+    if isinstance(value, (list, tuple)):
+        return u";".join(unicode(as_parameter_value(v)) for v in value)
+
+    if isinstance(value, bool):
+        return "true" if value else "false"
+
+    return value
+
+
+def set_parameters(tool, values):
+    """ Build a tool's parameters and set them from a name:value dictionary
+
+    Args:
+        tool: The tool instance
+        values: Parameter values by parameter name
+
+    Returns:
+        list of parameter objects
+
+    """
+
+    parameters = tool.getParameterInfo()
+    by_name = dict((p.name, p) for p in parameters)
+
+    unknown = [k for k in values if k not in by_name]
+    if unknown:
+        raise ValueError("{} has no parameters {}, expected some of {}".format(tool.tool_name, unknown, [p.name for p in parameters]))
+
+    for k, v in values.iteritems():
+        by_name[k].value = as_parameter_value(v)
+
+    tool.updateParameters(parameters)
+
+    missing = [p.name for p in parameters if p.parameterType == "Required" and p.valueAsText in [None, "", "#"]]
+    if missing:
+        raise ValueError("{} is missing required parameters {}".format(tool.tool_name, missing))
+
+    return parameters
+
+
+def run_job(job, messages=None):
+    """ Run a single job
+
+    Args:
+        job: Job dictionary with 'tool', 'parameters' and optional 'environment'
+        messages: Messages object, a ConsoleMessages by default
+
+    Returns:
+        The exit status for the job
+
+    """
+
+    from tools.registry import find_tool  # deferred, importing tools imports arcpy
+    import arcpy
+
+    messages = messages or ConsoleMessages()
+
+    tool = find_tool(job["tool"])()
+
+    for k, v in job.get("environment", {}).iteritems():
+        setattr(arcpy.env, k, v)
+
+    parameters = set_parameters(tool, job.get("parameters", {}))
+
+    tool.execute(parameters, messages)
+
+    fail_count = getattr(tool.result, "fail_count", 0)
+    if fail_count or getattr(messages, "error_count", 0):
+        messages.addErrorMessage("{} finished with {} failures".format(tool.tool_name, fail_count))
+        return EXIT_FAILURES
+
+    return EXIT_OK
+
+
+def main(argv=None):
+    """ Command line entry point
+
+    Args:
+        argv: Job file paths, sys.argv[1:] by default
+
+    Returns:
+        The exit status
+
+    """
+
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv or argv[0] in ("-h", "--help"):
+        print(__doc__)
+        return EXIT_ERROR if not argv else EXIT_OK
+
+    status = EXIT_OK
+
+    for job_file in argv:
+        try:
+            jobs = load_jobs(job_file)
+        except Exception as e:
+            print("ERROR: cannot read '{}': {}".format(job_file, e), file=sys.stderr)
+            status = EXIT_ERROR
+            continue
+
+        for i, job in enumerate(jobs, 1):
+            print("Job {} of {} in '{}': {}".format(i, len(jobs), job_file, job["tool"]))
+            try:
+                status = max(status, run_job(job))
+            except Exception as e:
+                print("ERROR: {}".format(e), file=sys.stderr)
+                status = EXIT_ERROR
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
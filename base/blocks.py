@@ -0,0 +1,622 @@
+""" This module provides block-wise NumPy access to rasters
+
+Rasters are read a block at a time with arcpy.RasterToNumPyArray, so memory is
+bounded by the block size rather than the raster size. Blocks come back as
+masked arrays with NoData cells masked.
+
+Output rasters are written a block at a time too, BlockWriter converts each
+block to a temporary raster and mosaics it into the output, so scratch space is
+also bounded by the block size.
+
+StreamingStatistics accumulates count, mean, standard deviation, minimum and
+maximum over blocks in one pass (Welford / Chan et al. pairwise update), giving
+the same figures as GetRasterProperties_management without calculating (and
+saving) statistics on the source raster.
+
+"""
+import arcpy
+import numpy as np
+
+
+BLOCK_SIZE = 2048  # rows and columns per block, 2048 x 2048 float64 is 32MB
+
+numpy_types = {"U1": "uint8", "U2": "uint8", "U4": "uint8", "U8": "uint8", "S8": "int8", "U16": "uint16", "S16": "int16",
+               "U32": "uint32", "S32": "int32", "F32": "float32", "F64": "float64"}
+
+
+widened_types = {"b": "uint8", "i1": "int16", "u1": "int16", "i2": "int32", "u2": "int32", "u4": "float64", "i8": "float64", "u8": "float64"}
+
+
+def default_nodata(dtype):
+    """ A cell type and NoData value for writing arrays of the given type
+
+    NoData must not be a value the array can hold, so integer types are widened
+    (e.g. uint8 is written as int16) and NoData is the lowest value of the wider
+    type. 32 bit signed integers keep their lowest value, the ArcGIS default.
+
+    Args:
+        dtype: A numpy dtype
+
+    Returns:
+        (dtype, NoData value)
+
+    """
+
+    dtype = np.dtype(dtype)
+
+    if dtype.kind == "f":
+        return dtype, float(np.finfo(np.float32 if dtype.itemsize <= 4 else dtype).min)
+
+    out = np.dtype(widened_types.get("b" if dtype.kind == "b" else dtype.str[1:], dtype))
+
+    if out.kind == "f":
+        return out, float(np.finfo(out).min)
+
+    return out, int(255 if dtype.kind == "b" else np.iinfo(out).min)
+
+
+def can_hold(dtype, value):
+    """ Can an array of the given type hold a value
+
+    Args:
+        dtype: A numpy dtype
+        value: The value, None is never held
+
+    Returns:
+        bool
+
+    """
+
+    dtype = np.dtype(dtype)
+
+    if value is None:
+        return False
+
+    if dtype.kind == "f":
+        return bool(np.isfinite(value)) and abs(value) <= np.finfo(dtype).max
+
+    if dtype.kind in "iu":
+        return value == int(value) and np.iinfo(dtype).min <= value <= np.iinfo(dtype).max
+
+    return False
+
+
+class RasterGrid(object):
+    """ The geometry and cell type of a raster, read once
+    """
+
+    def __init__(self, raster):
+        """
+
+        Args:
+            raster: Path to a raster or raster band
+        """
+
+        ras = arcpy.Raster(raster)
+
+        self.raster = raster
+        self.rows = ras.height
+        self.cols = ras.width
+        self.cell_width = ras.meanCellWidth
+        self.cell_height = ras.meanCellHeight
+        self.x_min = ras.extent.XMin
+        self.y_min = ras.extent.YMin
+        self.x_max = ras.extent.XMax
+        self.y_max = ras.extent.YMax
+        self.nodata = ras.noDataValue
+        self.pixel_type = ras.pixelType
+        self.band_count = ras.bandCount
+        self.spatial_reference = ras.spatialReference
+        self.is_integer = ras.isInteger
+
+        del ras
+
+        return
+
+    @property
+    def dtype(self):
+        """ The numpy type of the raster cells """
+
+        return np.dtype(numpy_types.get(self.pixel_type, "float64"))
+
+    @property
+    def signature(self):
+        """ A key that is equal for rasters on the same grid """
+
+        return (self.rows, self.cols, round(self.cell_width, 9), round(self.cell_height, 9), round(self.x_min, 6), round(self.y_max, 6),
+                self.spatial_reference.name if self.spatial_reference else None)
+
+    def cell_index(self, x, y):
+        """ The row and column of the cells holding points
+
+        Args:
+            x: x coordinates (array)
+            y: y coordinates (array)
+
+        Returns:
+            (rows, cols) arrays, -1 where a point falls outside the raster
+
+        """
+
+        x, y = np.asarray(x, dtype="float64"), np.asarray(y, dtype="float64")
+
+        rows = np.floor((self.y_max - y) / self.cell_height).astype("int64")
+        cols = np.floor((x - self.x_min) / self.cell_width).astype("int64")
+
+        outside = (rows < 0) | (rows >= self.rows) | (cols < 0) | (cols >= self.cols)
+        rows[outside] = -1
+        cols[outside] = -1
+
+        return rows, cols
+
+    def lower_left(self, window):
+        """ The lower left corner of a window in map units
+
+        Args:
+            window: (row, col, nrows, ncols), rows counted from the top
+
+        Returns:
+            arcpy.Point
+
+        """
+
+        row, col, nrows, ncols = window
+
+        return arcpy.Point(self.x_min + col * self.cell_width, self.y_max - (row + nrows) * self.cell_height)
+
+
+def iter_windows(grid, block_rows=BLOCK_SIZE, block_cols=BLOCK_SIZE):
+    """ Generate the block windows covering a raster, row by row from the top
+
+    Args:
+        grid: RasterGrid
+        block_rows: Maximum rows per block
+        block_cols: Maximum columns per block
+
+    Returns:
+        generator of (row, col, nrows, ncols)
+
+    """
+
+    for row in xrange(0, grid.rows, block_rows):
+        for col in xrange(0, grid.cols, block_cols):
+            yield row, col, min(block_rows, grid.rows - row), min(block_cols, grid.cols - col)
+
+
+def read_block(grid, window, raster=None):
+    """ Read a window of a raster as a masked array
+
+    Args:
+        grid: RasterGrid
+        window: (row, col, nrows, ncols)
+        raster: Raster to read if not grid.raster, it must be on the same grid
+
+    Returns:
+        numpy masked array with NoData (and NaN) cells masked
+
+    """
+
+    row, col, nrows, ncols = window
+
+    a = arcpy.RasterToNumPyArray(raster or grid.raster, grid.lower_left(window), ncols, nrows)
+
+    if a.ndim == 3:  # multiband, keep the first band as map algebra does
+        a = a[0]
+
+    mask = np.zeros(a.shape, dtype=bool) if grid.nodata is None else (a == grid.nodata)
+
+    if a.dtype.kind == "f":
+        mask |= np.isnan(a)
+
+    return np.ma.masked_array(a, mask=mask)
+
+
+def iter_blocks(grid, block_rows=BLOCK_SIZE, block_cols=BLOCK_SIZE, raster=None):
+    """ Generate (window, masked array) for each block of a raster
+
+    Args:
+        grid: RasterGrid
+        block_rows: Maximum rows per block
+        block_cols: Maximum columns per block
+        raster: Raster to read if not grid.raster, it must be on the same grid
+
+    Returns:
+        generator of (window, masked array)
+
+    """
+
+    for window in iter_windows(grid, block_rows, block_cols):
+        yield window, read_block(grid, window, raster)
+
+
+class CellSampler(object):
+    """ Values at a fixed set of cells, for any raster on the same grid
+
+    Cells are grouped by block once and, within a block, only the rectangle
+    spanning its cells is read. Sampling a raster is then one read per group
+    (one read in all when the cells fit in a block) with the values gathered
+    by fancy indexing.
+    """
+
+    def __init__(self, grid, rows, cols, block_rows=BLOCK_SIZE, block_cols=BLOCK_SIZE):
+        """
+
+        Args:
+            grid: RasterGrid
+            rows: Cell rows, as from RasterGrid.cell_index, -1 for none
+            cols: Cell columns
+            block_rows: Maximum rows per read
+            block_cols: Maximum columns per read
+        """
+
+        rows, cols = np.asarray(rows), np.asarray(cols)
+
+        self.signature = grid.signature
+        self.size = rows.size
+        self.groups = []
+
+        inside = np.flatnonzero(rows >= 0)
+        if not inside.size:
+            return
+
+        block_keys = (rows[inside] // block_rows) * (grid.cols // block_cols + 1) + cols[inside] // block_cols
+        order = np.argsort(block_keys, kind="mergesort")
+        inside, block_keys = inside[order], block_keys[order]
+        starts = np.flatnonzero(np.r_[True, block_keys[1:] != block_keys[:-1]])
+
+        for idx in np.split(inside, starts[1:]):
+            r, c = rows[idx], cols[idx]
+            r0, c0 = r.min(), c.min()
+            self.groups.append((idx, (r0, c0, r.max() - r0 + 1, c.max() - c0 + 1), r - r0, c - c0))
+
+        return
+
+    def sample(self, grid):
+        """ Values of a raster at the cells
+
+        Args:
+            grid: RasterGrid of the raster, on the grid the sampler was made for
+
+        Returns:
+            masked array of values, masked for NoData and cells outside the raster
+
+        """
+
+        if grid.signature != self.signature:
+            raise ValueError("Raster {} is not on the sampled grid".format(grid.raster))
+
+        values = np.ma.masked_all((self.size,), dtype=grid.dtype)
+
+        for idx, window, r, c in self.groups:
+            values[idx] = read_block(grid, window)[r, c]
+
+        return values
+
+
+def sample_cells(grid, rows, cols, block_rows=BLOCK_SIZE, block_cols=BLOCK_SIZE):
+    """ Values of a raster at the given cells
+
+    Args:
+        grid: RasterGrid
+        rows: Cell rows, as from RasterGrid.cell_index, -1 for none
+        cols: Cell columns
+        block_rows: Maximum rows per read
+        block_cols: Maximum columns per read
+
+    Returns:
+        masked array of values, masked for NoData and cells outside the raster
+
+    """
+
+    return CellSampler(grid, rows, cols, block_rows, block_cols).sample(grid)
+
+
+class PointSampler(object):
+    """ Points read once and sampled from any number of rasters
+
+    The point to cell index is computed once per grid signature, so rasters
+    sharing a grid (e.g. a time series) cost one read each.
+    """
+
+    def __init__(self, points, where_clause=None):
+        """
+
+        Args:
+            points: Point feature class or layer
+            where_clause: Optional query on the points
+        """
+
+        with arcpy.da.SearchCursor(points, ("SHAPE@XY", "OID@"), where_clause) as cursor:
+            point_rows = [(xy[0], xy[1], oid) for xy, oid in cursor if xy[0] is not None]
+
+        self.points = points
+        self.ids = [r[2] for r in point_rows]
+        self.x = np.array([r[0] for r in point_rows], dtype="float64")
+        self.y = np.array([r[1] for r in point_rows], dtype="float64")
+        self.samplers = {}
+
+        return
+
+    def sampler(self, grid):
+        """ The CellSampler for a grid, made on first use
+
+        Args:
+            grid: RasterGrid
+
+        Returns:
+            CellSampler
+
+        """
+
+        key = grid.signature
+        if key not in self.samplers:
+            rows, cols = grid.cell_index(self.x, self.y)
+            self.samplers[key] = CellSampler(grid, rows, cols)
+
+        return self.samplers[key]
+
+    def sample(self, grid):
+        """ Values of a raster at the points
+
+        Args:
+            grid: RasterGrid
+
+        Returns:
+            masked array of values in the order of self.ids
+
+        """
+
+        return self.sampler(grid).sample(grid)
+
+
+class BlockWriter(object):
+    """ Write a raster a block at a time
+
+    The first block is saved as the output raster, later blocks are saved as a
+    temporary raster in the scratch folder and mosaicked into it. Use as a
+    context manager, the spatial reference is set when it closes.
+    """
+
+    def __init__(self, out_raster, grid, dtype="float32", nodata=None):
+        """
+
+        Args:
+            out_raster: Path of the raster to create
+            grid: RasterGrid the output is aligned to
+            dtype: Cell type of the output
+            nodata: NoData value of the output, if None the type is widened as by default_nodata
+        """
+
+        self.out_raster = out_raster
+        self.grid = grid
+        self.dtype, self.nodata = default_nodata(dtype) if nodata is None else (np.dtype(dtype), nodata)
+        self.block_count = 0
+
+        return
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        if exc_type is None:
+            self.close()
+
+        return False
+
+    def write(self, window, array):
+        """ Write a block
+
+        Args:
+            window: (row, col, nrows, ncols) of the block
+            array: The block values, masked cells are written as NoData
+
+        Returns:
+
+        """
+
+        a = np.ma.masked_invalid(array) if np.asarray(array).dtype.kind == "f" else np.ma.asarray(array)
+        a = a.astype(self.dtype).filled(self.nodata)  # cast first, NoData may not fit the type of array
+
+        ras = arcpy.NumPyArrayToRaster(a, self.grid.lower_left(window), self.grid.cell_width, self.grid.cell_height, self.nodata)
+
+        if not self.block_count:
+            ras.save(self.out_raster)
+
+        else:
+            tmp = arcpy.CreateScratchName("blk", ".tif", "RasterDataset", arcpy.env.scratchFolder)
+            ras.save(tmp)
+            try:
+                arcpy.Mosaic_management(tmp, self.out_raster, "LAST", "FIRST", "", self.nodata)
+            finally:
+                arcpy.Delete_management(tmp)
+
+        del ras
+
+        self.block_count += 1
+
+        return
+
+    def close(self):
+        """ Set the spatial reference of the output
+
+        Returns:
+
+        """
+
+        if self.block_count and self.grid.spatial_reference and self.grid.spatial_reference.name not in ["", "Unknown"]:
+            arcpy.DefineProjection_management(self.out_raster, self.grid.spatial_reference)
+
+        return
+
+
+def map_blocks(grid, out_raster, func, dtype="float32", nodata=None, block_rows=BLOCK_SIZE, block_cols=BLOCK_SIZE):
+    """ Apply a function to each block of a raster and write the results
+
+    Args:
+        grid: RasterGrid of the input
+        out_raster: Path of the raster to create
+        func: Called with a masked array, returns an array of the same shape
+        dtype: Cell type of the output
+        nodata: NoData value of the output, if None the type is widened as by default_nodata
+        block_rows: Maximum rows per block
+        block_cols: Maximum columns per block
+
+    Returns:
+        out_raster
+
+    """
+
+    with BlockWriter(out_raster, grid, dtype, nodata) as writer:
+        for window, block in iter_blocks(grid, block_rows, block_cols):
+            writer.write(window, func(block))
+
+    return out_raster
+
+
+class StreamingStatistics(object):
+    """ Count, mean, standard deviation, minimum and maximum accumulated block by block
+
+    Blocks are merged with the pairwise form of Welford's update so the result
+    does not suffer the cancellation of a naive sum of squares.
+    """
+
+    def __init__(self):
+
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+
+        return
+
+    def update(self, values):
+        """ Add values to the statistics
+
+        Args:
+            values: Array or masked array, masked cells are ignored
+
+        Returns:
+
+        """
+
+        values = np.ma.compressed(values) if np.ma.isMaskedArray(values) else np.ravel(values)
+
+        n = values.size
+        if not n:
+            return
+
+        values = values.astype("float64", copy=False)
+        mean = values.mean()
+        m2 = np.square(values - mean).sum()
+
+        self.merge_moments(n, mean, m2, values.min(), values.max())
+
+        return
+
+    def merge(self, other):
+        """ Combine with statistics gathered elsewhere, e.g. another worker
+
+        Args:
+            other: StreamingStatistics
+
+        Returns:
+
+        """
+
+        if other.count:
+            self.merge_moments(other.count, other.mean, other.m2, other.minimum, other.maximum)
+
+        return
+
+    def merge_moments(self, n, mean, m2, minimum, maximum):
+        """ Combine with the moments of another set of values
+
+        Args:
+            n: Count
+            mean: Mean
+            m2: Sum of squared differences from the mean
+            minimum: Minimum
+            maximum: Maximum
+
+        Returns:
+
+        """
+
+        total = self.count + n
+        delta = mean - self.mean
+
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+
+        return
+
+    @property
+    def variance(self):
+        """ Population variance, as reported by ArcGIS """
+
+        return self.m2 / self.count if self.count else None
+
+    @property
+    def std(self):
+        """ Population standard deviation, as reported by ArcGIS """
+
+        return self.variance ** 0.5 if self.count else None
+
+    def as_dict(self):
+        """ The statistics by name """
+
+        return {"count": self.count, "mean": self.mean if self.count else None, "std": self.std, "minimum": self.minimum, "maximum": self.maximum}
+
+
+def raster_statistics(grid, block_rows=BLOCK_SIZE, block_cols=BLOCK_SIZE):
+    """ Statistics of a raster in one read
+
+    Args:
+        grid: RasterGrid
+        block_rows: Maximum rows per block
+        block_cols: Maximum columns per block
+
+    Returns:
+        StreamingStatistics
+
+    """
+
+    stats = StreamingStatistics()
+
+    for window, block in iter_blocks(grid, block_rows, block_cols):
+        stats.update(block)
+
+    return stats
+
+
+def band_summary(grid, block_rows=BLOCK_SIZE, block_cols=BLOCK_SIZE):
+    """ Statistics, distinct value count and NoData cell count of a raster band in one read
+
+    Args:
+        grid: RasterGrid of the band
+        block_rows: Maximum rows per block
+        block_cols: Maximum columns per block
+
+    Returns:
+        (StreamingStatistics, number of distinct values or None for floating point, NoData cell count)
+
+    """
+
+    stats = StreamingStatistics()
+    unique = np.zeros(0, dtype=grid.dtype) if grid.is_integer else None
+    nodata = 0
+
+    for window, block in iter_blocks(grid, block_rows, block_cols):
+        nodata += int(np.ma.count_masked(block))
+        stats.update(block)
+        if unique is not None:
+            unique = np.union1d(unique, np.unique(np.ma.compressed(block)))
+
+    return stats, None if unique is None else unique.size, nodata
@@ -314,6 +314,10 @@ def input_output_table(affixing=False, out_file_workspace=True):
             affixing: Flags if prefix and suffix input parameters should be built
             out_file_workspace: Flags if output file workspace input parameter should be built
 
+        The optional 'workers' parameter spreads the rows over that many worker processes
+        The optional 'resume' parameter skips rows already in the CSVs of an interrupted run
+        with the same result table name, and appends to them
+
         Returns:
             Wrapped function, wrapper implementing parameters
 
@@ -385,6 +389,30 @@ def input_output_table(affixing=False, out_file_workspace=True):
 
     pars.append(par6)
 
+    # Worker processes
+    par7 = Parameter(displayName="Worker Processes",
+                     name="workers",
+                     datatype="GPLong",
+                     parameterType="Optional",
+                     direction="Input",
+                     category="Processing")
+
+    par7.value = 1
+
+    pars.append(par7)
+
+    # Resume
+    par8 = Parameter(displayName="Resume Previous Run",
+                     name="resume",
+                     datatype="GPBoolean",
+                     parameterType="Optional",
+                     direction="Input",
+                     category="Processing")
+
+    par8.value = False
+
+    pars.append(par8)
+
     def decorator(f):
         """ Adds the parameters functionally
 
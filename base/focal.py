@@ -0,0 +1,163 @@
+""" This module calculates rectangular moving window (focal) statistics with NumPy
+
+Window sums come from summed-area tables (integral images): after two cumulative
+sums, the sum of any rectangle is four lookups, so the cost per cell does not
+depend on the window size. SUM and MEAN use a table of the values and a table of
+the valid cell counts, STD adds a table of the squared values.
+
+Rasters are processed a tile at a time. Each tile is read with a halo of the
+cells its windows reach beyond it, so memory is bounded by the tile size plus the
+halo whatever the size of the raster.
+
+A window of h rows and w columns has (h - 1) // 2 rows above its centre cell and
+(w - 1) // 2 columns to its left. Cells beyond the edge of the raster are left
+out of the window, they don't count as NoData.
+
+"""
+from base import blocks
+import numpy as np
+
+
+focal_statistics = ["SUM", "MEAN", "STD"]
+
+
+def summed_area_table(a):
+    """ The summed-area table of an array, with a leading row and column of zeros
+
+    Args:
+        a: 2D array
+
+    Returns:
+        float64 array one row and column larger than a
+
+    """
+
+    sat = np.zeros((a.shape[0] + 1, a.shape[1] + 1), dtype="float64")
+    np.cumsum(a, axis=0, dtype="float64", out=sat[1:, 1:])
+    np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+
+    return sat
+
+
+def window_sums(sat, rows, cols, above, below, left, right):
+    """ Sums over the windows centred on a grid of cells
+
+    Args:
+        sat: Summed-area table from summed_area_table
+        rows: Row of each centre cell, in the table's array
+        cols: Column of each centre cell, in the table's array
+        above: Rows of the window above the centre
+        below: Rows of the window below the centre
+        left: Columns of the window left of the centre
+        right: Columns of the window right of the centre
+
+    Returns:
+        2D array (len(rows), len(cols)), windows are clipped to the array
+
+    """
+
+    n_rows, n_cols = sat.shape[0] - 1, sat.shape[1] - 1
+
+    r0, r1 = np.clip(rows - above, 0, n_rows), np.clip(rows + below + 1, 0, n_rows)
+    c0, c1 = np.clip(cols - left, 0, n_cols), np.clip(cols + right + 1, 0, n_cols)
+
+    return sat[np.ix_(r1, c1)] - sat[np.ix_(r0, c1)] - sat[np.ix_(r1, c0)] + sat[np.ix_(r0, c0)]
+
+
+def focal_block(block, centre_window, height, width, statistics, ignore_nodata="DATA"):
+    """ Focal statistics for the cells of a block read with a halo
+
+    Args:
+        block: Masked array of the cells and their halo
+        centre_window: (row, col, nrows, ncols) of the cells to calculate, within block
+        height: Rows in the window
+        width: Columns in the window
+        statistics: Names from focal_statistics
+        ignore_nodata: 'DATA' uses the values in a window, 'NODATA' gives NoData for windows holding NoData
+
+    Returns:
+        {statistic: masked array}
+
+    """
+
+    above, left = (height - 1) // 2, (width - 1) // 2
+    below, right = height - 1 - above, width - 1 - left
+
+    row, col, nrows, ncols = centre_window
+    rows, cols = np.arange(row, row + nrows), np.arange(col, col + ncols)
+
+    mask = np.ma.getmaskarray(block)
+    valid = ~mask
+
+    # values are shifted by their mean so the squared table keeps its precision
+    shift = float(block.mean()) if valid.any() else 0.0
+    values = np.where(valid, np.ma.getdata(block).astype("float64") - shift, 0.0)
+
+    count = window_sums(summed_area_table(valid), rows, cols, above, below, left, right)
+    total = window_sums(summed_area_table(values), rows, cols, above, below, left, right)
+
+    empty = count == 0
+    if ignore_nodata == "NODATA":
+        empty |= window_sums(summed_area_table(mask), rows, cols, above, below, left, right) > 0
+
+    n = np.maximum(count, 1)
+    out = {}
+
+    for stat in statistics:
+        if stat == "SUM":
+            result = total + count * shift
+        elif stat == "MEAN":
+            result = total / n + shift
+        elif stat == "STD":
+            squares = window_sums(summed_area_table(np.square(values)), rows, cols, above, below, left, right)
+            result = np.sqrt(np.maximum(squares / n - np.square(total / n), 0.0))
+        else:
+            raise ValueError("Focal statistic '{}' is not one of {}".format(stat, focal_statistics))
+
+        out[stat] = np.ma.masked_array(result, mask=empty)
+
+    return out
+
+
+def focal_raster(grid, outputs, height, width, ignore_nodata="DATA", block_size=blocks.BLOCK_SIZE):
+    """ Read a raster once, tile by tile with a halo, and write a raster for each focal statistic
+
+    Args:
+        grid: RasterGrid of the source
+        outputs: list of (statistic, out_raster)
+        height: Rows in the window
+        width: Columns in the window
+        ignore_nodata: 'DATA' uses the values in a window, 'NODATA' gives NoData for windows holding NoData
+        block_size: Rows and columns of each tile
+
+    Returns:
+        list of output rasters
+
+    """
+
+    for stat, out_raster in outputs:
+        if stat not in focal_statistics:
+            raise ValueError("Focal statistic '{}' is not one of {}".format(stat, focal_statistics))
+
+    above, left = (height - 1) // 2, (width - 1) // 2
+    below, right = height - 1 - above, width - 1 - left
+
+    is_sum_int = grid.dtype.kind in "iub"
+    writers = [(stat, blocks.BlockWriter(out_raster, grid, "int32" if stat == "SUM" and is_sum_int else "float32")) for stat, out_raster in outputs]
+
+    for window in blocks.iter_windows(grid, block_size, block_size):
+        row, col, nrows, ncols = window
+
+        top, bottom = max(row - above, 0), min(row + nrows + below, grid.rows)
+        first, last = max(col - left, 0), min(col + ncols + right, grid.cols)
+
+        block = blocks.read_block(grid, (top, first, bottom - top, last - first))
+        results = focal_block(block, (row - top, col - first, nrows, ncols), height, width, [s for s, w in writers], ignore_nodata)
+
+        for stat, writer in writers:
+            writer.write(window, np.ma.round(results[stat]) if writer.dtype.kind == "i" else results[stat])
+
+    for stat, writer in writers:
+        writer.close()
+
+    return [out_raster for stat, out_raster in outputs]
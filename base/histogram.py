@@ -0,0 +1,274 @@
+""" This module provides a streaming, mergeable histogram for raster quantiles
+
+QuantileSketch counts values in bins of a power-of-two width. Each block is
+binned with np.bincount and added in. When the values span more than max_bins
+bins, the width doubles and neighbouring bins are added together. Doubling
+loses nothing that was counted, so two sketches of any widths merge exactly.
+Blocks read by different workers can be summarised separately and merged.
+
+Integer rasters start with a width of 1, so their histogram (and quantiles) are
+exact unless they span more than max_bins values. Otherwise a quantile is
+interpolated within its bin, so its error is at most one bin width, i.e. about
+(maximum - minimum) / max_bins. A block of one value (e.g. a single cell at
+an edge) says nothing of the spread of a continuous raster, so it leaves the
+width as it is, or undetermined until a second value is seen.
+
+"""
+from base import blocks
+import numpy as np
+
+
+MAX_BINS = 65536
+
+
+class QuantileSketch(object):
+    """ Histogram of values in power-of-two width bins, built block by block
+    """
+
+    def __init__(self, max_bins=MAX_BINS, discrete=False):
+        """
+
+        Args:
+            max_bins: Most bins to hold, the width doubles to stay within it
+            discrete: The values are integers, bins are at least 1 wide and quantiles are values
+        """
+
+        self.max_bins = max_bins
+        self.discrete = discrete
+        self.width = None
+        self.start = 0  # bin number of counts[0], bin i holds [i * width, (i + 1) * width)
+        self.counts = np.zeros(0, dtype="int64")
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+
+        return
+
+    def update(self, values):
+        """ Add values to the histogram
+
+        Args:
+            values: Array or masked array, masked cells are ignored
+
+        Returns:
+
+        """
+
+        values = np.ma.compressed(values) if np.ma.isMaskedArray(values) else np.ravel(values)
+        values = values[np.isfinite(values)] if values.dtype.kind == "f" else values
+
+        if not values.size:
+            return
+
+        lo, hi = float(values.min()), float(values.max())
+        width = self.width_for(lo, hi)
+
+        if width is None:
+            self.add_value(lo, values.size)
+            return
+
+        idx = np.floor(values / width).astype("int64")
+        first = int(idx.min())
+
+        self.add_counts(first, np.bincount(idx - first), width, lo, hi)
+
+        return
+
+    def merge(self, other):
+        """ Combine with a sketch gathered elsewhere, e.g. another worker
+
+        Args:
+            other: QuantileSketch
+
+        Returns:
+
+        """
+
+        if not other.count:
+            return
+
+        if other.width is None:
+            self.add_value(other.minimum, other.count)
+        else:
+            self.add_counts(other.start, other.counts, other.width, other.minimum, other.maximum)
+
+        return
+
+    def width_for(self, lo, hi):
+        """ The bin width for values from lo to hi
+
+        A width that keeps the values within max_bins, so bincount stays small, and no finer than the current
+        width. A single value of a continuous raster says nothing of the spread, its width is left undetermined.
+
+        Args:
+            lo: Smallest value
+            hi: Largest value
+
+        Returns:
+            float, None while the width is undetermined
+
+        """
+
+        if hi > lo:
+            width = 2.0 ** np.ceil(np.log2((hi - lo) / self.max_bins))
+        elif self.discrete:
+            width = 1.0
+        else:
+            return self.width
+
+        return max(width, self.width or 0.0, 1.0 if self.discrete else 0.0)
+
+    def add_value(self, value, count):
+        """ Add count copies of one value
+
+        Until the width is known every value counted is the same, it is kept in minimum and count.
+
+        Args:
+            value: The value
+            count: How many times it occurs
+
+        Returns:
+
+        """
+
+        if self.count:
+            width = self.width_for(min(value, self.minimum), max(value, self.maximum))
+        else:
+            width = self.width_for(value, value)
+
+        if width is None:
+            self.count += count
+            self.minimum = self.maximum = value
+            return
+
+        self.add_counts(int(np.floor(value / width)), np.array([count], dtype="int64"), width, value, value)
+
+        return
+
+    def add_counts(self, start, counts, width, minimum, maximum):
+        """ Add binned counts
+
+        Args:
+            start: Bin number of counts[0]
+            counts: Counts per bin
+            width: Bin width, a power of two multiple of this sketch's width
+            minimum: Smallest value counted
+            maximum: Largest value counted
+
+        Returns:
+
+        """
+
+        if self.width is None:
+            self.width = width
+            if self.count:  # the one value counted before the width was known
+                self.start, self.counts = int(np.floor(self.minimum / width)), np.array([self.count], dtype="int64")
+
+        # bring both to the coarser width
+        if width < self.width:
+            start, counts = coarsen(start, counts, int(round(self.width / width)))
+        elif width > self.width:
+            self.start, self.counts = coarsen(self.start, self.counts, int(round(width / self.width)))
+            self.width = width
+
+        if self.count:
+            first, last = min(self.start, start), max(self.start + self.counts.size, start + counts.size)
+        else:
+            first, last = start, start + counts.size
+
+        # stay within max_bins
+        while last - first > self.max_bins:
+            self.start, self.counts = coarsen(self.start, self.counts, 2)
+            start, counts = coarsen(start, counts, 2)
+            self.width *= 2
+            first, last = first // 2, (last - 1) // 2 + 1
+
+        merged = np.zeros(last - first, dtype="int64")
+        merged[self.start - first:self.start - first + self.counts.size] += self.counts
+        merged[start - first:start - first + counts.size] += counts
+
+        self.start, self.counts = first, merged
+        self.count += int(counts.sum())
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+
+        return
+
+    def quantiles(self, fractions):
+        """ Values below which the given fractions of the values fall
+
+        Args:
+            fractions: Fractions between 0 and 1
+
+        Returns:
+            list of values, None if nothing was counted
+
+        """
+
+        if not self.count:
+            return None
+
+        if self.width is None:  # one value
+            return [self.minimum for f in fractions]
+
+        cumulative = np.cumsum(self.counts)
+        out = []
+
+        for f in fractions:
+            target = f * self.count
+            i = min(int(np.searchsorted(cumulative, target, side="left")), self.counts.size - 1)
+            below = cumulative[i] - self.counts[i]
+
+            if self.discrete and self.width == 1:  # exact, the value of the bin
+                value = float(self.start + i)
+            else:
+                value = (self.start + i + (target - below) / float(max(self.counts[i], 1))) * self.width
+
+            out.append(min(max(value, self.minimum), self.maximum))
+
+        return out
+
+
+def coarsen(start, counts, factor):
+    """ Add neighbouring bins together
+
+    Args:
+        start: Bin number of counts[0]
+        counts: Counts per bin
+        factor: Bins per new bin, a power of two
+
+    Returns:
+        (new start, new counts)
+
+    """
+
+    if factor == 1 or not counts.size:
+        return start // factor, counts
+
+    idx = (np.arange(start, start + counts.size) // factor) - start // factor
+
+    return start // factor, np.bincount(idx, weights=counts).astype("int64")
+
+
+def raster_sketch(grid, max_bins=MAX_BINS, block_rows=blocks.BLOCK_SIZE, block_cols=blocks.BLOCK_SIZE):
+    """ A QuantileSketch of a raster in one read
+
+    Args:
+        grid: RasterGrid
+        max_bins: Most bins to hold
+        block_rows: Maximum rows per block
+        block_cols: Maximum columns per block
+
+    Returns:
+        QuantileSketch
+
+    """
+
+    sketch = QuantileSketch(max_bins, discrete=grid.is_integer)
+
+    for window, block in blocks.iter_blocks(grid, block_rows, block_cols):
+        block_sketch = QuantileSketch(max_bins, discrete=grid.is_integer)
+        block_sketch.update(block)
+        sketch.merge(block_sketch)
+
+    return sketch
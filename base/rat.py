@@ -0,0 +1,224 @@
+""" This module builds raster attribute tables (RATs) with NumPy
+
+VALUE and COUNT are found in one block-wise read, each block's np.unique counts
+merged into the running counts. For TIFF rasters, whose RAT is a .vat.dbf
+beside the raster, the table is written directly with one bulk insert
+(arcpy.da.NumPyArrayToTable), other formats are left to
+BuildRasterAttributeTable_management.
+
+A fingerprint of each raster (modification time, size and grid) is stored
+after its RAT is built, so an unchanged raster is not read again.
+
+"""
+from base import blocks
+from base.utils import DescribeCache
+import arcpy
+import json
+import numpy as np
+import os
+import sqlite3
+
+
+RAT_FINGERPRINT_FILE = "rat_fingerprints.sqlite"
+
+sidecar_formats = ["TIFF"]  # formats holding their RAT in <raster>.vat.dbf
+
+
+def value_counts(grid, block_rows=blocks.BLOCK_SIZE, block_cols=blocks.BLOCK_SIZE):
+    """ The distinct values of an integer raster and their cell counts, in one read
+
+    Args:
+        grid: RasterGrid
+        block_rows: Maximum rows per block
+        block_cols: Maximum columns per block
+
+    Returns:
+        (values, counts) arrays, values ascending
+
+    """
+
+    if not grid.is_integer:
+        raise ValueError("Raster '{}' is not an integer raster, attribute tables need integer values".format(grid.raster))
+
+    values = np.zeros(0, dtype="int64")
+    counts = np.zeros(0, dtype="int64")
+
+    for window, block in blocks.iter_blocks(grid, block_rows, block_cols):
+        v, c = np.unique(np.ma.compressed(block), return_counts=True)
+        if not v.size:
+            continue
+        values, inverse = np.unique(np.concatenate([values, v.astype("int64")]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([counts, c]).astype("float64")).astype("int64")
+
+    return values, counts
+
+
+def sidecar_table(raster):
+    """ The .vat.dbf holding a raster's attribute table, if its format keeps one
+
+    Args:
+        raster: The raster
+
+    Returns:
+        The table path, None for other formats
+
+    """
+
+    if not os.path.isfile(raster) or arcpy.Describe(raster).format not in sidecar_formats:
+        return None
+
+    return raster + ".vat.dbf"
+
+
+def fits_value_field(values):
+    """ Can the values be written to the 32 bit Value field of a .vat.dbf
+
+    Args:
+        values: The raster values
+
+    Returns:
+        bool
+
+    """
+
+    limits = np.iinfo("int32")
+
+    return not values.size or (values.min() >= limits.min and values.max() <= limits.max)
+
+
+def write_sidecar_table(table, values, counts):
+    """ Write VALUE and COUNT to a .vat.dbf in one bulk insert
+
+    Args:
+        table: The .vat.dbf path, replaced if it exists
+        values: The raster values
+        counts: The cell counts
+
+    Returns:
+
+    """
+
+    if not fits_value_field(values):
+        raise ValueError("Raster values {} to {} don't fit a 32 bit Value field".format(values.min(), values.max()))
+
+    if arcpy.Exists(table):
+        arcpy.Delete_management(table)
+
+    rows = np.empty(values.size, dtype=[("Value", "int32"), ("Count", "float64")])
+    rows["Value"] = values
+    rows["Count"] = counts
+
+    arcpy.da.NumPyArrayToTable(rows, table)
+
+    return
+
+
+def has_rat(raster):
+    """ Does a raster have an attribute table with rows
+
+    Args:
+        raster: The raster
+
+    Returns:
+        bool
+
+    """
+
+    try:
+        return int(arcpy.GetCount_management(raster).getOutput(0)) > 0
+    except Exception:
+        return False
+
+
+def fingerprint(raster, grid):
+    """ A key that changes when a raster is rewritten
+
+    Args:
+        raster: The raster
+        grid: Its RasterGrid
+
+    Returns:
+        string, None when the raster's own modification time is not visible (e.g. in a geodatabase)
+
+    """
+
+    path = os.path.normcase(os.path.abspath(raster))
+    mtime, own = DescribeCache.modification_key(path)
+
+    if not own:
+        return None
+
+    size = os.path.getsize(path) if os.path.isfile(path) else None
+
+    return json.dumps([mtime, size, grid.rows, grid.cols, grid.pixel_type, grid.nodata])
+
+
+class FingerprintStore(object):
+    """ Raster fingerprints at the time their attribute tables were built, kept in SQLite
+    """
+
+    def __init__(self):
+
+        self.db = None
+
+        return
+
+    def open(self, db_path):
+        """ Open the SQLite file, once per process
+
+        Args:
+            db_path: SQLite file, created if necessary
+
+        Returns:
+
+        """
+
+        if self.db:
+            return
+
+        self.db = sqlite3.connect(db_path, timeout=30)
+        self.db.execute("CREATE TABLE IF NOT EXISTS fingerprints (path TEXT PRIMARY KEY, fingerprint TEXT)")
+        self.db.commit()
+
+        return
+
+    def matches(self, raster, fp):
+        """ Was the attribute table built for this fingerprint
+
+        Args:
+            raster: The raster
+            fp: Its current fingerprint
+
+        Returns:
+            bool
+
+        """
+
+        if not self.db or fp is None:
+            return False
+
+        row = self.db.execute("SELECT fingerprint FROM fingerprints WHERE path = ?", (os.path.normcase(os.path.abspath(raster)),)).fetchone()
+
+        return bool(row) and row[0] == fp
+
+    def save(self, raster, fp):
+        """ Record the fingerprint of a raster whose attribute table was just built
+
+        Args:
+            raster: The raster
+            fp: Its fingerprint
+
+        Returns:
+
+        """
+
+        if not self.db or fp is None:
+            return
+
+        self.db.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?)", (os.path.normcase(os.path.abspath(raster)), fp))
+        self.db.commit()
+
+        return
+
+
+fingerprint_store = FingerprintStore()
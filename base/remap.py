@@ -0,0 +1,230 @@
+""" This module compiles reclassification remaps for block-wise NumPy reclassing
+
+A remap is a list of (from, to, new) ranges, as given to Reclassify or held in
+a ReclassByTable remap table. Ranges include both ends, a value on the boundary
+of two ranges goes to the lower range, as in ArcGIS. A new value of None
+(NODATA in a remap string) makes the cells NoData.
+
+Remap compiles the ranges once into sorted bound arrays, so a block is
+classified with one searchsorted. For integer rasters it can also build a dense
+lookup table over the remapped range, so a block is classified with np.take.
+
+"""
+from re import compile
+import arcpy
+import numpy as np
+
+
+statistics_pattern = compile(r"\bMIN\b|\bMAX\b")
+
+MAX_LOOKUP_SIZE = 2 ** 24  # entries in a dense lookup table, 16M int64 is 128MB
+
+
+def uses_statistics(remap_string):
+    """ Whether a remap string refers to the raster MIN or MAX
+
+    Args:
+        remap_string: e.g. "MIN 5 1;5 MAX 2"
+
+    Returns:
+        bool
+
+    """
+
+    return bool(statistics_pattern.search(remap_string or ""))
+
+
+def parse_remap_string(remap_string, minimum=None, maximum=None):
+    """ Parse a Reclassify style remap string into ranges
+
+    Entries are separated by ';' and are either 'from to new' or 'old new'.
+    MIN and MAX are replaced by the given raster minimum and maximum.
+
+    Args:
+        remap_string: e.g. "MIN 5 1;5 7.5 2;7.5 MAX NODATA"
+        minimum: Raster minimum, required if MIN is used
+        maximum: Raster maximum, required if MAX is used
+
+    Returns:
+        list of (from, to, new) tuples, new is None for NODATA
+
+    """
+
+    substitutes = {"MIN": minimum, "MAX": maximum}
+
+    def number(token, new=False):
+        """ Convert a remap token """
+
+        if token.upper() in substitutes:
+            if substitutes[token.upper()] is None:
+                raise ValueError("Remap uses {} but it is not available".format(token))
+            return float(substitutes[token.upper()])
+        if new and token.upper() == "NODATA":
+            return None
+        try:
+            return float(token)
+        except ValueError:
+            raise ValueError("Remap value '{}' is not a number".format(token))
+
+    ranges = []
+    for entry in remap_string.strip().split(";"):
+        tokens = entry.split()
+        if not tokens:
+            continue
+        if len(tokens) == 3:
+            ranges.append((number(tokens[0]), number(tokens[1]), number(tokens[2], True)))
+        elif len(tokens) == 2:
+            old = number(tokens[0])
+            ranges.append((old, old, number(tokens[1], True)))
+        else:
+            raise ValueError("Remap entry '{}' should be 'from to new' or 'old new'".format(entry))
+
+    if not ranges:
+        raise ValueError("No remap ranges in '{}'".format(remap_string))
+
+    return ranges
+
+
+def read_remap_table(table, from_field, to_field, output_field):
+    """ Read the ranges of a ReclassByTable style remap table
+
+    Args:
+        table: Remap table
+        from_field: Field of range start values
+        to_field: Field of range end values
+        output_field: Field of new values
+
+    Returns:
+        list of (from, to, new) tuples, new is None where the field is null
+
+    """
+
+    with arcpy.da.SearchCursor(table, [from_field, to_field, output_field]) as cursor:
+        ranges = [(float(f), float(t), None if n is None else float(n)) for f, t, n in cursor if f is not None and t is not None]
+
+    if not ranges:
+        raise ValueError("No remap ranges in '{}'".format(table))
+
+    return ranges
+
+
+class Remap(object):
+    """ Ranges compiled for classifying arrays
+    """
+
+    def __init__(self, ranges):
+        """
+
+        Args:
+            ranges: list of (from, to, new), new None for NoData
+        """
+
+        ranges = sorted((min(f, t), max(f, t), n) for f, t, n in ranges)
+
+        for (f0, t0, n0), (f1, t1, n1) in zip(ranges[:-1], ranges[1:]):
+            if f1 < t0:
+                raise ValueError("Remap ranges {}-{} and {}-{} overlap".format(f0, t0, f1, t1))
+
+        self.ranges = ranges
+        self.lows = np.array([r[0] for r in ranges], dtype="float64")
+        self.highs = np.array([r[1] for r in ranges], dtype="float64")
+        self.values = np.array([0 if r[2] is None else r[2] for r in ranges], dtype="float64")
+        self.to_nodata = np.array([r[2] is None for r in ranges], dtype=bool)
+        self.integer_values = bool(np.all(self.values == np.round(self.values)))
+
+        self.lookup_offset = None
+        self.lookup_index = None
+
+        return
+
+    def compile_lookup(self, max_size=MAX_LOOKUP_SIZE):
+        """ Build a dense table of range indices for integer cell values
+
+        Args:
+            max_size: Largest table to build, wider remaps keep using searchsorted
+
+        Returns:
+            bool, True if the table was built
+
+        """
+
+        lo, hi = int(np.ceil(self.lows[0])), int(np.floor(self.highs.max()))
+
+        if hi < lo or hi - lo + 1 > max_size:
+            return False
+
+        self.lookup_offset = lo
+        self.lookup_index = self.range_index(np.arange(lo, hi + 1))
+
+        return True
+
+    def range_index(self, values):
+        """ The index of the range holding each value, -1 for none
+
+        Args:
+            values: Array of values
+
+        Returns:
+            int64 array
+
+        """
+
+        values = np.asarray(values)
+
+        idx = np.searchsorted(self.highs, values, side="left")  # first range ending at or above the value
+        found = idx < self.highs.size
+        idx[~found] = 0
+        found &= self.lows[idx] <= values
+        idx[~found] = -1
+
+        return idx
+
+    def output_dtype(self, in_dtype, missing_values="NODATA"):
+        """ The cell type for reclassed arrays
+
+        Args:
+            in_dtype: Input cell type
+            missing_values: 'DATA' keeps unmatched input values
+
+        Returns:
+            numpy dtype
+
+        """
+
+        integer = self.integer_values and (missing_values != "DATA" or np.dtype(in_dtype).kind in "iub")
+
+        return np.dtype("int32" if integer else "float32")
+
+    def apply(self, block, missing_values="NODATA"):
+        """ Reclass a block
+
+        Args:
+            block: Masked array of cell values
+            missing_values: 'NODATA' (default) makes unmatched cells NoData, 'DATA' keeps their value
+
+        Returns:
+            masked array
+
+        """
+
+        data = np.ma.getdata(block)
+
+        if self.lookup_index is not None and data.dtype.kind in "iub":
+            offsets = data.astype("int64") - self.lookup_offset
+            inside = (offsets >= 0) & (offsets < self.lookup_index.size)
+            idx = np.where(inside, np.take(self.lookup_index, offsets, mode="clip"), -1)
+        else:
+            idx = self.range_index(data)
+
+        matched = idx >= 0
+        idx[~matched] = 0
+
+        out = self.values[idx]
+        mask = np.ma.getmaskarray(block) | (matched & self.to_nodata[idx])
+
+        if missing_values == "DATA":
+            out = np.where(matched, out, data)
+        else:
+            mask |= ~matched
+
+        return np.ma.masked_array(out, mask=mask)
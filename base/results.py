@@ -1,18 +1,278 @@
 from base.utils import make_tuple
-from arcpy import Describe, TableToTable_conversion, FieldMappings, Field
+from arcpy import Describe, CreateTable_management, AddField_management, ValidateFieldName
+from arcpy.da import InsertCursor
 from sys import exc_info
 from traceback import format_exception
 import os
 import csv
 import collections
+import datetime
+import time
+import re
+from ast import literal_eval
+
+
+LONG_RANGE = (-2147483648, 2147483647)
+
+INTEGER_PATTERN = re.compile(r"^[-+]?(0|[1-9]\d*)$")  # leading zeros are kept as text, e.g. ids
+
+NUMBER_PATTERN = re.compile(r"^[-+]?((0|[1-9]\d*)(\.\d*)?|\.\d+)([eE][-+]?\d+)?$")
+
+DATE_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d", "%Y/%m/%d", "%Y/%m/%d %H:%M:%S"]
+
+
+def format_failure():
+    """ Format the exception currently being handled as a single line failure message
+
+    Returns:
+        string: Failure message
+    """
+
+    msg = repr(format_exception(*exc_info()))
+
+    return msg.strip().replace('\n', ', ').replace('\r', ' ').replace('  ', ' ')
+
+
+def has_header(csv_path):
+    """ Flag if a CSV exists with a header, a crash before the first flush leaves an empty file
+
+    Args:
+        csv_path: The CSV
+
+    Returns:
+        boolean:
+    """
+
+    return os.path.isfile(csv_path) and os.path.getsize(csv_path) > 0
+
+
+def parse_date(value):
+    """ Parse a date string in one of the DATE_FORMATS
+
+    Args:
+        value (string):
+
+    Returns:
+        datetime: or None if the string is not a date
+    """
+
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+
+    return None
+
+
+def value_type(value):
+    """ Return the narrowest field type that can hold a CSV value
+
+    Args:
+        value (string): Non-empty value
+
+    Returns:
+        string: 'LONG', 'DOUBLE', 'DATE' or 'TEXT'
+    """
+
+    if INTEGER_PATTERN.match(value):
+        return "LONG" if LONG_RANGE[0] <= int(value) <= LONG_RANGE[1] else "DOUBLE"
+
+    if NUMBER_PATTERN.match(value):
+        return "DOUBLE"
+
+    if value[:1].isdigit() and parse_date(value):
+        return "DATE"
+
+    return "TEXT"
+
+
+def merge_types(a, b):
+    """ Return the narrowest field type that can hold values of both types
+
+    Args:
+        a (string): Field type, or None if no values seen yet
+        b (string): Field type
+
+    Returns:
+        string: Field type
+    """
+
+    if a is None or a == b:
+        return b
+
+    if {a, b} == {"LONG", "DOUBLE"}:
+        return "DOUBLE"
+
+    return "TEXT"
+
+
+def infer_schema(csv_path):
+    """ Infer field types and text lengths from the values in a CSV
+
+    Args:
+        csv_path (string): CSV file with a header row
+
+    Returns:
+        list: (name, type, length) tuples, length is the longest value seen
+    """
+
+    with open(csv_path, "rb") as csv_file:
+        reader = csv.reader(csv_file)
+        names = next(reader)
+        types = [None] * len(names)
+        lengths = [1] * len(names)
+
+        for row in reader:
+            for i, v in enumerate(row[:len(names)]):
+                if not v:
+                    continue
+                lengths[i] = max(lengths[i], len(v))
+                if types[i] != "TEXT":
+                    types[i] = merge_types(types[i], value_type(v))
+
+    return [(n, t or "TEXT", l) for n, t, l in zip(names, types, lengths)]
+
+
+def convert_value(value, field_type):
+    """ Convert a CSV value for insertion into a field of the given type
+
+    Args:
+        value (string):
+        field_type (string): 'LONG', 'DOUBLE', 'DATE' or 'TEXT'
+
+    Returns:
+        Converted value, None for empty values
+    """
+
+    if value == "":
+        return None
+
+    if field_type == "LONG":
+        return int(value)
+
+    if field_type == "DOUBLE":
+        return float(value)
+
+    if field_type == "DATE":
+        return parse_date(value)
+
+    return value
+
+
+class BufferedCsvWriter(object):
+    """ Keeps one CSV handle open and writes records in batches
+
+    Records are held until 'flush_rows' records are pending or 'flush_seconds'
+    have passed since the last flush, whichever comes first. close() flushes
+    and syncs to disk, so a crash costs at most one batch
+    """
+
+    def __init__(self, path, fieldnames, flush_rows=100, flush_seconds=10.0):
+        """ Open the CSV for appending, writing the header if the file is new
+
+        Args:
+            path (string): CSV file
+            fieldnames (list): Field names, records with other keys raise a ValueError
+            flush_rows (int): Maximum number of records held before a flush
+            flush_seconds (float): Maximum time between flushes
+
+        Returns:
+
+        """
+
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+
+        new_file = not has_header(path)
+
+        self.csv_file = open(path, "ab")
+        self.writer = csv.DictWriter(self.csv_file, delimiter=',', lineterminator='\n', fieldnames=self.fieldnames)
+
+        if new_file:
+            self.writer.writeheader()
+
+        self.pending = []
+        self.last_flush = time.time()
+
+        return
+
+    def writerows(self, records):
+        """ Queue records, flushing if the policy says so
+
+        Args:
+            records (list): Dictionaries
+
+        Returns:
+
+        """
+
+        for record in records:
+            wrong_fields = [k for k in record if k not in self.fieldnames]
+            if wrong_fields:
+                raise ValueError("Record contains fields not in the CSV '{}': {}".format(self.path, wrong_fields))
+
+        self.pending.extend(records)
+
+        if len(self.pending) >= self.flush_rows or time.time() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+        return
+
+    def flush(self, sync=False):
+        """ Write pending records to the file
+
+        Args:
+            sync (boolean): Also force the file to disk
+
+        Returns:
+
+        """
+
+        if self.pending:
+            self.writer.writerows(self.pending)
+            self.pending = []
+
+        self.csv_file.flush()
+
+        if sync:
+            os.fsync(self.csv_file.fileno())
+
+        self.last_flush = time.time()
+
+        return
+
+    def close(self):
+        """ Flush, sync and close the file
+
+        Returns:
+
+        """
+
+        if self.csv_file.closed:
+            return
+
+        try:
+            self.flush(sync=True)
+        finally:
+            self.csv_file.close()
+
+        return
 
 
 class GgResult(object):
     """
     """
 
-    def __init__(self):
-        """ Add class members """
+    def __init__(self, flush_rows=100, flush_seconds=10.0):
+        """ Add class members
+
+        Args:
+            flush_rows (int): Maximum number of records held before the CSVs are flushed
+            flush_seconds (float): Maximum time between flushes of the CSVs
+        """
         table_tokens = "table table_name count table_output_parameter csv".split()
 
         for att in ["fail_{}".format(t) for t in table_tokens]:
@@ -26,9 +286,16 @@ class GgResult(object):
 
         self.pass_count = self.fail_count = 0
 
+        self.resumed = False
+        self.finished_keys = {}  # key name: keys of the rows finished by the run being resumed
+
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.pass_writer = self.fail_writer = None
+
         return
 
-    def initialise(self, result_table_param, fail_table_param, out_workspace, result_table_name, logger):
+    def initialise(self, result_table_param, fail_table_param, out_workspace, result_table_name, logger, resume=False):
         """ Initialise the results for the instance
 
         Args:
@@ -37,6 +304,7 @@ class GgResult(object):
             out_workspace (): Output workspace
             result_table_name (): Base name of result table
             logger ():
+            resume (boolean): Keep the CSVs left by an interrupted run with the same result table name and append to them
 
         Returns:
 
@@ -70,16 +338,19 @@ class GgResult(object):
             self.fail_table = os.path.join(self.output_workspace, self.fail_table_name)
             self.fail_csv = os.path.join(csv_ws, tn + "_FAIL.csv")
 
-        try:
-            os.remove(self.pass_csv)
-            logger.info("Existing results csv at {} removed".format(self.pass_csv))
-        except:
-            pass
-        try:
-            os.remove(self.fail_csv)
-            logger.info("Existing fail csv at {} removed".format(self.fail_csv))
-        except:
-            pass
+        if resume:
+            self.load_finished()
+        else:
+            try:
+                os.remove(self.pass_csv)
+                logger.info("Existing results csv at {} removed".format(self.pass_csv))
+            except:
+                pass
+            try:
+                os.remove(self.fail_csv)
+                logger.info("Existing fail csv at {} removed".format(self.fail_csv))
+            except:
+                pass
 
         tmp_str = "Temporary " if self.output_workspace_type == "LocalDatabase" else ""
         pass_msg = ("{}Result CSV initialised: {}".format(tmp_str, self.pass_csv))
@@ -91,11 +362,97 @@ class GgResult(object):
 
         return
 
+    def load_finished(self):
+        """ Count the records in the existing pass and fail CSVs, which are appended to
+
+        Returns:
+
+        """
+
+        self.resumed = True
+
+        if has_header(self.pass_csv):
+            with open(self.pass_csv, "rb") as csv_file:
+                reader = csv.DictReader(csv_file)
+                self.result_fieldnames = reader.fieldnames
+                self.pass_count = sum(1 for record in reader)
+
+        if has_header(self.fail_csv):
+            with open(self.fail_csv, "rb") as csv_file:
+                reader = csv.DictReader(csv_file)
+                self.failure_fieldnames = reader.fieldnames
+                self.fail_count = sum(1 for record in reader)
+
+        self.logger.info("Resuming: {} results and {} failures already recorded".format(self.pass_count, self.fail_count))
+
+        return
+
+    def read_finished(self, key_name):
+        """ Read the keys of the rows finished by the run being resumed
+
+        A pass record gives its 'source_geodata', or its key_name value when
+        tools report the input under the key name. A fail record gives the key
+        of the row it holds. Other values (outputs, numbers, flags) are not
+        keys, an input matching one of them has not been processed.
+
+        Args:
+            key_name (string): Name of the row key
+
+        Returns:
+            set of keys
+
+        """
+
+        keys = set()
+
+        if has_header(self.pass_csv):
+            with open(self.pass_csv, "rb") as csv_file:
+                reader = csv.DictReader(csv_file)
+                column = "source_geodata" if "source_geodata" in reader.fieldnames else key_name
+                if column in reader.fieldnames:
+                    keys.update(record[column] for record in reader if record[column])
+                else:
+                    self.logger.warn("Results in {} have no '{}' or 'source_geodata' column, finished rows can't be found".format(self.pass_csv, key_name))
+
+        if has_header(self.fail_csv):
+            with open(self.fail_csv, "rb") as csv_file:
+                for record in csv.DictReader(csv_file):
+                    try:
+                        key = literal_eval(record["row_data"]).get(key_name)
+                    except (ValueError, SyntaxError, AttributeError):
+                        continue
+                    if key not in [None, ""]:
+                        keys.add(str(key))
+
+        return keys
+
+    def is_finished(self, row, key_name):
+        """ Flag if a row was finished by the run being resumed
+
+        Args:
+            row (dict): Input row
+            key_name (string): Name of the row key
+
+        Returns:
+            boolean:
+        """
+
+        if not key_name:
+            raise ValueError("Rows can only be resumed by a key, none was given")
+
+        if key_name not in self.finished_keys:  # read when the first row is checked, before this run writes
+            self.finished_keys[key_name] = self.read_finished(key_name)
+
+        key = row.get(key_name)
+
+        return key not in [None, ""] and str(key) in self.finished_keys[key_name]
+
     def add_pass(self, results):
         """ Write result record to CSV
 
-        Writes a result to the temp CSV immediately, trade off between
-        runtime performance, RAM usage and FAILURE (i.e. recovery of results)
+        Results go through a buffered writer, flushed every 'flush_rows' records or
+        'flush_seconds', trade off between runtime performance, RAM usage and
+        FAILURE (i.e. recovery of results)
 
         Args:
             results ():
@@ -134,34 +491,32 @@ class GgResult(object):
 
         # here we will just store the keys from the first result, re-using these will force an error for any inconsistency
         # HACK !
-        if not os.path.isfile(self.pass_csv):
-            result_fieldnames = results[0].keys()
-            setattr(self, "result_fieldnames", result_fieldnames)
-            with open(self.pass_csv, "wb") as csv_file:
-                writer = csv.DictWriter(csv_file, delimiter=',', lineterminator='\n', fieldnames=self.result_fieldnames)
-                writer.writeheader()  # write the header on first call
+        if not self.pass_writer:
+            new_file = not has_header(self.pass_csv)
+            if new_file:
+                setattr(self, "result_fieldnames", results[0].keys())
 
-            self.logger.info("Header written to '{}".format(self.pass_csv))
+            self.pass_writer = BufferedCsvWriter(self.pass_csv, self.result_fieldnames, self.flush_rows, self.flush_seconds)
+
+            if new_file:
+                self.logger.info("Header written to '{}".format(self.pass_csv))
 
         # write the data
-        with open(self.pass_csv, "ab") as csv_file:
-            writer = csv.DictWriter(csv_file, fieldnames=self.result_fieldnames)
-            writer.writerows(results)
-            self.pass_count += len(results)
+        self.pass_writer.writerows(results)
+        self.pass_count += len(results)
 
-        self.logger.info("Result written: {}".format(results))
+        self.logger.debug("Result written: {}".format(results))
 
         return
 
-    def add_fail(self, row):
+    def add_fail(self, row, failure=None):
         """ Write failure record to CSV
 
-        Writes a failure to the temp CSV immediately, trade off between
-        runtime performance, RAM usage and FAILURE (i.e. recovery of results)
+        Failures go through a buffered writer, as for results
 
         Args:
-            geodata ():
             row ():
+            failure (string): Failure message, defaults to the exception currently being handled
 
         Returns:
 
@@ -173,19 +528,14 @@ class GgResult(object):
         if not self.fail_csv:
             raise ValueError("Fail CSV '{}' is not set".format(self.fail_csv))
 
-        # write the header on first call
-        if not os.path.isfile(self.fail_csv):
-            setattr(self, "failure_fieldnames", ["geodata", "failure", "row_data"])
-            with open(self.fail_csv, "wb") as csv_file:
-                writer = csv.DictWriter(csv_file, delimiter=',', lineterminator='\n', fieldnames=self.failure_fieldnames)
-                writer.writeheader()
+        # the header is written on first call
+        if not self.fail_writer:
+            if not has_header(self.fail_csv):
+                setattr(self, "failure_fieldnames", ["geodata", "failure", "row_data"])
+
+            self.fail_writer = BufferedCsvWriter(self.fail_csv, self.failure_fieldnames, self.flush_rows, self.flush_seconds)
 
-        # tb = exc_info()[2]
-        # tbinfo = traceback.format_tb(tb)[0]
-        # Concatenate information together concerning the error into a message string
-        msg = repr(format_exception(*exc_info()))
-        # tbinfo + str(exc_info()[1])
-        msg = msg.strip().replace('\n', ', ').replace('\r', ' ').replace('  ', ' ')
+        msg = failure or format_failure()
 
         geodata = row.values()[0]  #row[0]
 
@@ -202,18 +552,29 @@ class GgResult(object):
         #             geodata = "geodata not set for row"
 
         # write the failure record
-        with open(self.fail_csv, "ab") as csv_file:
-            writer = csv.DictWriter(csv_file, fieldnames=self.failure_fieldnames)
-            writer.writerow({"geodata": geodata, "failure": msg, "row_data": str(row)})
-            self.fail_count += 1
+        self.fail_writer.writerows([{"geodata": geodata, "failure": msg, "row_data": str(row)}])
+        self.fail_count += 1
 
         self.logger.info("Fail written: {}".format(msg))
 
         return
 
+    def close(self):
+        """ Flush, sync and close the csv files, safe to call more than once """
+
+        for writer in [self.pass_writer, self.fail_writer]:
+            if writer:
+                writer.close()
+
+        self.pass_writer = self.fail_writer = None
+
+        return
+
     def write(self):
         """ Write the success and failure csv files to the final tables """
 
+        self.close()
+
         self._write_results()
         self._write_failures()
 
@@ -274,28 +635,118 @@ class GgResult(object):
         return
 
     def table_conversion(self, in_rows, out_path, out_name):
-        """ Copy a file-based table to a local database, returns full path to new table if successful"""
+        """ Copy a file-based table to a local database, returns full path to new table if successful
+
+        Field types (LONG, DOUBLE, DATE or TEXT) and text lengths are inferred
+        from the values, and the rows are written with a single insert cursor
+        """
 
         out_name_full = os.path.join(out_path, out_name)
         self.logger.info("Converting {} --> {}".format(in_rows, out_name_full))
 
-        fms = FieldMappings()
-        fms.addTable(in_rows)
+        schema = infer_schema(in_rows)
+        self.logger.debug("Inferred schema: {}".format(schema))
+
+        CreateTable_management(out_path, out_name)
 
-        # this code does not work as planned but has unexpected side effects...
-        # it makes the fields size themselves properly!
-        for i, f in enumerate(fms):
-            fm = fms.getFieldMap(i)
-            # fm2 = FieldMap()
-            f = Field()
-            f.name = fm.outputField.name
-            f.type = "String"
-            f.length = 100000
-            fm.outputField = f
-            fms.replaceFieldMap(i, fm)
-            # self.logger.info("{} type {} length is {}".format(fm.outputField.name, fm.outputField.type, fm.outputField.length))
+        field_names = []
+        for name, field_type, length in schema:
+            field_name = ValidateFieldName(name, out_path)
+            while field_name in field_names:
+                field_name += "_"
+            field_names.append(field_name)
+            AddField_management(out_name_full, field_name, field_type, field_length=length if field_type == "TEXT" else None)
 
-        TableToTable_conversion(in_rows, out_path, out_name, None, fms, None)
+        field_types = [t for n, t, l in schema]
+
+        with open(in_rows, "rb") as csv_file:
+            reader = csv.reader(csv_file)
+            next(reader)  # header
+
+            with InsertCursor(out_name_full, field_names) as cursor:
+                for row in reader:
+                    row = (row + [""] * len(field_types))[:len(field_types)]
+                    cursor.insertRow([convert_value(v, t) for v, t in zip(row, field_types)])
 
         return out_name_full
 
+
+class GgResultCollector(object):
+    """ Stand-in for GgResult inside pool worker processes
+
+    Records are held in memory and handed back to the parent process,
+    which replays them into its own GgResult in input row order
+    """
+
+    def __init__(self):
+        """ Add class members """
+
+        self.records = []
+
+        return
+
+    def add_pass(self, results):
+        """ Collect result record(s)
+
+        Args:
+            results ():
+
+        Returns:
+
+        """
+
+        results = [self._picklable(result) for result in make_tuple(results)]
+
+        self.records.append(("pass", results))
+
+        return
+
+    def add_fail(self, row, failure=None):
+        """ Collect a failure record
+
+        Args:
+            row ():
+            failure (string): Failure message, defaults to the exception currently being handled
+
+        Returns:
+
+        """
+
+        self.records.append(("fail", (self._picklable(row), failure or format_failure())))
+
+        return
+
+    def drain(self):
+        """ Return the collected records and reset the collection
+
+        Returns:
+            list: (kind, payload) tuples
+        """
+
+        records, self.records = self.records, []
+
+        return records
+
+    @staticmethod
+    def _picklable(data):
+        """ Stringify values (e.g. arcpy objects) that may not survive the trip back to the parent
+
+        The result CSV would stringify these anyway, so the final tables are unchanged
+
+        Args:
+            data ():
+
+        Returns:
+
+        """
+
+        if not isinstance(data, collections.Mapping):
+            return data
+
+        simple = (basestring, int, long, float, bool, datetime.datetime, type(None))
+
+        od = collections.OrderedDict()
+        for k, v in data.iteritems():
+            od[k] = v if isinstance(v, simple) else str(v)
+
+        return od
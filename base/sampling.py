@@ -0,0 +1,232 @@
+""" This module estimates raster statistics from a stratified sample of blocks
+
+The raster is cut into blocks, the blocks (in reading order) into strata of
+neighbouring blocks, and two blocks are drawn at random from each stratum, so the
+sample is spread over the whole raster. Each sampled block gives its count, sum
+and sum of squares per cell, and each stratum's totals are those densities times
+its number of cells, so partial blocks at the edges are weighted by their size.
+
+The mean is a ratio estimate (sum / count). Its 95% confidence bound, and that
+of the count of cells with values, come from the spread of the sampled blocks
+within their strata, i.e. from how much the raster varies over the distance of a
+stratum. With two blocks a stratum the bounds are rough: NoData in a patch that
+neither sampled block touches is not seen, so the count's bound is too small for
+rasters with clustered NoData. The minimum and maximum are those of the sampled
+cells, they can only be inside the true range. The histogram is estimated the
+same way as the totals.
+
+When the sample would cover every block the raster is read in full and the
+statistics are exact.
+
+"""
+from base import blocks
+from base.histogram import QuantileSketch
+import numpy as np
+
+
+SAMPLE_BLOCK_SIZE = 256  # rows and columns of each sampled block
+BLOCKS_PER_STRATUM = 2  # the fewest that give a variance within a stratum
+T_975 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131,
+         2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+HISTOGRAM_BINS = 16
+
+
+def masked_values(block, ignore_values=None, skip=(1, 1)):
+    """ A block with every y_skip-th row and x_skip-th column, ignored values masked
+
+    Args:
+        block: Masked array
+        ignore_values: Values to treat as NoData
+        skip: (x_skip, y_skip) factors
+
+    Returns:
+        Masked array
+
+    """
+
+    x_skip, y_skip = [max(int(s or 1), 1) for s in skip]
+    block = block[::y_skip, ::x_skip]
+
+    if ignore_values:
+        block = np.ma.masked_where(np.in1d(np.ma.getdata(block), ignore_values).reshape(block.shape), block)
+
+    return block
+
+
+def stratified_windows(grid, sample_blocks, block_size=SAMPLE_BLOCK_SIZE, seed=0):
+    """ Windows drawn at random from strata of neighbouring blocks
+
+    Args:
+        grid: RasterGrid
+        sample_blocks: Number of blocks to read
+        block_size: Rows and columns of each block
+        seed: Random seed, the same seed gives the same sample
+
+    Returns:
+        list of (blocks in the stratum, cells in the stratum, sampled windows), None when every block would be read
+
+    """
+
+    windows = list(blocks.iter_windows(grid, block_size, block_size))
+
+    if sample_blocks >= len(windows):
+        return None
+
+    rng = np.random.RandomState(seed)
+    bounds = np.linspace(0, len(windows), max(sample_blocks // BLOCKS_PER_STRATUM, 1) + 1).astype(int)
+
+    strata = []
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        picks = rng.choice(last - first, min(BLOCKS_PER_STRATUM, last - first), replace=False)
+        cells = sum(w[2] * w[3] for w in windows[first:last])
+        strata.append((last - first, cells, [windows[first + i] for i in sorted(picks)]))
+
+    return strata
+
+
+def histogram_edges(minimum, maximum, bins=HISTOGRAM_BINS):
+    """ Equal width bin edges over a range
+
+    Args:
+        minimum: Smallest value
+        maximum: Largest value
+        bins: Number of bins
+
+    Returns:
+        array of bins + 1 edges
+
+    """
+
+    return np.linspace(minimum, maximum if maximum > minimum else minimum + 1, bins + 1)
+
+
+def sampled_statistics(grid, sample_blocks, ignore_values=None, skip=(1, 1), block_size=SAMPLE_BLOCK_SIZE, seed=0):
+    """ Estimate count, mean, std, minimum, maximum and histogram from a stratified sample of blocks
+
+    Args:
+        grid: RasterGrid
+        sample_blocks: Number of blocks to read
+        ignore_values: Values to treat as NoData
+        skip: (x_skip, y_skip) factors within each block
+        block_size: Rows and columns of each block
+        seed: Random seed
+
+    Returns:
+        dict of the statistics, 'mean_bound' and 'count_bound' are the 95% confidence half-widths of the mean and count
+
+    """
+
+    strata = stratified_windows(grid, sample_blocks, block_size, seed)
+
+    if strata is None:
+        return exact_statistics(grid, ignore_values, skip)
+
+    sampled = []  # (stratum blocks, stratum cells, [(count, sum, sum of squares, values) per cell of each block])
+    for size, cells, windows in strata:
+        samples = []
+        for window in windows:
+            values = masked_values(blocks.read_block(grid, window), ignore_values, skip)
+            weight = 1.0 / values.size  # per cell of the block, skipped cells included
+            values = np.ma.compressed(values).astype("float64")
+            samples.append((values.size * weight, values.sum() * weight, np.square(values).sum() * weight, values, weight))
+        sampled.append((size, cells, samples))
+
+    values = [s[3] for size, cells, samples in sampled for s in samples if s[3].size]
+    if not values:
+        return {"method": "sampled", "count": 0, "mean": None, "std": None, "minimum": None, "maximum": None, "histogram": None, "mean_bound": None, "count_bound": None}
+
+    minimum, maximum = min(v.min() for v in values), max(v.max() for v in values)
+    edges = histogram_edges(minimum, maximum)
+
+    count = total = squares = 0.0
+    histogram = np.zeros(HISTOGRAM_BINS)
+    for size, cells, samples in sampled:
+        count += cells * np.mean([s[0] for s in samples])
+        total += cells * np.mean([s[1] for s in samples])
+        squares += cells * np.mean([s[2] for s in samples])
+        histogram += cells * np.mean([np.histogram(s[3], edges)[0] * s[4] for s in samples], axis=0)
+
+    mean = total / count
+
+    # variances of the count and of the ratio estimate from the residuals of each stratum's blocks
+    variance = count_variance = 0.0
+    for size, cells, samples in sampled:
+        n = len(samples)
+        if n > 1:
+            scale = cells ** 2 * (1.0 - n / float(size)) / n
+            variance += scale * np.var([s[1] - mean * s[0] for s in samples], ddof=1)
+            count_variance += scale * np.var([s[0] for s in samples], ddof=1)
+    variance /= count ** 2
+
+    # Student's t for 95% confidence, with a degree of freedom per sampled block beyond the first of its stratum
+    freedom = sum(len(samples) - 1 for size, cells, samples in sampled)
+    t = T_975[freedom - 1] if 0 < freedom <= len(T_975) else 1.96
+
+    return {"method": "sampled",
+            "count": int(round(count)),
+            "mean": mean,
+            "std": max(squares / count - mean ** 2, 0.0) ** 0.5,
+            "minimum": minimum,
+            "maximum": maximum,
+            "histogram": [int(round(h)) for h in histogram],
+            "mean_bound": t * variance ** 0.5,
+            "count_bound": t * count_variance ** 0.5}
+
+
+def exact_statistics(grid, ignore_values=None, skip=(1, 1), block_rows=blocks.BLOCK_SIZE, block_cols=blocks.BLOCK_SIZE):
+    """ Count, mean, std, minimum, maximum and histogram from one read of every block
+
+    Args:
+        grid: RasterGrid
+        ignore_values: Values to treat as NoData
+        skip: (x_skip, y_skip) factors, applied from the first row and column of each block
+        block_rows: Maximum rows per block
+        block_cols: Maximum columns per block
+
+    Returns:
+        dict of the statistics as from sampled_statistics, with bounds of 0
+
+    """
+
+    stats = blocks.StreamingStatistics()
+    sketch = QuantileSketch(discrete=grid.is_integer)
+
+    for window, block in blocks.iter_blocks(grid, block_rows, block_cols):
+        block = masked_values(block, ignore_values, skip)
+        stats.update(block)
+        sketch.update(block)
+
+    out = stats.as_dict()
+    out.update({"method": "exact", "histogram": None, "mean_bound": 0.0 if stats.count else None, "count_bound": 0.0 if stats.count else None})
+
+    if sketch.count:
+        if sketch.width is None:  # one value
+            values, counts = np.array([sketch.minimum]), np.array([sketch.count])
+        else:
+            bins = np.arange(sketch.start, sketch.start + sketch.counts.size, dtype="float64")
+            values = bins if sketch.discrete and sketch.width == 1 else (bins + 0.5) * sketch.width
+            counts = sketch.counts
+        edges = histogram_edges(stats.minimum, stats.maximum)
+        out["histogram"] = [int(h) for h in np.histogram(np.clip(values, edges[0], edges[-1]), edges, weights=counts)[0]]
+
+    return out
+
+
+def relative_error(statistics):
+    """ The larger of the confidence bounds of the mean, as a percentage of the value range, and of the count, as a percentage of the count
+
+    Args:
+        statistics: dict from sampled_statistics
+
+    Returns:
+        float, 0 when the range is 0, infinite when no values were sampled
+
+    """
+
+    if statistics["mean_bound"] is None:
+        return float("inf")
+
+    spread = statistics["maximum"] - statistics["minimum"]
+    mean_error = 100.0 * statistics["mean_bound"] / spread if spread else 0.0
+
+    return max(mean_error, 100.0 * statistics["count_bound"] / statistics["count"])
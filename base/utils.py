@@ -5,7 +5,10 @@ from re import compile
 import arcpy as ap
 import collections
 import csv
+import json
 import numpy
+import sqlite3
+import threading
 
 
 # arc_data_types = "Any,Container,Geo,FeatureDataset,FeatureClass,PlanarGraph,GeometricNetwork,Topology,Text,Table,RelationshipClass,RasterDataset,RasterBand,TIN,CadDrawing,RasterCatalog,Toolbox,Tool,NetworkDataset,Terrain,RepresentationClass,CadastralFabric,SchematicDataset,Locator"
@@ -21,6 +24,7 @@ stats_type = ["ALL", "MEAN", "MAJORITY", "MAXIMUM", "MEDIAN", "MINIMUM", "RANGE"
 pixel_type = ["1_BIT", "2_BIT", "4_BIT", "8_BIT_UNSIGNED", "8_BIT_SIGNED", "16_BIT_UNSIGNED", "16_BIT_SIGNED", "32_BIT_UNSIGNED", "32_BIT_SIGNED", "32_BIT_FLOAT", "64_BIT"]
 raster_formats2 = sorted(["tif", "img", "bmp", "gif", "png", "jpg", "jp2", "dat", "Esri Grid", "bil", "bsq", "bip"])
 transform_methods = ["STANDARDISE", "STRETCH", "NORMALISE", "LOG", "SQUAREROOT", "INVERT"]
+point_value_layouts = ["WIDE", "LONG"]
 
 
 class DoesNotExistError(ValueError):
@@ -196,6 +200,247 @@ def static_vars(**kwargs):
 #     return ret
 
 
+DESCRIBE_CACHE_FILE = "describe_cache.sqlite"
+
+describe_fact_names = ["baseName", "catalogPath", "dataType", "workspaceType", "shapeType", "format", "bandCount"]
+sidecar_suffixes = [".aux.xml", ".ovr", ".vat.dbf", ".vat.cpg", ".xml", ".aux", ".rrd"]  # added to the file name
+sidecar_extensions = [".prj", ".tfw", ".tifw", ".jgw", ".pgw", ".wld", ".hdr", ".clr", ".aux", ".rrd",
+                      ".shx", ".dbf", ".sbn", ".sbx", ".cpg", ".shp.xml"]  # in place of the file extension
+
+
+class DescribeCache(object):
+    """ A memoising cache for facts derived from arcpy.Describe
+
+    Facts are keyed by catalog path and modification time, so a dataset that
+    changes is described again. Memory entries are evicted least recently used
+    first. With a store open, facts for datasets that are files or folders on
+    disk are also kept in SQLite, so repeated runs over an archive skip Describe.
+    Items inside a geodatabase are cached in memory only, and only for a tool
+    run, as their own modification time is not visible on disk
+    """
+
+    def __init__(self, max_items=2000):
+        """
+
+        Args:
+            max_items (int): Maximum number of entries held in memory
+        """
+
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.store = None
+        self.hits = self.misses = 0
+
+        return
+
+    def open_store(self, db_path):
+        """ Back the cache with an SQLite file
+
+        Args:
+            db_path (string): SQLite file, created if necessary
+
+        Returns:
+
+        """
+
+        if self.store:
+            return
+
+        self.store = sqlite3.connect(db_path, timeout=30)
+        self.store.execute("CREATE TABLE IF NOT EXISTS facts (path TEXT PRIMARY KEY, mtime REAL, facts TEXT)")
+        self.store.commit()
+
+        return
+
+    def close_store(self):
+        """ Close the SQLite file
+
+        Returns:
+
+        """
+
+        if self.store:
+            self.store.close()
+            self.store = None
+
+        return
+
+    def clear(self):
+        """ Forget the facts held in memory, the store is kept
+
+        Geodatabase items are keyed on their folder's time, which often does not
+        change with them, so memory entries should not outlive a tool run
+
+        Returns:
+
+        """
+
+        self.items.clear()
+
+        return
+
+    def reset_stats(self):
+        """ Zero the hit and miss counters
+
+        Returns:
+
+        """
+
+        self.hits = self.misses = 0
+
+        return
+
+    def stats(self):
+        """ Summary of cache use
+
+        Returns:
+            string:
+        """
+
+        return "Describe cache: {} hits, {} misses, {} items held".format(self.hits, self.misses, len(self.items))
+
+    @staticmethod
+    def modification_key(path):
+        """ Return a modification time for the path and a flag if it is the path's own
+
+        Files take the latest time of the file and its known sidecars (e.g. a
+        shapefile's .prj or a raster's .aux.xml), folders (e.g. Esri Grids) the
+        latest time of the folder and its files. Paths that are not on disk (e.g.
+        geodatabase items) take the time of the nearest folder above them
+
+        Args:
+            path (string):
+
+        Returns:
+            tuple: (mtime, own)
+        """
+
+        if os.path.isfile(path):
+            base = os.path.splitext(path)[0]
+            times = [os.path.getmtime(path)]
+            for f in [path + s for s in sidecar_suffixes] + [base + e for e in sidecar_extensions]:
+                try:
+                    times.append(os.path.getmtime(f))
+                except OSError:  # no such sidecar
+                    pass
+            return max(times), True
+
+        if os.path.isdir(path):
+            times = [os.path.getmtime(path)]
+            for f in os.listdir(path):
+                f = os.path.join(path, f)
+                if os.path.isfile(f):
+                    times.append(os.path.getmtime(f))
+            return max(times), True
+
+        parent = os.path.dirname(path)
+        while parent and parent != os.path.dirname(parent):
+            if os.path.isdir(parent):
+                return os.path.getmtime(parent), False
+            parent = os.path.dirname(parent)
+
+        return None, False
+
+    def facts(self, geodata):
+        """ Return the Describe facts for a dataset
+
+        Args:
+            geodata (string): Dataset
+
+        Returns:
+            dict: fact name/value pairs, values are None if not applicable
+        """
+
+        path = os.path.normcase(os.path.abspath(geodata)) if os.path.isabs(geodata) else geodata
+        mtime, own = self.modification_key(path)
+
+        if mtime is None:  # layers, table views, in_memory etc. can change without trace
+            self.misses += 1
+            if not geodata_exists(geodata):
+                raise DoesNotExistError(geodata)
+            return describe_facts(geodata)
+
+        key = (path, mtime)
+
+        if key in self.items:
+            self.hits += 1
+            value = self.items.pop(key)
+            self.items[key] = value  # most recently used goes to the end
+            return value
+
+        value = None
+
+        if self.store and own:
+            row = self.store.execute("SELECT facts FROM facts WHERE path = ? AND mtime = ?", (path, mtime)).fetchone()
+            if row:
+                self.hits += 1
+                value = json.loads(row[0])
+
+        if value is None:
+            self.misses += 1
+            if not geodata_exists(geodata):
+                raise DoesNotExistError(geodata)
+            value = describe_facts(geodata)
+
+            if self.store and own:
+                self.store.execute("INSERT OR REPLACE INTO facts VALUES (?, ?, ?)", (path, mtime, json.dumps(value)))
+                self.store.commit()
+
+        self.items[key] = value
+
+        while len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+
+        return value
+
+
+def describe_facts(geodata):
+    """ Describe a dataset and keep the simple facts used by the tools
+
+    Args:
+        geodata (string): Dataset
+
+    Returns:
+        dict: fact name/value pairs
+    """
+
+    d = ap.Describe(geodata)
+
+    facts = {}
+    for att in describe_fact_names:
+        try:
+            facts[att] = getattr(d, att)
+        except (AttributeError, RuntimeError, IOError):
+            facts[att] = None
+
+    try:
+        srs = d.spatialReference
+        facts["spatialReference"] = srs.name
+        facts["spatialReferenceString"] = srs.exportToString()
+    except (AttributeError, RuntimeError, IOError):
+        facts["spatialReference"] = facts["spatialReferenceString"] = None
+
+    return facts
+
+
+describe_cache = DescribeCache()
+
+
+def get_facts(geodata):
+    """ Return the cached Describe facts for a dataset
+
+    Raises DoesNotExistError if the dataset has to be described and does not exist
+
+    Args:
+        geodata (string): Dataset
+
+    Returns:
+        dict: fact name/value pairs
+    """
+
+    return describe_cache.facts(geodata)
+
+
 def describe_arc(geodata):
     """
 
@@ -221,7 +466,7 @@ def is_local_gdb(workspace):
     Returns:
 
     """
-    return describe_arc(workspace).workspaceType == "LocalDatabase"
+    return get_facts(workspace)["workspaceType"] == "LocalDatabase"
 
 
 def is_file_system(workspace):
@@ -233,7 +478,7 @@ def is_file_system(workspace):
     Returns:
 
     """
-    return describe_arc(workspace).workspaceType == "FileSystem"
+    return get_facts(workspace)["workspaceType"] == "FileSystem"
 
 
 def get_search_cursor_rows(in_table, field_names, where_clause=None):
@@ -437,6 +682,197 @@ def parse_proj_string_for_name(proj_string):
     return y.split(",")[0].strip("'")
 
 
+def rectangle_cells(neighbourhood):
+    """ The size of a rectangle neighbourhood given in cells
+
+    Args:
+        neighbourhood: Neighbourhood parameter text, e.g. 'Rectangle 3 5 CELL' (width, height)
+
+    Returns:
+        (rows, cols), or None for other shapes and map units
+
+    """
+
+    nbr = str(neighbourhood).split()
+
+    if len(nbr) < 3 or nbr[0].upper() != "RECTANGLE" or (len(nbr) > 3 and nbr[3].upper() != "CELL"):
+        return None
+
+    return int(float(nbr[2])), int(float(nbr[1]))
+
+
+class NameAllocator(object):
+    """ Hands out unique, valid output names for a run
+
+    Each output workspace is described and listed once, rather than calling
+    Describe, ValidateTableName and CreateUniqueName for every output. Names
+    handed out are reserved, so two rows (or two worker processes, once the
+    reservations are shared) cannot be given the same name
+    """
+
+    safe_name = compile(r"^[A-Za-z][A-Za-z0-9_]*$")
+
+    # names that pass the pattern above but that the geodatabase will not accept as is
+    reserved_words = {"add", "alter", "and", "between", "by", "column", "create", "delete", "drop", "exists", "for", "from", "group",
+                      "in", "insert", "into", "is", "like", "not", "null", "or", "order", "select", "set", "table", "update", "values", "where"}
+
+    def __init__(self):
+        """ Add class members """
+
+        self.workspaces = {}
+        self.validated = {}
+        self.reserved = {}
+        self.lock = threading.Lock()
+
+        return
+
+    def reset(self):
+        """ Forget workspaces and reservations, e.g. at the start of a run
+
+        Returns:
+
+        """
+
+        self.workspaces = {}
+        self.validated = {}
+        self.reserved = {}
+        self.lock = threading.Lock()
+
+        return
+
+    def share(self, reserved, lock):
+        """ Use reservations and a lock shared between processes (e.g. multiprocessing.Manager proxies)
+
+        Args:
+            reserved (dict): Shared reservations
+            lock (Lock): Shared lock
+
+        Returns:
+
+        """
+
+        self.reserved = reserved
+        self.lock = lock
+
+        return
+
+    def workspace(self, out_wspace):
+        """ Describe and list a workspace, once
+
+        Args:
+            out_wspace (string): Output workspace
+
+        Returns:
+            dict: 'local_gdb' flag and 'existing' set of lower case names
+        """
+
+        ws = self.workspaces.get(out_wspace, None)
+
+        if ws is None:
+            local_gdb = get_facts(out_wspace)["workspaceType"] == "LocalDatabase"
+            ws = {"local_gdb": local_gdb, "existing": set(n.lower() for n in list_workspace_names(out_wspace, local_gdb))}
+            self.workspaces[out_wspace] = ws
+
+        return ws
+
+    def validate(self, name, out_wspace):
+        """ Make a name valid for the workspace, arcpy is only asked about unusual names
+
+        Args:
+            name (string):
+            out_wspace (string):
+
+        Returns:
+            string: valid name
+        """
+
+        if self.safe_name.match(name) and name.lower() not in self.reserved_words:
+            return name
+
+        key = (name, out_wspace)
+        if key not in self.validated:
+            self.validated[key] = ap.ValidateTableName(name, out_wspace)
+
+        return self.validated[key]
+
+    def allocate(self, like_name, out_wspace, ext='', prefix='', suffix='', vector=False):
+        """ Return a unique full path for an output named like an input
+
+        Args:
+            like_name (string): Input name the output is named after
+            out_wspace (string): Output workspace
+            ext (string): Output extension or format
+            prefix (string): Name prefix
+            suffix (string): Name suffix
+            vector (boolean): Vector outputs take the extension as given ('Esri Grid' is a raster format)
+
+        Returns:
+            string: full path
+        """
+
+        _, __, name, ___ = split_up_filename(like_name)
+
+        ws = self.workspace(out_wspace)
+
+        ext = "" if (ws["local_gdb"] or (ext == "Esri Grid" and not vector)) else (ext or "")
+        ext = "." + ext if (ext and ext[0] != ".") else ext
+
+        name = self.validate(prefix + name + suffix, out_wspace)
+
+        with self.lock:
+            unique, i = name, 0
+            while self.is_taken(ws, out_wspace, unique, ext):
+                unique = "{}{}".format(name, i)  # as arcpy.CreateUniqueName
+                i += 1
+
+            self.reserved[(out_wspace, (unique + ext).lower())] = True
+
+        return os.path.join(out_wspace, unique + ext)
+
+    def is_taken(self, ws, out_wspace, name, ext):
+        """ Flag if a name exists in the workspace or has been handed out
+
+        Args:
+            ws (dict): Workspace listing
+            out_wspace (string): Output workspace
+            name (string): Candidate name
+            ext (string): Extension
+
+        Returns:
+            boolean:
+        """
+
+        name_lower = name.lower()
+        full_lower = (name + ext).lower()
+
+        return name_lower in ws["existing"] or full_lower in ws["existing"] or (out_wspace, full_lower) in self.reserved
+
+
+def list_workspace_names(out_wspace, local_gdb):
+    """ List the names of everything in a workspace in one pass
+
+    Args:
+        out_wspace (string): Workspace
+        local_gdb (boolean): Flag if it is a geodatabase
+
+    Returns:
+        list: names, with extensions for files
+    """
+
+    if not local_gdb:
+        return os.listdir(out_wspace)
+
+    names = []
+    for root, dirs, files in ap.da.Walk(out_wspace):
+        names.extend(dirs)
+        names.extend(files)
+
+    return names
+
+
+name_allocator = NameAllocator()
+
+
 # @base.log.log_error
 def make_raster_name(like_name, out_wspace, ext='', prefix='', suffix=''):
     """
@@ -444,15 +880,8 @@ def make_raster_name(like_name, out_wspace, ext='', prefix='', suffix=''):
     Returns:
         object:
     """
-    _, __, r_name, r_ext = split_up_filename(like_name)
-
-    ext = "" if (is_local_gdb(out_wspace) or ext == "Esri Grid") else ext
-    ext = "." + ext if (ext and ext[0] != ".") else ext
 
-    raster_name = ap.ValidateTableName(prefix + r_name + suffix, out_wspace)
-    raster_name = ap.CreateUniqueName(raster_name, out_wspace)
-
-    return os.path.join(out_wspace, raster_name + ext)
+    return name_allocator.allocate(like_name, out_wspace, ext, prefix, suffix)
 
 
 # @base.log.log_error
@@ -469,15 +898,8 @@ def make_table_name(like_name, out_wspace, ext='', prefix='', suffix=''):
     Returns:
 
     """
-    _, __, t_name, t_ext = split_up_filename(like_name)
-
-    ext = "" if (is_local_gdb(out_wspace) or ext == "Esri Grid") else ext
-    ext = "." + ext if (ext and ext[0] != ".") else ext
-
-    table_name = ap.ValidateTableName(prefix + t_name + suffix, out_wspace)
-    table_name = ap.CreateUniqueName(table_name, out_wspace)
 
-    return os.path.join(out_wspace, table_name + ext)
+    return name_allocator.allocate(like_name, out_wspace, ext, prefix, suffix)
 
 
 # @base.log.log_error
@@ -494,15 +916,8 @@ def make_vector_name(like_name, out_wspace, ext='', prefix='', suffix=''):
     Returns:
 
     """
-    _, __, v_name, v_ext = split_up_filename(like_name)
 
-    ext = "" if is_local_gdb(out_wspace) else ext
-    ext = "." + ext if (ext and ext[0] != ".") else ext
-
-    vector_name = ap.ValidateTableName(prefix + v_name + suffix, out_wspace)
-    vector_name = ap.CreateUniqueName(vector_name, out_wspace)
-
-    return os.path.join(out_wspace, vector_name + ext)
+    return name_allocator.allocate(like_name, out_wspace, ext, prefix, suffix, vector=True)
 
 
 # @base.log.log_error
@@ -515,14 +930,7 @@ def is_table(item):
     Returns:
 
     """
-    if not geodata_exists(item):
-        raise DoesNotExistError(item)
-
-    d = ap.Describe(item)
-    try:
-        return d.dataType in ["Table"]
-    except:
-        return False
+    return get_facts(item)["dataType"] in ["Table"]
 
 
 # @base.log.log_error
@@ -535,14 +943,7 @@ def is_vector(item):
     Returns:
 
     """
-    if not geodata_exists(item):
-        raise DoesNotExistError(item)
-
-    d = ap.Describe(item)
-    try:
-        return d.dataType in ["FeatureClass", "ShapeFile"]
-    except:
-        return False
+    return get_facts(item)["dataType"] in ["FeatureClass", "ShapeFile"]
 
 
 # @base.log.log_error
@@ -555,14 +956,7 @@ def is_raster(item):
     Returns:
 
     """
-    if not geodata_exists(item):
-        raise DoesNotExistError(item)
-
-    d = ap.Describe(item)
-    try:
-        return d.dataType == "RasterDataset"
-    except:
-        return False
+    return get_facts(item)["dataType"] == "RasterDataset"
 
 
 # @base.log.log_error
@@ -751,23 +1145,22 @@ def get_srs(geodata, raise_unknown_error=False, as_object=False):
 
     """
 
-    if not geodata_exists(geodata):
-
-        raise DoesNotExistError(geodata)
+    facts = get_facts(geodata)
 
-    try:
-        srs = ap.Describe(geodata).spatialReference
-    except:
+    srs_name = facts["spatialReference"]
+    if srs_name is None:
         raise ValueError("'{}' has no 'spatialReference' property".format(geodata))
 
-    if "unknown" in srs.name.lower() and raise_unknown_error:
+    if "unknown" in srs_name.lower() and raise_unknown_error:
 
         raise UnknownSrsError(geodata)
 
     if as_object:
+        srs = ap.SpatialReference()
+        srs.loadFromString(facts["spatialReferenceString"])
         return srs
     else:
-        return srs.name
+        return srs_name
 
 
 def validate_geodata(geodata, raster=False, vector=False, table=False, srs_known=False, polygon=False, message_func=None, NetCdf=False):
@@ -790,14 +1183,10 @@ def validate_geodata(geodata, raster=False, vector=False, table=False, srs_known
     if message_func:
         message_func("Validating '{}'".format(geodata))
 
-    if not geodata_exists(geodata):
-
-        raise DoesNotExistError(geodata)
+    facts = get_facts(geodata)
 
-    desc = ap.Describe(geodata)
-    try:
-        dt = desc.dataType
-    except:
+    dt = facts["dataType"]
+    if dt is None:
         raise UnknownDataTypeError(geodata, "No dataType property")
 
     if raster and dt not in ["RasterDataset"]:
@@ -813,9 +1202,8 @@ def validate_geodata(geodata, raster=False, vector=False, table=False, srs_known
         raise NotTableError(geodata, dt)
 
     if polygon:
-        try:
-            st = desc.shapeType
-        except:
+        st = facts["shapeType"]
+        if st is None:
             raise UnknownDataTypeError(geodata, "No shapeType property")
 
         if st != "Polygon":
@@ -882,3 +1270,19 @@ def get_band_nodata_value(raster, bandindex=1):
     return ndv
 
 
+def set_nodata_tag(raster, ndv):
+    """ Change the NoData value of every band of a raster in place, no cells are rewritten
+
+    Args:
+        raster: The raster
+        ndv: The new NoData value
+
+    Returns:
+
+    """
+
+    band_count = ap.Describe(raster).bandCount
+
+    ap.SetRasterProperties_management(raster, nodata=";".join("{} {}".format(b, ndv) for b in range(1, band_count + 1)))
+
+    return
@@ -0,0 +1,512 @@
+""" This module provides zonal summaries of rasters with NumPy
+
+Zones (polygon features or a raster) are rasterised and aligned to a value
+raster grid once, by ZoneIndex, and the result is reused for every raster on
+that grid. Zones are numbered 0..n-1 in the order of their sorted zone field
+values, cells in no zone are -1.
+
+Zonal statistics and zonal counts (a zone by value cross-tabulation) are then
+accumulated block by block with np.bincount and ufunc.reduceat, so memory is
+bounded by the block size and the number of zones (and categories).
+
+"""
+from contextlib import contextmanager
+from base import blocks
+from base.utils import get_facts
+import arcpy
+import numpy as np
+
+
+MAX_CACHED_CELLS = 50000000  # zone ids for grids up to this size are held in memory (int32, 200MB)
+
+raster_data_types = ["RasterDataset", "RasterLayer", "RasterBand"]
+
+zonal_statistics = ["COUNT", "AREA", "SUM", "MEAN", "MINIMUM", "MAXIMUM", "RANGE", "STD", "VARIETY"]
+
+
+@contextmanager
+def aligned_environment(grid):
+    """ Set the geoprocessing environment to the extent, cells and spatial reference of a grid
+
+    Args:
+        grid: RasterGrid
+
+    Returns:
+
+    """
+
+    names = ["snapRaster", "extent", "cellSize", "outputCoordinateSystem"]
+    saved = [getattr(arcpy.env, n) for n in names]
+
+    try:
+        arcpy.env.snapRaster = grid.raster
+        arcpy.env.extent = arcpy.Extent(grid.x_min, grid.y_min, grid.x_max, grid.y_max)
+        arcpy.env.cellSize = grid.cell_width
+        arcpy.env.outputCoordinateSystem = grid.spatial_reference
+        yield
+
+    finally:
+        for n, v in zip(names, saved):
+            setattr(arcpy.env, n, v)
+
+
+def align_zones(zones, zone_field, grid):
+    """ Rasterise (or resample) zones onto a grid in the scratch folder
+
+    Args:
+        zones: Polygon features or a raster
+        zone_field: Field holding the zone values
+        grid: RasterGrid to align to
+
+    Returns:
+        (aligned raster path, {cell code: zone value})
+
+    """
+
+    aligned = arcpy.CreateScratchName("zon", ".tif", "RasterDataset", arcpy.env.scratchFolder)
+
+    if get_facts(zones)["dataType"] in raster_data_types:
+        code_field = "Value"
+        with aligned_environment(grid):
+            arcpy.Resample_management(zones, aligned, grid.cell_width, "NEAREST")
+    else:
+        code_field = arcpy.Describe(zones).OIDFieldName  # polygons are burnt in by id, so text zone fields work
+        with aligned_environment(grid):
+            arcpy.PolygonToRaster_conversion(zones, code_field, aligned, "CELL_CENTER", "", grid.cell_width)
+
+    if zone_field.upper() == code_field.upper():
+        with arcpy.da.SearchCursor(zones, [code_field]) as cursor:
+            code_zones = {row[0]: row[0] for row in cursor}
+    else:
+        with arcpy.da.SearchCursor(zones, [code_field, zone_field]) as cursor:
+            code_zones = {row[0]: row[1] for row in cursor if row[1] is not None}
+
+    return aligned, code_zones
+
+
+class ZoneIndex(object):
+    """ Zone ids for the cells of a grid, made once and reused for every raster on it
+    """
+
+    def __init__(self, zones, zone_field, grid, max_cached_cells=MAX_CACHED_CELLS):
+        """
+
+        Args:
+            zones: Polygon features or a raster
+            zone_field: Field holding the zone values
+            grid: RasterGrid of the value rasters
+            max_cached_cells: Hold the zone ids in memory for grids up to this size
+        """
+
+        self.signature = grid.signature
+        self.aligned, code_zones = align_zones(zones, zone_field, grid)
+
+        self.zone_grid = blocks.RasterGrid(self.aligned)
+        if (self.zone_grid.rows, self.zone_grid.cols) != (grid.rows, grid.cols):
+            self.close()
+            raise ValueError("Zones '{}' could not be aligned to the grid of '{}'".format(zones, grid.raster))
+
+        self.values = sorted(set(code_zones.itervalues()))
+        zone_numbers = dict((v, i) for i, v in enumerate(self.values))
+
+        self.codes = np.array(sorted(code_zones), dtype="float64")
+        self.code_ids = np.array([zone_numbers[code_zones[c]] for c in sorted(code_zones)], dtype="int32")
+
+        self.array = None
+        if grid.rows * grid.cols <= max_cached_cells:
+            self.array = np.empty((grid.rows, grid.cols), dtype="int32")
+            for window, block in blocks.iter_blocks(self.zone_grid):
+                r, c, nr, nc = window
+                self.array[r:r + nr, c:c + nc] = self.code_to_id(block)
+            self.close()
+
+        return
+
+    @property
+    def count(self):
+        """ The number of zones """
+
+        return len(self.values)
+
+    def code_to_id(self, block):
+        """ Convert a block of zone cell codes to zone ids
+
+        Args:
+            block: Masked array of cell codes
+
+        Returns:
+            int32 array, -1 for cells in no zone
+
+        """
+
+        data = np.ma.getdata(block)
+        idx = np.searchsorted(self.codes, data)
+        idx[idx >= self.codes.size] = 0
+        found = ~np.ma.getmaskarray(block) & (self.codes[idx] == data) if self.codes.size else np.zeros(data.shape, dtype=bool)
+
+        return np.where(found, self.code_ids[idx] if self.codes.size else -1, -1).astype("int32")
+
+    def zone_ids(self, window):
+        """ Zone ids of a window
+
+        Args:
+            window: (row, col, nrows, ncols)
+
+        Returns:
+            int32 array, -1 for cells in no zone
+
+        """
+
+        if self.array is not None:
+            r, c, nr, nc = window
+            return self.array[r:r + nr, c:c + nc]
+
+        return self.code_to_id(blocks.read_block(self.zone_grid, window))
+
+    def close(self):
+        """ Delete the aligned zone raster
+
+        Returns:
+
+        """
+
+        if self.aligned:
+            try:
+                arcpy.Delete_management(self.aligned)
+            finally:
+                self.aligned = None
+
+        return
+
+
+class ZoneIndexCache(object):
+    """ The ZoneIndex of the last grid used
+
+    Only one index is held, so a batch over many grids does not keep an index
+    (and an aligned raster) for each. Rasters on the same grid should be kept
+    together in the input to reuse it.
+    """
+
+    def __init__(self):
+
+        self.index = None
+        self.signature = None
+
+        return
+
+    def holds(self, grid):
+        """ Is the index for a grid held
+
+        Args:
+            grid: RasterGrid of the value raster
+
+        Returns:
+            bool
+
+        """
+
+        return self.index is not None and self.signature == grid.signature
+
+    def get(self, zones, zone_field, grid):
+        """ The index for a grid, replacing the one held if it is for another grid
+
+        Args:
+            zones: Polygon features or a raster
+            zone_field: Field holding the zone values
+            grid: RasterGrid of the value raster
+
+        Returns:
+            ZoneIndex
+
+        """
+
+        if not self.holds(grid):
+            self.close()
+            self.index, self.signature = ZoneIndex(zones, zone_field, grid), grid.signature
+
+        return self.index
+
+    def close(self):
+        """ Drop the index and delete its aligned raster
+
+        Returns:
+
+        """
+
+        index, self.index, self.signature = self.index, None, None
+
+        if index is not None:
+            index.close()
+
+        return
+
+
+def group_by_zone(zone_ids, values):
+    """ Sort values by zone for ufunc.reduceat
+
+    Args:
+        zone_ids: Zone id of each value
+        values: The values
+
+    Returns:
+        (zones present, start of each zone, values sorted by zone)
+
+    """
+
+    order = np.argsort(zone_ids, kind="mergesort")
+    z, v = zone_ids[order], values[order]
+    starts = np.flatnonzero(np.r_[True, z[1:] != z[:-1]])
+
+    return z[starts], starts, v
+
+
+class ZonalStatistics(object):
+    """ Zonal count, sum, mean, standard deviation, minimum, maximum and variety accumulated block by block
+    """
+
+    def __init__(self, zone_count, variety=False, compact_pairs=1000000):
+        """
+
+        Args:
+            zone_count: Number of zones
+            variety: Count distinct values per zone (integer rasters)
+            compact_pairs: Merge the distinct (zone, value) pairs when this many are held
+        """
+
+        self.n = zone_count
+        self.count = np.zeros(zone_count, dtype="int64")
+        self.nodata_count = np.zeros(zone_count, dtype="int64")
+        self.sum = np.zeros(zone_count, dtype="float64")
+        self.mean = np.zeros(zone_count, dtype="float64")
+        self.m2 = np.zeros(zone_count, dtype="float64")
+        self.minimum = np.full(zone_count, np.inf)
+        self.maximum = np.full(zone_count, -np.inf)
+
+        self.variety = variety
+        self.compact_pairs = compact_pairs
+        self.pairs = []
+        self.pair_count = 0
+
+        return
+
+    def update(self, zone_ids, block):
+        """ Add a block
+
+        Args:
+            zone_ids: Zone id of each cell, -1 for none
+            block: Masked array of values
+
+        Returns:
+
+        """
+
+        in_zone = zone_ids >= 0
+        mask = np.ma.getmaskarray(block)
+
+        self.nodata_count += np.bincount(zone_ids[in_zone & mask], minlength=self.n)
+
+        valid = in_zone & ~mask
+        z = zone_ids[valid]
+        if not z.size:
+            return
+
+        x = np.ma.getdata(block)[valid].astype("float64")
+
+        # pairwise Welford merge of the block moments into the running moments
+        n_b = np.bincount(z, minlength=self.n)
+        s_b = np.bincount(z, x, minlength=self.n)
+        mean_b = s_b / np.maximum(n_b, 1)
+        m2_b = np.bincount(z, np.square(x - mean_b[z]), minlength=self.n)
+
+        total = self.count + n_b
+        present = n_b > 0
+        delta = mean_b - self.mean
+        self.mean[present] += delta[present] * n_b[present] / total[present]
+        self.m2[present] += m2_b[present] + np.square(delta[present]) * self.count[present] * n_b[present] / total[present]
+        self.count = total
+        self.sum += s_b
+
+        zones, starts, values = group_by_zone(z, x)
+        self.minimum[zones] = np.minimum(self.minimum[zones], np.minimum.reduceat(values, starts))
+        self.maximum[zones] = np.maximum(self.maximum[zones], np.maximum.reduceat(values, starts))
+
+        if self.variety:
+            self.add_pairs(z, x)
+
+        return
+
+    def add_pairs(self, z, x):
+        """ Hold the distinct (zone, value) pairs of a block
+
+        Args:
+            z: Zone ids
+            x: Values
+
+        Returns:
+
+        """
+
+        pairs = np.unique(np.rec.fromarrays([z.astype("int64"), x], names="z,v"))
+        self.pairs.append(pairs)
+        self.pair_count += pairs.size
+
+        if self.pair_count > self.compact_pairs and len(self.pairs) > 1:
+            self.pairs = [np.unique(np.concatenate(self.pairs))]
+            self.pair_count = self.pairs[0].size
+
+        return
+
+    def results(self, statistics, nodata_treatment="DATA", cell_area=1.0):
+        """ The statistics for each zone
+
+        Args:
+            statistics: Names from zonal_statistics
+            nodata_treatment: 'NODATA' gives no statistics for zones with NoData cells
+            cell_area: Area of a cell, for AREA
+
+        Returns:
+            list of {statistic: value} per zone id, None for zones without cells, with
+            None values for zones holding NoData when nodata_treatment is 'NODATA'
+
+        """
+
+        variety = None
+        if self.variety:
+            pairs = np.unique(np.concatenate(self.pairs)) if self.pairs else np.zeros(0, dtype=[("z", "int64"), ("v", "float64")])
+            variety = np.bincount(pairs["z"], minlength=self.n)
+
+        std = np.sqrt(self.m2 / np.maximum(self.count, 1))
+
+        out = []
+        for i in xrange(self.n):
+            if not self.count[i] and not self.nodata_count[i]:
+                out.append(None)
+                continue
+            if not self.count[i] or (nodata_treatment == "NODATA" and self.nodata_count[i]):
+                out.append(dict((k, None) for k in statistics))
+                continue
+            all_stats = {"COUNT": int(self.count[i]),
+                         "AREA": self.count[i] * cell_area,
+                         "SUM": self.sum[i],
+                         "MEAN": self.mean[i],
+                         "MINIMUM": self.minimum[i],
+                         "MAXIMUM": self.maximum[i],
+                         "RANGE": self.maximum[i] - self.minimum[i],
+                         "STD": std[i],
+                         "VARIETY": None if variety is None else int(variety[i])}
+            out.append(dict((k, all_stats[k]) for k in statistics))
+
+        return out
+
+
+def zonal_statistics_table(index, grid, statistics, nodata_treatment="DATA"):
+    """ Read a raster once and summarise it by zone
+
+    Args:
+        index: ZoneIndex for the raster grid
+        grid: RasterGrid of the value raster
+        statistics: Names from zonal_statistics
+        nodata_treatment: 'DATA' ignores NoData cells, 'NODATA' gives no statistics for zones with NoData cells
+
+    Returns:
+        list of {statistic: value} per zone id, see ZonalStatistics.results
+
+    """
+
+    acc = ZonalStatistics(index.count, variety="VARIETY" in statistics and grid.is_integer)
+
+    for window, block in blocks.iter_blocks(grid):
+        acc.update(index.zone_ids(window), block)
+
+    return acc.results(statistics, nodata_treatment, grid.cell_width * grid.cell_height)
+
+
+class ZonalCounts(object):
+    """ Cell counts for each zone and category of a categorical raster, accumulated block by block
+
+    Categories are held sorted and the zone x category count matrix grows a
+    column when a block brings a new category, so each block is counted with
+    one np.bincount of 'zone * category count + category'.
+    """
+
+    def __init__(self, zone_count):
+        """
+
+        Args:
+            zone_count: Number of zones
+        """
+
+        self.n = zone_count
+        self.categories = np.zeros(0, dtype="int64")
+        self.counts = np.zeros((zone_count, 0), dtype="int64")
+
+        return
+
+    def update(self, zone_ids, block):
+        """ Add a block
+
+        Args:
+            zone_ids: Zone id of each cell, -1 for cells to leave out
+            block: Masked array of integer values
+
+        Returns:
+
+        """
+
+        valid = (zone_ids >= 0) & ~np.ma.getmaskarray(block)
+        z = zone_ids[valid].astype("int64")
+        if not z.size:
+            return
+
+        x = np.ma.getdata(block)[valid].astype("int64")
+
+        new = np.setdiff1d(np.unique(x), self.categories, assume_unique=True)
+        if new.size:
+            at = np.searchsorted(self.categories, new)
+            self.categories = np.insert(self.categories, at, new)
+            self.counts = np.insert(self.counts, at, 0, axis=1)
+
+        ncat = self.categories.size
+        key = z * ncat + np.searchsorted(self.categories, x)
+        self.counts += np.bincount(key, minlength=self.n * ncat).reshape(self.n, ncat)
+
+        return
+
+    def results(self):
+        """ The non-zero counts
+
+        Returns:
+            list of (zone id, category, count)
+
+        """
+
+        zones, cats = np.nonzero(self.counts)
+
+        return [(int(z), int(self.categories[c]), int(self.counts[z, c])) for z, c in zip(zones, cats)]
+
+
+def zonal_counts_table(index, grid, zone_filter=None):
+    """ Read a categorical raster once and count its cells by zone and value
+
+    Args:
+        index: ZoneIndex for the raster grid
+        grid: RasterGrid of the integer value raster
+        zone_filter: Boolean array by zone id, only zones flagged True are counted
+
+    Returns:
+        list of (zone id, category, count)
+
+    """
+
+    if not grid.is_integer:
+        raise ValueError("Raster '{}' is not an integer raster, zonal counts need categories".format(grid.raster))
+
+    acc = ZonalCounts(index.count)
+
+    for window, block in blocks.iter_blocks(grid):
+        zone_ids = index.zone_ids(window)
+        if zone_filter is not None:
+            zone_ids = np.where(zone_filter[np.maximum(zone_ids, 0)] & (zone_ids >= 0), zone_ids, -1)
+        acc.update(zone_ids, block)
+
+    return acc.results()
@@ -0,0 +1,96 @@
+""" NumPy arrays standing in for rasters, so the block engines can be checked without reading or writing rasters
+
+"""
+from contextlib import contextmanager
+from base import blocks
+import numpy as np
+
+
+class ArrayGrid(blocks.RasterGrid):
+    """ A RasterGrid over an array, 1 unit cells with the lower left corner at 0, 0
+    """
+
+    def __init__(self, array, nodata=None):
+        """
+
+        Args:
+            array: 2D array of the cells, row 0 at the top
+            nodata: NoData value
+        """
+
+        self.array = np.asarray(array)
+        self.raster = "array"
+        self.rows, self.cols = self.array.shape
+        self.cell_width = self.cell_height = 1.0
+        self.x_min = self.y_min = 0.0
+        self.x_max, self.y_max = float(self.cols), float(self.rows)
+        self.nodata = nodata
+        self.pixel_type = None
+        self.band_count = 1
+        self.spatial_reference = None
+        self.is_integer = self.array.dtype.kind in "iub"
+
+        return
+
+    @property
+    def dtype(self):
+        """ The type of the array """
+
+        return self.array.dtype
+
+
+class ArrayWriter(blocks.BlockWriter):
+    """ A BlockWriter filling an array in written[out_raster]
+    """
+
+    written = {}
+
+    def write(self, window, array):
+
+        row, col, nrows, ncols = window
+
+        if self.out_raster not in self.written:
+            self.written[self.out_raster] = np.ma.masked_all((self.grid.rows, self.grid.cols), dtype=self.dtype)
+
+        a = np.ma.masked_invalid(array) if np.asarray(array).dtype.kind == "f" else np.ma.asarray(array)
+        a = a.astype(self.dtype).filled(self.nodata)
+
+        self.written[self.out_raster][row:row + nrows, col:col + ncols] = np.ma.masked_equal(a, self.nodata)
+        self.block_count += 1
+
+        return
+
+    def close(self):
+
+        return
+
+
+def read_array(grid, window, raster=None):
+    """ read_block for an ArrayGrid """
+
+    row, col, nrows, ncols = window
+    a = grid.array[row:row + nrows, col:col + ncols]
+
+    mask = np.zeros(a.shape, dtype=bool) if grid.nodata is None else (a == grid.nodata)
+    if a.dtype.kind == "f":
+        mask |= np.isnan(a)
+
+    return np.ma.masked_array(a, mask=mask)
+
+
+@contextmanager
+def array_io():
+    """ Read ArrayGrids and write to ArrayWriter.written while in the context
+
+    Returns:
+        dict of the written arrays by output name
+    """
+
+    read_block, writer = blocks.read_block, blocks.BlockWriter
+    blocks.read_block, blocks.BlockWriter = read_array, ArrayWriter
+    ArrayWriter.written = {}
+
+    try:
+        yield ArrayWriter.written
+    finally:
+        blocks.read_block, blocks.BlockWriter = read_block, writer
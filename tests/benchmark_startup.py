@@ -0,0 +1,108 @@
+""" Time how long the toolbox takes to load
+
+ArcMap re-evaluates 'Grid Garage.pyt' whenever the toolbox is refreshed, so this
+measures what it does every time: import the .pyt, construct Toolbox() and
+instantiate every tool to read its label, category and description. Getting
+every tool's parameters (which imports the tool modules) is timed separately
+with --tools.
+
+Usage:
+    python benchmark_startup.py [--tools] [--repeat N]
+
+"""
+from __future__ import print_function
+import argparse
+import imp
+import os
+import sys
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+pyt = os.path.join(root, "Grid Garage.pyt")
+
+
+def timed(func, *args):
+    """ Call a function and time it
+
+    Args:
+        func: The callable
+        *args: Its arguments
+
+    Returns:
+        (elapsed seconds, return value)
+
+    """
+
+    start = time.time()
+    value = func(*args)
+    return time.time() - start, value
+
+
+def load_pyt():
+    """ Import the .pyt fresh, as ArcGIS does
+
+    Returns:
+        The toolbox module
+
+    """
+
+    for name in [m for m in sys.modules if m == "tools" or m.startswith("tools.")]:
+        del sys.modules[name]
+
+    return imp.load_source("grid_garage_pyt", pyt)
+
+
+def load_tools(toolbox):
+    """ Instantiate every tool and read what ArcGIS shows in the catalog
+
+    Args:
+        toolbox: The Toolbox
+
+    Returns:
+        list of (label, category, description)
+
+    """
+
+    tools = [t() for t in toolbox.tools]
+
+    return [(t.label, t.category, t.description) for t in tools]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tools", action="store_true", help="also get every tool's parameters")
+    parser.add_argument("--repeat", type=int, default=5, help="number of toolbox loads to time")
+    args = parser.parse_args()
+
+    if root not in sys.path:
+        sys.path.insert(0, root)
+
+    before = set(sys.modules)
+    import_times, init_times, tool_times = [], [], []
+    for i in range(args.repeat):
+        t_import, module = timed(load_pyt)
+        t_init, toolbox = timed(module.Toolbox)
+        t_tools, catalog = timed(load_tools, toolbox)
+        import_times.append(t_import)
+        init_times.append(t_init)
+        tool_times.append(t_tools)
+
+    loaded = sorted(m for m in set(sys.modules) - before if sys.modules[m] is not None)
+    print("Toolbox import:   first {:.3f}s, best {:.3f}s".format(import_times[0], min(import_times)))
+    print("Toolbox():        first {:.3f}s, best {:.3f}s".format(init_times[0], min(init_times)))
+    print("Tool instances:   first {:.3f}s, best {:.3f}s".format(tool_times[0], min(tool_times)))
+    print("{} tools, {} modules loaded".format(len(toolbox.tools), len(loaded)))
+    print("Heavy modules loaded: {}".format([m for m in ("arcpy", "arcpy.sa", "netCDF4", "pandas") if m in loaded] or None))
+
+    if args.tools:
+        for t in toolbox.tools:
+            try:
+                elapsed, parameters = timed(t().getParameterInfo)
+                print("{:<40} {:.3f}s".format(t.__name__, elapsed))
+            except Exception as e:
+                print("{:<40} failed: {}".format(t.__name__, e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+""" Checks of the aggregate engine against a brute-force loop over blocks
+
+Run from the repository root, e.g. python -m unittest tests.test_aggregate
+
+"""
+from unittest import TestCase
+from base import aggregate
+from tests.arrays import ArrayGrid, array_io
+import numpy as np
+
+
+functions = {"SUM": np.sum, "MEAN": np.mean, "MAXIMUM": np.max, "MINIMUM": np.min, "MEDIAN": np.median,
+             "RANGE": lambda v: v.max() - v.min(), "STD": np.std}
+
+
+def brute_force(a, nodata, factor, statistic, ignore_nodata, expand):
+    """ Aggregate with a loop over blocks counted from the lower left """
+
+    rows, cols = a.shape
+    n_rows = -(-rows // factor) if expand else rows // factor
+    n_cols = -(-cols // factor) if expand else cols // factor
+    out = np.ma.masked_all((n_rows, n_cols), dtype="float64")
+
+    for i in range(n_rows):
+        for j in range(n_cols):
+            bottom = rows - (n_rows - 1 - i) * factor
+            cells = a[max(bottom - factor, 0):bottom, j * factor:(j + 1) * factor]
+            values = cells[cells != nodata] if nodata is not None else cells.ravel()
+            partial = cells.size < factor * factor
+            if not values.size or (ignore_nodata == "NODATA" and (values.size < cells.size or partial)):
+                continue
+            out[i, j] = functions[statistic](values.astype("float64"))
+
+    return out
+
+
+class TestReduceRaster(TestCase):
+    """
+    """
+
+    def setUp(self):
+
+        rs = np.random.RandomState(2)
+        self.a = rs.randint(0, 50, (23, 31)).astype("int16")
+        self.a[rs.rand(23, 31) < 0.1] = -1
+
+    def test_statistics_match_brute_force(self):
+        grid = ArrayGrid(self.a, -1)
+
+        for expand in [True, False]:
+            for ignore_nodata in ["DATA", "NODATA"]:
+                reductions = [aggregate.BlockReduction(s, s, 3) for s in aggregate.block_statistics]
+                with array_io() as written:
+                    aggregate.reduce_raster(grid, reductions, ignore_nodata, expand, block_size=6)
+
+                for s in aggregate.block_statistics:
+                    expected = brute_force(self.a, -1, 3, s, ignore_nodata, expand)
+                    out = written[s]
+                    self.assertTrue((out.mask == expected.mask).all(), (s, expand, ignore_nodata))
+                    self.assertTrue(np.allclose(out.compressed(), expected.compressed(), atol=1e-3), (s, expand, ignore_nodata))
+
+    def test_several_factors_in_one_read(self):
+        grid = ArrayGrid(self.a, -1)
+
+        with array_io() as written:
+            aggregate.reduce_raster(grid, [aggregate.BlockReduction("2", "SUM", 2), aggregate.BlockReduction("5", "SUM", 5)], block_size=8)
+
+        for f in [2, 5]:
+            expected = brute_force(self.a, -1, f, "SUM", "DATA", True)
+            self.assertTrue(np.allclose(written[str(f)].compressed(), expected.compressed()))
+
+    def test_unsigned_maximum_keeps_largest_value(self):
+        a = np.array([[255, 1], [2, 3]], dtype="uint8")
+
+        with array_io() as written:
+            aggregate.reduce_raster(ArrayGrid(a), [aggregate.BlockReduction("max", "MAXIMUM", 2)])
+
+        self.assertEqual(written["max"].tolist(), [[255]])
+
+    def test_block_statistics_repeat(self):
+        grid = ArrayGrid(self.a, -1)
+
+        with array_io() as written:
+            aggregate.reduce_raster(grid, [aggregate.BlockReduction("mean", "MEAN", 4)], repeat=True, block_size=8)
+
+        expected = brute_force(self.a, -1, 4, "MEAN", "DATA", True)
+        blocks_up = np.arange(self.a.shape[0])[::-1] // 4
+        rows = expected.shape[0] - 1 - blocks_up
+        expected = expected[rows][:, np.arange(self.a.shape[1]) // 4]
+
+        self.assertTrue(np.allclose(written["mean"].filled(-9), expected.filled(-9), atol=1e-4))
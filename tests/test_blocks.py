@@ -0,0 +1,70 @@
+""" Checks of the block engine against plain NumPy
+
+Run from the repository root, e.g. python -m unittest tests.test_blocks
+
+"""
+from unittest import TestCase
+from base import blocks
+from tools.raster.transform import TransformRasterTool
+import numpy as np
+
+
+class TestDefaultNodata(TestCase):
+    """
+    """
+
+    def test_nodata_outside_source_type(self):
+        for dtype in ["uint8", "int8", "uint16", "int16", "uint32"]:
+            out, nodata = blocks.default_nodata(dtype)
+            self.assertTrue(blocks.can_hold(out, nodata))
+            self.assertFalse(blocks.can_hold(dtype, nodata), dtype)
+
+    def test_float_keeps_type(self):
+        self.assertEqual(blocks.default_nodata("float32")[0], np.dtype("float32"))
+        self.assertEqual(blocks.default_nodata("float64")[0], np.dtype("float64"))
+
+    def test_can_hold(self):
+        self.assertTrue(blocks.can_hold("uint8", 255))
+        self.assertFalse(blocks.can_hold("uint8", 256))
+        self.assertFalse(blocks.can_hold("uint8", -1))
+        self.assertFalse(blocks.can_hold("int16", 1.5))
+        self.assertFalse(blocks.can_hold("int16", None))
+
+
+class TestStreamingStatistics(TestCase):
+    """
+    """
+
+    def test_merged_blocks_match_numpy(self):
+        a = np.random.RandomState(0).normal(1e6, 3, (300, 200))
+        mask = a > 1e6 + 4
+
+        stats = blocks.StreamingStatistics()
+        for i in range(0, 300, 70):
+            stats.update(np.ma.masked_array(a[i:i + 70], mask[i:i + 70]))
+
+        values = a[~mask]
+        self.assertEqual(stats.count, values.size)
+        self.assertAlmostEqual(stats.mean, values.mean(), 6)
+        self.assertAlmostEqual(stats.std, values.std(), 6)
+        self.assertEqual((stats.minimum, stats.maximum), (values.min(), values.max()))
+
+
+class TestInvert(TestCase):
+    """
+    """
+
+    def test_unsigned_invert_is_signed(self):
+        a = np.ma.masked_array(np.array([[100, 150, 200]], dtype="uint8"))
+
+        stats = blocks.StreamingStatistics()
+        stats.update(a)
+
+        tool = TransformRasterTool.__new__(TransformRasterTool)
+        tool.method = "INVERT"
+
+        dtype, nodata = blocks.default_nodata(np.result_type(a.dtype, np.int16))
+        out = np.ma.asarray(tool.block_function(stats)(a)).filled(nodata).astype(dtype)
+
+        self.assertEqual(out.tolist(), [[0, -50, -100]])
+        self.assertNotIn(nodata, out)
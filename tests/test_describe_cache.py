@@ -0,0 +1,49 @@
+""" Checks of the Describe cache's modification keys
+
+Run from the repository root, e.g. python -m unittest tests.test_describe_cache
+
+"""
+from unittest import TestCase
+from base.utils import DescribeCache
+import os
+import shutil
+import tempfile
+
+
+class TestModificationKey(TestCase):
+    """
+    """
+
+    def setUp(self):
+
+        self.folder = tempfile.mkdtemp()
+
+        return
+
+    def tearDown(self):
+
+        shutil.rmtree(self.folder)
+
+        return
+
+    def touch(self, name, mtime):
+        path = os.path.join(self.folder, name)
+        open(path, "w").close()
+        os.utime(path, (mtime, mtime))
+
+        return path
+
+    def test_sidecars(self):
+        tif = self.touch("a.tif", 1000)
+        self.touch("a.tif.aux.xml", 2000)
+        self.touch("ab.tif", 9000)  # another raster
+        shp = self.touch("b.shp", 1000)
+        self.touch("b.prj", 3000)
+
+        self.assertEqual(DescribeCache.modification_key(tif), (2000, True))
+        self.assertEqual(DescribeCache.modification_key(shp), (3000, True))
+
+    def test_no_sidecars(self):
+        tif = self.touch("a.tif", 1000)
+
+        self.assertEqual(DescribeCache.modification_key(tif), (1000, True))
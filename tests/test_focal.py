@@ -0,0 +1,64 @@
+""" Checks of the focal engine against a brute-force loop over windows
+
+Run from the repository root, e.g. python -m unittest tests.test_focal
+
+"""
+from unittest import TestCase
+from base import focal
+from tests.arrays import ArrayGrid, array_io
+import numpy as np
+
+
+def brute_force(a, mask, height, width, statistic, ignore_nodata):
+    """ Focal statistic with a loop over the cells """
+
+    above, left = (height - 1) // 2, (width - 1) // 2
+    out = np.ma.masked_all(a.shape, dtype="float64")
+
+    for r in range(a.shape[0]):
+        for c in range(a.shape[1]):
+            rows = slice(max(r - above, 0), r - above + height)
+            cols = slice(max(c - left, 0), c - left + width)
+            values, missing = a[rows, cols], mask[rows, cols]
+            if missing.all() or (ignore_nodata == "NODATA" and missing.any()):
+                continue
+            values = values[~missing].astype("float64")
+            out[r, c] = {"SUM": values.sum, "MEAN": values.mean, "STD": values.std}[statistic]()
+
+    return out
+
+
+class TestFocalRaster(TestCase):
+    """
+    """
+
+    def setUp(self):
+
+        rs = np.random.RandomState(5)
+        self.a = rs.normal(1000, 10, (29, 33)).astype("float32")
+        self.a[rs.rand(29, 33) < 0.08] = -9999
+
+    def test_tiles_match_brute_force(self):
+        grid = ArrayGrid(self.a, -9999)
+        mask = self.a == -9999
+
+        for height, width in [(3, 3), (4, 5), (1, 7)]:
+            for ignore_nodata in ["DATA", "NODATA"]:
+                with array_io() as written:
+                    focal.focal_raster(grid, [(s, s) for s in focal.focal_statistics], height, width, ignore_nodata, block_size=8)
+
+                for s in focal.focal_statistics:
+                    expected = brute_force(self.a, mask, height, width, s, ignore_nodata)
+                    out = written[s]
+                    self.assertTrue((out.mask == expected.mask).all(), (s, height, width, ignore_nodata))
+                    self.assertTrue(np.allclose(out.compressed(), expected.compressed(), rtol=1e-5, atol=1e-2), (s, height, width, ignore_nodata))
+
+    def test_integer_sum(self):
+        a = np.arange(48, dtype="uint8").reshape(6, 8)
+
+        with array_io() as written:
+            focal.focal_raster(ArrayGrid(a), [("SUM", "sum")], 3, 3, block_size=4)
+
+        expected = brute_force(a, np.zeros(a.shape, dtype=bool), 3, 3, "SUM", "DATA")
+        self.assertEqual(written["sum"].dtype.kind, "i")
+        self.assertEqual(written["sum"].tolist(), expected.astype("int64").tolist())
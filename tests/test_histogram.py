@@ -0,0 +1,94 @@
+""" Checks of the streaming histogram against sorted arrays
+
+Run from the repository root, e.g. python -m unittest tests.test_histogram
+
+"""
+from unittest import TestCase
+from base import histogram
+from tests.arrays import ArrayGrid, array_io
+import numpy as np
+
+
+fractions = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+
+def exact_quantiles(values, fractions):
+    """ The smallest value with at least the fraction of values at or below it """
+
+    values = np.sort(values)
+
+    return [values[max(int(np.ceil(f * values.size)) - 1, 0)] for f in fractions]
+
+
+class TestQuantileSketch(TestCase):
+    """
+    """
+
+    def test_integer_quantiles_are_exact(self):
+        a = np.random.RandomState(6).randint(-500, 3000, (120, 90)).astype("int32")
+
+        with array_io():
+            sketch = histogram.raster_sketch(ArrayGrid(a), block_rows=32, block_cols=32)
+
+        self.assertEqual(sketch.count, a.size)
+        self.assertEqual(sketch.quantiles(fractions), [float(q) for q in exact_quantiles(a.ravel(), fractions)])
+
+    def test_float_quantiles_within_a_bin(self):
+        a = np.random.RandomState(7).lognormal(3, 1, (150, 110)).astype("float32")
+        a[:10, :10] = -1
+        values = a[a != -1]
+
+        with array_io():
+            sketch = histogram.raster_sketch(ArrayGrid(a, -1), max_bins=1024, block_rows=40, block_cols=40)
+
+        self.assertEqual(sketch.count, values.size)
+        for q, e in zip(sketch.quantiles(fractions), exact_quantiles(values, fractions)):
+            self.assertLessEqual(abs(q - e), sketch.width)
+
+    def test_merge_matches_one_sketch(self):
+        rs = np.random.RandomState(8)
+        a, b = rs.normal(0, 1, 5000), rs.normal(50, 20, 5000)
+
+        one = histogram.QuantileSketch(max_bins=256)
+        one.update(np.concatenate([a, b]))
+
+        merged = histogram.QuantileSketch(max_bins=256)
+        for part in [a, b]:
+            sketch = histogram.QuantileSketch(max_bins=256)
+            sketch.update(part)
+            merged.merge(sketch)
+
+        width = max(one.width, merged.width)
+        self.assertEqual(merged.count, one.count)
+        self.assertLessEqual(merged.counts.size, 256)
+        for q, e in zip(merged.quantiles(fractions), exact_quantiles(np.concatenate([a, b]), fractions)):
+            self.assertLessEqual(abs(q - e), width)
+
+    def test_merge_one_cell_block(self):
+        values = np.random.RandomState(9).beta(0.5, 5, 20000).astype("float32")
+
+        for first in [True, False]:
+            merged = histogram.QuantileSketch()
+            parts = [values[:1], values[1:]] if first else [values[1:], values[:1]]
+            for part in parts:
+                sketch = histogram.QuantileSketch()
+                sketch.update(part)
+                merged.merge(sketch)
+
+            self.assertEqual(merged.count, values.size)
+            self.assertLess(merged.width, 1e-4)
+            for q, e in zip(merged.quantiles(fractions), exact_quantiles(values, fractions)):
+                self.assertLessEqual(abs(q - e), merged.width)
+
+    def test_one_value(self):
+        sketch = histogram.QuantileSketch()
+        sketch.update(np.full(10, 0.3, dtype="float32"))
+        sketch.update(np.full(5, 0.3, dtype="float32"))
+
+        self.assertIsNone(sketch.width)
+        self.assertEqual(sketch.count, 15)
+        self.assertEqual(sketch.quantiles([0.1, 0.9]), [float(np.float32(0.3))] * 2)
+
+        sketch.update(np.full(5, 0.7, dtype="float32"))
+        self.assertEqual(sketch.count, 20)
+        self.assertAlmostEqual(sketch.quantiles([0.9])[0], 0.7, 4)
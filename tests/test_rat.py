@@ -0,0 +1,68 @@
+""" Checks of the attribute table build against stored fingerprints
+
+Run from the repository root, e.g. python -m unittest tests.test_rat
+
+"""
+from unittest import TestCase
+from base import blocks, rat, utils
+from tools.raster import build_attribute_table
+from tools.raster.build_attribute_table import BuildAttributeTableRasterTool
+from tests.arrays import ArrayGrid
+import numpy as np
+
+
+class TestBuildRat(TestCase):
+    """
+    """
+
+    def setUp(self):
+
+        self.built = []
+        self.store = rat.FingerprintStore()
+        self.store.open(":memory:")
+        self.store.save("r.tif", "fp")
+
+        self.patched = [(rat, "fingerprint_store", self.store),
+                        (rat, "fingerprint", lambda raster, grid: "fp"),
+                        (rat, "has_rat", lambda raster: True),
+                        (rat, "sidecar_table", lambda raster: None),
+                        (utils, "validate_geodata", lambda *args, **kwargs: None),
+                        (blocks, "RasterGrid", lambda raster: ArrayGrid(np.zeros((2, 2), dtype="int32"))),
+                        (build_attribute_table.arcpy, "BuildRasterAttributeTable_management", lambda *args: self.built.append(args))]
+        self.originals = [(m, name, getattr(m, name, None)) for m, name, value in self.patched]
+        for m, name, value in self.patched:
+            setattr(m, name, value)
+
+        self.tool = BuildAttributeTableRasterTool.__new__(BuildAttributeTableRasterTool)
+        self.tool.appdata_path = "."
+        self.tool.info = self.tool.warn = lambda msg: None
+
+        return
+
+    def tearDown(self):
+
+        for m, name, value in self.originals:
+            setattr(m, name, value)
+
+        return
+
+    def test_matching_fingerprint_skips_overwrite(self):
+        self.tool.overwrite = "Overwrite"
+
+        self.assertEqual(self.tool.build_rat({"raster": "r.tif"})["attribute_table"], "unchanged")
+        self.assertEqual(self.built, [])
+
+    def test_changed_raster_is_rebuilt_when_overwriting(self):
+        self.tool.overwrite = "Overwrite"
+        self.store.save("r.tif", "old")
+
+        self.assertEqual(self.tool.build_rat({"raster": "r.tif"})["attribute_table"], "built")
+        self.assertEqual(self.built, [("r.tif", "Overwrite")])
+        self.assertTrue(self.store.matches("r.tif", "fp"))
+
+    def test_changed_raster_is_kept_without_overwrite(self):
+        self.tool.overwrite = "NONE"
+        self.store.save("r.tif", "old")
+
+        self.assertEqual(self.tool.build_rat({"raster": "r.tif"})["attribute_table"], "existing")
+        self.assertEqual(self.built, [])
@@ -0,0 +1,45 @@
+""" Checks of the tool registry against the tool modules, without importing them
+
+Run from the repository root, e.g. python -m unittest tests.test_registry
+
+"""
+from unittest import TestCase
+from tools import registry
+import ast
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def module_settings(module_name):
+    """ The literal tool_settings values of a tool module, read from its source """
+
+    with open(os.path.join(root, *module_name.split(".")) + ".py") as f:
+        tree = ast.parse(f.read())
+
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and [t.id for t in node.targets if isinstance(t, ast.Name)] == ["tool_settings"]:
+            return dict((ast.literal_eval(k), ast.literal_eval(v)) for k, v in zip(node.value.keys, node.value.values)
+                        if isinstance(v, (ast.Str, ast.Name)))
+
+    return None
+
+
+class TestRegistry(TestCase):
+    """
+    """
+
+    def test_settings_match_modules(self):
+        for m, c, settings in registry.registered_tools:
+            for k, v in module_settings(m).items():
+                self.assertEqual(settings[k], v, (m, k))
+
+    def test_stand_ins_do_not_import_tools(self):
+        loaded = set(m for m in sys.modules if m.startswith("tools."))
+
+        for t in registry.toolbox_tools():
+            tool = t()
+            self.assertTrue(tool.label and tool.category and tool.description, t.__name__)
+
+        self.assertEqual(set(m for m in sys.modules if m.startswith("tools.")), loaded)
@@ -0,0 +1,64 @@
+""" Checks of resuming the result CSVs of an interrupted run
+
+Run from the repository root, e.g. python -m unittest tests.test_results
+
+"""
+from unittest import TestCase
+from base.results import GgResult
+import csv
+import logging
+import os
+import shutil
+import tempfile
+
+
+class TestResume(TestCase):
+    """
+    """
+
+    def setUp(self):
+
+        self.folder = tempfile.mkdtemp()
+        self.result = GgResult()
+        self.result.logger = logging.getLogger("test_results")
+        self.result.pass_csv = os.path.join(self.folder, "p.csv")
+        self.result.fail_csv = os.path.join(self.folder, "f.csv")
+
+        return
+
+    def tearDown(self):
+
+        shutil.rmtree(self.folder)
+
+        return
+
+    def read(self, path):
+        with open(path, "rb") as csv_file:
+            return list(csv.DictReader(csv_file))
+
+    def test_empty_csvs_are_new(self):
+        for path in [self.result.pass_csv, self.result.fail_csv]:
+            open(path, "wb").close()  # a crash before the first flush
+
+        self.result.load_finished()
+        self.assertFalse(self.result.is_finished({"raster": "a.tif"}, "raster"))
+
+        self.result.add_pass({"source_geodata": "a.tif", "value": 1})
+        self.result.add_fail({"raster": "b.tif"}, "failed")
+        self.result.close()
+
+        self.assertEqual(self.read(self.result.pass_csv), [{"source_geodata": "a.tif", "value": "1"}])
+        self.assertEqual(self.read(self.result.fail_csv)[0]["geodata"], "b.tif")
+
+    def test_finished_rows(self):
+        self.result.add_pass({"source_geodata": "a.tif", "value": 1})
+        self.result.add_fail({"raster": "b.tif"}, "failed")
+        self.result.close()
+
+        resumed = GgResult()
+        resumed.logger, resumed.pass_csv, resumed.fail_csv = self.result.logger, self.result.pass_csv, self.result.fail_csv
+        resumed.load_finished()
+
+        self.assertEqual((resumed.pass_count, resumed.fail_count), (1, 1))
+        self.assertEqual([resumed.is_finished({"raster": r}, "raster") for r in ["a.tif", "b.tif", "c.tif", "1"]],
+                         [True, True, False, False])
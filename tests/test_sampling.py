@@ -0,0 +1,61 @@
+""" Checks of the sampled statistics against the whole array
+
+Run from the repository root, e.g. python -m unittest tests.test_sampling
+
+"""
+from unittest import TestCase
+from base import sampling
+from tests.arrays import ArrayGrid, array_io
+import numpy as np
+
+
+class TestSampledStatistics(TestCase):
+    """
+    """
+
+    def test_count_with_partial_blocks(self):
+        grid = ArrayGrid(np.ones((1000, 1200), dtype="float32"))
+
+        with array_io():
+            for seed in range(5):
+                stats = sampling.sampled_statistics(grid, 8, seed=seed)
+                self.assertEqual(stats["method"], "sampled")
+                self.assertEqual(stats["count"], 1200000)
+                self.assertEqual(sum(stats["histogram"]), 1200000)
+
+    def test_estimates_within_bounds(self):
+        rows, cols = np.mgrid[0:1000, 0:1100]
+        a = (np.sin(rows / 150.0) * 50 + cols / 20.0 + np.random.RandomState(0).normal(0, 5, rows.shape)).astype("float32")
+        a[:300, :300] = -9999
+        values = a[a != -9999].astype("float64")
+        grid = ArrayGrid(a, -9999)
+
+        covered = 0
+        with array_io():
+            for seed in range(40):
+                stats = sampling.sampled_statistics(grid, 12, seed=seed)
+                covered += abs(stats["mean"] - values.mean()) <= stats["mean_bound"]
+                self.assertLess(abs(stats["count"] - values.size), 0.1 * values.size)
+                self.assertTrue(values.min() <= stats["minimum"] <= stats["maximum"] <= values.max())
+
+        self.assertGreaterEqual(covered, 32)
+
+    def test_exact_statistics(self):
+        a = np.random.RandomState(1).randint(0, 20, (300, 200)).astype("int32")
+        values = a[(a != 3) & (a != 4)]
+
+        with array_io():
+            stats = sampling.exact_statistics(ArrayGrid(a), [3, 4], block_rows=64, block_cols=64)
+
+        self.assertEqual(stats["count"], values.size)
+        self.assertAlmostEqual(stats["mean"], values.mean())
+        self.assertAlmostEqual(stats["std"], values.std())
+        self.assertEqual(stats["histogram"], np.histogram(values, sampling.histogram_edges(values.min(), values.max()))[0].tolist())
+        self.assertEqual(sampling.relative_error(stats), 0)
+
+    def test_small_raster_is_read_in_full(self):
+        with array_io():
+            stats = sampling.sampled_statistics(ArrayGrid(np.arange(100.0).reshape(10, 10)), 4)
+
+        self.assertEqual(stats["method"], "exact")
+        self.assertEqual(stats["mean"], 49.5)
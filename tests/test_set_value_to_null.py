@@ -0,0 +1,53 @@
+""" Checks of Set Value to Null on arrays
+
+Run from the repository root, e.g. python -m unittest tests.test_set_value_to_null
+
+"""
+from unittest import TestCase
+from base import blocks, utils
+from tools.raster.set_value_to_null import SetValueToNullRasterTool
+from tests.arrays import ArrayGrid, array_io
+import numpy as np
+
+
+class TestSetNull(TestCase):
+    """
+    """
+
+    def set_null(self, a, values, nodata=None):
+        grid = ArrayGrid(a, nodata)
+
+        tool = SetValueToNullRasterTool.__new__(SetValueToNullRasterTool)
+        tool.val_to_null, tool.header_only = values, False
+        tool.output_file_workspace = tool.raster_format = tool.output_filename_prefix = tool.output_filename_suffix = None
+        tool.info = tool.warn = lambda msg: None
+
+        patched = [(utils, "validate_geodata", lambda *args, **kwargs: None),
+                   (utils, "make_raster_name", lambda *args: "out"),
+                   (blocks, "RasterGrid", lambda raster: grid)]
+        originals = [(m, name, getattr(m, name)) for m, name, value in patched]
+        for m, name, value in patched:
+            setattr(m, name, value)
+
+        try:
+            with array_io() as written:
+                tool.set_null({"raster": "array"})
+        finally:
+            for m, name, value in originals:
+                setattr(m, name, value)
+
+        return written["out"]
+
+    def test_float32_values(self):
+        a = np.array([[-3.4028235e38, 0.1], [0.1, 2.5]], dtype="float32")
+
+        out = self.set_null(a, [-3.4028235e38, 0.1] + range(100, 120))  # enough values for np.in1d to sort
+
+        self.assertEqual(out.mask.tolist(), [[True, True], [True, False]])
+
+    def test_integer_values(self):
+        a = np.array([[0, 255], [3, 7]], dtype="uint8")
+
+        out = self.set_null(a, [255, 3.5, 300, 7])
+
+        self.assertEqual(out.mask.tolist(), [[False, True], [False, True]])
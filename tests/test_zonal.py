@@ -0,0 +1,106 @@
+""" Checks of the zonal engine against a brute-force loop over zones
+
+Run from the repository root, e.g. python -m unittest tests.test_zonal
+
+"""
+from unittest import TestCase
+from base import zonal
+import numpy as np
+
+
+class TestZonalStatistics(TestCase):
+    """
+    """
+
+    def setUp(self):
+
+        rs = np.random.RandomState(3)
+        self.zones = rs.randint(-1, 6, (40, 50))
+        self.values = rs.randint(0, 9, (40, 50)).astype("int16")
+        self.mask = rs.rand(40, 50) < 0.05
+        self.zones[self.zones == 4] = -1  # zone 4 has no cells
+
+    def accumulate(self, acc):
+        for r in range(0, 40, 16):
+            for c in range(0, 50, 16):
+                block = np.ma.masked_array(self.values[r:r + 16, c:c + 16], self.mask[r:r + 16, c:c + 16])
+                acc.update(self.zones[r:r + 16, c:c + 16], block)
+
+        return acc
+
+    def test_blocks_match_brute_force(self):
+        results = self.accumulate(zonal.ZonalStatistics(6, variety=True)).results(zonal.zonal_statistics, cell_area=2.0)
+
+        for z in range(6):
+            values = self.values[(self.zones == z) & ~self.mask].astype("float64")
+            if z == 4:
+                self.assertIsNone(results[z])
+                continue
+            expected = {"COUNT": values.size, "AREA": values.size * 2.0, "SUM": values.sum(), "MEAN": values.mean(),
+                        "MINIMUM": values.min(), "MAXIMUM": values.max(), "RANGE": values.max() - values.min(),
+                        "STD": values.std(), "VARIETY": np.unique(values).size}
+            for k, v in expected.items():
+                self.assertAlmostEqual(results[z][k], v, 9, (z, k))
+
+    def test_nodata_treatment(self):
+        results = self.accumulate(zonal.ZonalStatistics(6)).results(["MEAN"], "NODATA")
+
+        for z in range(6):
+            if z == 4:
+                continue
+            has_nodata = (self.mask & (self.zones == z)).any()
+            self.assertEqual(results[z]["MEAN"] is None, has_nodata)
+
+
+class TestZonalCounts(TestCase):
+    """
+    """
+
+    def test_counts_match_brute_force(self):
+        rs = np.random.RandomState(4)
+        zones = rs.randint(-1, 4, (30, 30))
+        values = rs.randint(-2, 12, (30, 30))
+
+        acc = zonal.ZonalCounts(4)
+        for r in range(0, 30, 7):  # later blocks bring new categories
+            acc.update(zones[r:r + 7], np.ma.masked_array(values[r:r + 7] + r // 7))
+
+        shifted = values + np.arange(30)[:, None] // 7
+        expected = {}
+        for z, v in zip(zones.ravel(), shifted.ravel()):
+            if z >= 0:
+                expected[(z, v)] = expected.get((z, v), 0) + 1
+
+        self.assertEqual(dict(((z, v), n) for z, v, n in acc.results()), expected)
+
+
+class TestZoneIndexCache(TestCase):
+    """
+    """
+
+    def test_one_index_is_held(self):
+        closed = []
+
+        class Index(object):
+            def __init__(self, zones, zone_field, grid):
+                self.grid = grid
+
+            def close(self):
+                closed.append(self.grid)
+
+        class Grid(object):
+            def __init__(self, signature):
+                self.signature = signature
+
+        index_class, zonal.ZoneIndex = zonal.ZoneIndex, Index
+        try:
+            cache = zonal.ZoneIndexCache()
+            a, b = Grid("a"), Grid("b")
+            first = cache.get("zones", "field", a)
+            self.assertIs(cache.get("zones", "field", a), first)
+            cache.get("zones", "field", b)
+            self.assertEqual(closed, [a])
+            cache.close()
+            self.assertEqual(closed, [a, b])
+        finally:
+            zonal.ZoneIndex = index_class
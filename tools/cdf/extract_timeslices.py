@@ -1,8 +1,6 @@
 from base.base_tool import BaseTool
 from base.decorators import input_tableview, input_output_table, parameter
-from netCDF4 import Dataset
 import numpy as np
-import pandas as pd
 import arcpy
 from base.utils import validate_geodata, make_raster_name, raster_formats
 from os.path import join
@@ -90,6 +88,7 @@ class ExtractTimeslicesCdfTool(BaseTool):
 
         if rp:
             self.info("Reading rotated pole array")
+            from netCDF4 import Dataset  # deferred, netCDF4 is slow to import and only needed here
             ds = Dataset(cdf)
             ovz = ds.variables[ov]
 
@@ -2,7 +2,6 @@ from base.base_tool import BaseTool
 from base.decorators import input_output_table, parameter
 from os import walk
 from os.path import join
-from netCDF4 import Dataset
 
 
 tool_settings = {"label": "Search",
@@ -102,6 +101,8 @@ class SearchCdfTool(BaseTool):
         Returns:
 
         """
+        from netCDF4 import Dataset  # deferred, netCDF4 is slow to import and only needed here
+
         try:
             ds = Dataset(cdf)
             del ds
@@ -54,6 +54,17 @@ class CompareExtentsGeodataTool(BaseTool):
 
         return
 
+    def initialise_worker(self):
+        """
+
+        Returns:
+
+        """
+
+        self.initialise()
+
+        return
+
     def iterate(self):
         """
 
@@ -13,9 +13,16 @@ tool_settings = {"label": "Export Metadata",
                  "category": "Metadata"}
 
 
-install_dir = arcpy.GetInstallInfo("desktop")["InstallDir"]
-# default_translator = join(install_dir, "Metadata", "Translator", "ARCGIS2ISO19139.xml")  # ESRI_ISO2ISO19139.xml")
-default_stylesheet = join(install_dir, "Metadata", "Stylesheets", "ArcGIS.xsl")  # ESRI_ISO2ISO19139.xml")
+def default_stylesheet():
+    """ The ArcGIS metadata stylesheet, looked up when first needed rather than on import
+
+    Returns:
+
+    """
+
+    install_dir = arcpy.GetInstallInfo("desktop")["InstallDir"]
+    # default_translator = join(install_dir, "Metadata", "Translator", "ARCGIS2ISO19139.xml")  # ESRI_ISO2ISO19139.xml")
+    return join(install_dir, "Metadata", "Stylesheets", "ArcGIS.xsl")  # ESRI_ISO2ISO19139.xml")
 
 
 class ExportXmlMetadataTool(BaseTool):
@@ -33,7 +40,7 @@ class ExportXmlMetadataTool(BaseTool):
     @input_tableview()
     @parameter("xml_folder", "Output Folder", "DEFolder", "Required", False, "Input", None, None, None, None)
     # @parameter("translator", "Translator", "DEFile", "Required", False, "Input", None, None, None, default_translator, None)
-    @parameter("stylesheet", "Style Sheet", "DEFile", "Required", False, "Input", None, None, None, default_stylesheet, None)
+    @parameter("stylesheet", "Style Sheet", "DEFile", "Required", False, "Input", None, None, None, None, None)
     @input_output_table()
     def getParameterInfo(self):
         """
@@ -44,6 +51,24 @@ class ExportXmlMetadataTool(BaseTool):
 
         return BaseTool.getParameterInfo(self)
 
+    def updateParameters(self, parameters):
+        """
+
+        Args:
+            parameters:
+
+        Returns:
+
+        """
+
+        for p in parameters:
+            if p.name == "stylesheet" and not p.altered and p.valueAsText in [None, "", "#"]:
+                p.value = default_stylesheet()
+
+        BaseTool.updateParameters(self, parameters)
+
+        return
+
     def iterate(self):
         """
 
@@ -54,6 +79,9 @@ class ExportXmlMetadataTool(BaseTool):
         # if not exists(self.translator):
         #     raise ValueError("Translator '{}' does not exist".format(self.translator))
 
+        if not self.stylesheet:
+            self.stylesheet = default_stylesheet()
+
         if not exists(self.stylesheet):
             raise ValueError("Stylesheet '{}' does not exist".format(self.stylesheet))
 
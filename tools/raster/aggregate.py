@@ -1,8 +1,8 @@
 from base.base_tool import BaseTool
 
-from base import utils
+from base import utils, blocks
+from base.aggregate import BlockReduction, reduce_raster
 from base.decorators import input_tableview, input_output_table, parameter, raster_formats, aggregation_methods, data_nodata, expand_trunc
-from arcpy.sa import Aggregate
 
 
 tool_settings = {"label": "Aggregate",
@@ -24,13 +24,14 @@ class AggregateRasterTool(BaseTool):
 
         BaseTool.__init__(self, tool_settings)
 
-        self.execution_list = [self.iterate]
+        self.execution_list = [self.initialise, self.iterate]
+        self.outputs = []
 
         return
 
     @input_tableview(data_type="raster")
-    @parameter("cell_factor", "Cell Aggregation Factor", "GPLong", "Required", False, "Input", ["Range", 2, 1000], None, None, None)
-    @parameter("aggregation_type", "Aggregation Method", "GPString", "Optional", False, "Input", aggregation_methods, None, None, aggregation_methods[0], "Options")
+    @parameter("cell_factor", "Cell Aggregation Factor", "GPLong", "Required", True, "Input", ["Range", 2, 1000], None, None, None)
+    @parameter("aggregation_type", "Aggregation Method", "GPString", "Optional", True, "Input", aggregation_methods, None, None, aggregation_methods[0], "Options")
     @parameter("extent_handling", "Extent Boundary", "GPString", "Optional", False, "Input", expand_trunc, None, None, expand_trunc[0], "Options")
     @parameter("ignore_nodata", "No Data Treatment", "GPString", "Optional", False, "Input", data_nodata, None, None, data_nodata[0], "Options")
     @parameter("raster_format", "Format for output rasters", "GPString", "Required", False, "Input", raster_formats, None, None, raster_formats[0])
@@ -44,6 +45,20 @@ class AggregateRasterTool(BaseTool):
 
         return BaseTool.getParameterInfo(self)
 
+    def initialise(self):
+        """ Make the list of (statistic, factor) outputs, each raster is read once for all of them
+
+        Returns:
+
+        """
+
+        factors = [int(f) for f in utils.make_tuple(self.cell_factor)]  # multi-value Long parameters come as a list
+        methods = self.aggregation_type.split(";") if self.aggregation_type not in [None, "#"] else aggregation_methods[:1]
+
+        self.outputs = [(m, f) for m in methods for f in factors]
+
+        return
+
     def iterate(self):
         """
 
@@ -69,15 +84,17 @@ class AggregateRasterTool(BaseTool):
 
         utils.validate_geodata(ras, raster=True)
 
-        ras_out = utils.make_raster_name(ras, self.output_file_workspace, self.raster_format, self.output_filename_prefix, self.output_filename_suffix)
-
-        self.info("Aggregating {} -->> {} ...".format(ras, ras_out))
+        reductions = []
+        for method, factor in self.outputs:
+            suffix = self.output_filename_suffix if len(self.outputs) == 1 else "{}_{}{}".format(self.output_filename_suffix or "", method.lower(), factor)
+            ras_out = utils.make_raster_name(ras, self.output_file_workspace, self.raster_format, self.output_filename_prefix, suffix)
+            reductions.append(BlockReduction(ras_out, method, factor))
 
-        out = Aggregate(ras, self.cell_factor, self.aggregation_type, self.extent_handling, self.ignore_nodata)
+        self.info("Aggregating {} -->> {} ...".format(ras, [r.out_raster for r in reductions]))
 
-        out.save(ras_out)
+        reduce_raster(blocks.RasterGrid(ras), reductions, self.ignore_nodata, self.extent_handling != "TRUNCATE")
 
-        return {"geodata": ras_out, "source_geodata": ras}
+        return [{"geodata": r.out_raster, "source_geodata": ras, "aggregation_type": r.statistic, "cell_factor": r.factor_rows} for r in reductions]
 
 
 # "http://desktop.arcgis.com/en/arcmap/latest/tools/spatial-analyst-toolbox/aggregate.htm"
@@ -1,8 +1,10 @@
 from base.base_tool import BaseTool
 
+from base import blocks
+from base.aggregate import BlockReduction, block_statistics, reduce_raster
 from base.decorators import input_tableview, input_output_table, parameter, stats_type, data_nodata, raster_formats
 from arcpy.sa import BlockStatistics
-from base.utils import validate_geodata, make_raster_name
+from base.utils import validate_geodata, make_raster_name, rectangle_cells
 
 tool_settings = {"label": "Block Statistics",
                  "description": "Block Statistics...",
@@ -23,13 +25,15 @@ class BlockStatisticsRasterTool(BaseTool):
 
         BaseTool.__init__(self, tool_settings)
 
-        self.execution_list = [self.iterate]
+        self.execution_list = [self.initialise, self.iterate]
+        self.statistics = []
+        self.block_shape = None
 
         return
 
     @input_tableview(data_type="raster")
     @parameter("neighbourhood", "Neighbourhood", "GPSANeighborhood", "Required", False, "Input", None, None, None, None)
-    @parameter("statistics_type", "Statistics", "GPString", "Optional", False, "Input", stats_type, None, None, stats_type[0], "Options")
+    @parameter("statistics_type", "Statistics", "GPString", "Optional", True, "Input", stats_type, None, None, stats_type[0], "Options")
     @parameter("ignore_nodata", "No Data Treatment", "GPString", "Optional", False, "Input", data_nodata, None, None, data_nodata[0], "Options")
     @parameter("raster_format", "Format for output rasters", "GPString", "Required", False, "Input", raster_formats, None, None, raster_formats[0])
     @input_output_table(affixing=True)
@@ -42,6 +46,25 @@ class BlockStatisticsRasterTool(BaseTool):
 
         return BaseTool.getParameterInfo(self)
 
+    def initialise(self):
+        """ Decide which statistics are calculated with NumPy, in one read of each raster
+
+        Rectangular neighbourhoods in cells are reduced with NumPy, other
+        neighbourhoods and statistics go to arcpy.sa.BlockStatistics
+
+        Returns:
+
+        """
+
+        stats = self.statistics_type.split(";") if self.statistics_type not in [None, "#"] else ["ALL"]
+        self.statistics = [s for s in stats if s != "ALL"] + [s for s in block_statistics if "ALL" in stats and s not in stats]
+
+        self.block_shape = rectangle_cells(self.neighbourhood)
+        if not self.block_shape:
+            self.info("Neighbourhood '{}' is calculated with arcpy.sa.BlockStatistics".format(self.neighbourhood))
+
+        return
+
     def iterate(self):
         """
 
@@ -67,17 +90,24 @@ class BlockStatisticsRasterTool(BaseTool):
 
         validate_geodata(ras, raster=True)
 
-        ras_out = make_raster_name(ras, self.output_file_workspace, self.raster_format, self.output_filename_prefix, self.output_filename_suffix)
+        outputs = []
+        for stat in self.statistics:
+            suffix = self.output_filename_suffix if len(self.statistics) == 1 else "{}_{}".format(self.output_filename_suffix or "", stat.lower())
+            outputs.append((stat, make_raster_name(ras, self.output_file_workspace, self.raster_format, self.output_filename_prefix, suffix)))
 
         self.info("Calculating block statistics on {0}...".format(ras))
 
-        out = BlockStatistics(ras, self.neighbourhood, self.statistics_type, self.ignore_nodata)
-
-        self.info("Saving to {0}...".format(ras_out))
+        reductions = [BlockReduction(ras_out, stat, *self.block_shape) for stat, ras_out in outputs if self.block_shape and stat in block_statistics]
+        if reductions:
+            reduce_raster(blocks.RasterGrid(ras), reductions, self.ignore_nodata, repeat=True)
 
-        out.save(ras_out)
+        for stat, ras_out in outputs:
+            if not self.block_shape or stat not in block_statistics:
+                out = BlockStatistics(ras, self.neighbourhood, stat, self.ignore_nodata)
+                self.info("Saving to {0}...".format(ras_out))
+                out.save(ras_out)
 
-        return {"geodata": ras_out, "source_geodata": ras}
+        return [{"geodata": ras_out, "source_geodata": ras, "statistics_type": stat} for stat, ras_out in outputs]
 
 
 # "http://desktop.arcgis.com/en/arcmap/latest/tools/spatial-analyst-toolbox/block-statistics.htm"
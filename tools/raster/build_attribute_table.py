@@ -1,7 +1,8 @@
 from base.base_tool import BaseTool
 
-from base import utils
+from base import blocks, rat, utils
 from base.decorators import input_tableview, input_output_table, parameter
+from os.path import join
 import arcpy
 
 
@@ -54,7 +55,13 @@ class BuildAttributeTableRasterTool(BaseTool):
         return
 
     def build_rat(self, data):
-        """
+        """ Build the attribute table of a raster without one, or of every raster when overwriting
+
+        A table is not rebuilt, even when overwriting, if the raster's
+        fingerprint matches the one stored when the table was built. An
+        existing table without a matching fingerprint is rebuilt only when
+        overwriting. TIFF tables are counted with NumPy in one read and written in one bulk
+        insert, other formats use BuildRasterAttributeTable
 
         Args:
             data:
@@ -67,9 +74,42 @@ class BuildAttributeTableRasterTool(BaseTool):
 
         utils.validate_geodata(ras, raster=True)
 
+        try:
+            rat.fingerprint_store.open(join(self.appdata_path, rat.RAT_FINGERPRINT_FILE))
+        except Exception as e:
+            self.warn("Attribute table fingerprints not available, every table will be built: {}".format(e))
+
+        grid = blocks.RasterGrid(ras)
+        if not grid.is_integer:
+            raise ValueError("Raster '{}' is not an integer raster, attribute tables need integer values".format(ras))
+
+        fp = rat.fingerprint(ras, grid)
+
+        exists = rat.has_rat(ras)
+
+        if exists and rat.fingerprint_store.matches(ras, fp):
+            self.info("Attribute table for {0} is up to date".format(ras))
+            return {"geodata": ras, "attribute_table": "unchanged"}
+
+        if exists and self.overwrite != "Overwrite":
+            self.warn("Attribute table for {0} exists and is kept, it may not match the raster, overwrite to rebuild it".format(ras))
+            return {"geodata": ras, "attribute_table": "existing"}
+
         self.info("Building attribute table for {0}...".format(ras))
 
-        arcpy.BuildRasterAttributeTable_management(ras, self.overwrite)
+        table = rat.sidecar_table(ras)
+        values = counts = None
+
+        if table:
+            values, counts = rat.value_counts(grid)
+
+        if table and rat.fits_value_field(values):
+            rat.write_sidecar_table(table, values, counts)
+            self.info("{0} values in {1} cells".format(values.size, counts.sum()))
+        else:
+            arcpy.BuildRasterAttributeTable_management(ras, "Overwrite")
+
+        rat.fingerprint_store.save(ras, rat.fingerprint(ras, grid))  # after the build, Esri Grids hold their table
 
         return {"geodata": ras, "attribute_table": "built"}
 
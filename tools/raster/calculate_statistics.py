@@ -1,6 +1,6 @@
 from base.base_tool import BaseTool
 
-from base import utils
+from base import blocks, sampling, utils
 from base.decorators import input_tableview, input_output_table, parameter
 from arcpy import CalculateStatistics_management
 
@@ -23,7 +23,7 @@ class CalculateStatisticsRasterTool(BaseTool):
         """
 
         BaseTool.__init__(self, tool_settings)
-        self.execution_list = [self.iterate]
+        self.execution_list = [self.initialise, self.iterate]
 
         return
 
@@ -33,6 +33,9 @@ class CalculateStatisticsRasterTool(BaseTool):
     @parameter("ignore_values", "Ignore Values", "GPLong", "Optional", True, "Input", None, None, None, None, "Options")
     @parameter("skip_existing", "Existing Statistics", "GPString", "Optional", False, "Input", ["OVERWRITE", "SKIP_EXISTING"], None, None, "OVERWRITE", "Options")
     @parameter("area_of_interest", "Area of Interest", "GPFeatureLayer", "Optional", False, "Input", ["Polygon"], None, None, None, "Options")
+    @parameter("statistics_mode", "Statistics Mode", "GPString", "Optional", False, "Input", ["EXACT", "SAMPLED"], None, None, "EXACT", "Options")
+    @parameter("sample_blocks", "Blocks to Sample", "GPLong", "Optional", False, "Input", None, None, None, 64, "Options")
+    @parameter("max_error", "Maximum Error (%)", "GPDouble", "Optional", False, "Input", None, None, None, 1.0, "Options")
     @input_output_table()
     def getParameterInfo(self):
         """
@@ -43,6 +46,29 @@ class CalculateStatisticsRasterTool(BaseTool):
 
         return BaseTool.getParameterInfo(self)
 
+    def initialise(self):
+        """ Check the sampling settings
+
+        Returns:
+
+        """
+
+        if self.statistics_mode != "SAMPLED":
+            return
+
+        if self.sample_blocks is None or self.sample_blocks < 2:
+            raise ValueError("At least 2 blocks must be sampled")
+
+        if self.max_error is None or self.max_error < 0:
+            raise ValueError("Maximum error must be zero or more")
+
+        if self.area_of_interest not in [None, "#"]:
+            self.warn("Area of interest is not used when sampling")
+
+        self.info("Sampled statistics are reported in the results, they are not stored with the rasters")
+
+        return
+
     def iterate(self):
         """
 
@@ -68,8 +94,38 @@ class CalculateStatisticsRasterTool(BaseTool):
 
         utils.validate_geodata(ras, raster=True)
 
+        if self.statistics_mode == "SAMPLED":
+            return self.estimate(ras)
+
         CalculateStatistics_management(ras, self.x_skip_factor, self.y_skip_factor, self.ignore_values, self.skip_existing, self.area_of_interest)
 
         return {"raster": ras, "statistics": "built"}
 
+    def estimate(self, ras):
+        """ Statistics from a stratified sample of blocks, or from every block if the sample is too uncertain
+
+        Args:
+            ras: The raster
+
+        Returns:
+
+        """
+
+        grid = blocks.RasterGrid(ras)
+        skip = (self.x_skip_factor, self.y_skip_factor)
+
+        stats = sampling.sampled_statistics(grid, self.sample_blocks, self.ignore_values, skip)
+        error = sampling.relative_error(stats)
+
+        if stats["method"] == "sampled" and error > self.max_error:
+            self.info("Sampled statistics of {0} are only bounded to {1:.3g}%, reading all of it...".format(ras, error))
+            stats = sampling.exact_statistics(grid, self.ignore_values, skip)
+            error = sampling.relative_error(stats)
+
+        histogram = ";".join(str(h) for h in stats["histogram"]) if stats["histogram"] else None
+
+        return {"raster": ras, "statistics": stats["method"], "count": stats["count"], "minimum": stats["minimum"],
+                "maximum": stats["maximum"], "mean": stats["mean"], "std": stats["std"], "mean_bound": stats["mean_bound"],
+                "count_bound": stats["count_bound"], "error_pct": error if stats["mean_bound"] is not None else None, "histogram": histogram}
+
 # "http://desktop.arcgis.com/en/arcmap/latest/tools/data-management-toolbox/calculate-statistics.htm"
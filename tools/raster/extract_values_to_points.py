@@ -1,9 +1,11 @@
 from base.base_tool import BaseTool
 
-from base.utils import make_vector_name, describe, get_search_cursor_rows, validate_geodata
+from base import blocks
+from base.utils import make_vector_name, describe, get_search_cursor_rows, validate_geodata, point_value_layouts
 from base.decorators import input_tableview, input_output_table, parameter
 from arcpy.sa import ExtractValuesToPoints
 from arcpy import MakeFeatureLayer_management, Exists, Delete_management
+from collections import OrderedDict
 
 
 tool_settings = {"label": "Extract Values to Points",
@@ -12,9 +14,13 @@ tool_settings = {"label": "Extract Values to Points",
                  "category": "Raster"}
 
 
+output_layouts = ["PER_RASTER"] + point_value_layouts
+
+
 class ExtractValuesToPointsRasterTool(BaseTool):
     """
     """
+
     def __init__(self):
         """
 
@@ -23,10 +29,12 @@ class ExtractValuesToPointsRasterTool(BaseTool):
         """
 
         BaseTool.__init__(self, tool_settings)
-        self.execution_list = [self.initialise, self.iterate]
+        self.execution_list = [self.initialise, self.iterate, self.sample, self.finish]
         self.point_rows = None
         self.points_srs = None
-        self.result_dict = {}
+        self.point_samplers = {}
+        self.stacks = OrderedDict()
+        self.result_dict = OrderedDict()
 
         return
 
@@ -34,6 +42,7 @@ class ExtractValuesToPointsRasterTool(BaseTool):
     @parameter("points", "Point Features", "GPFeatureLayer", "Required", False, "Input", ["Point"], None, None, None)
     @parameter("interpolate", "Interpolate Values", "GPString", "Optional", False, "Input", ["NONE", "INTERPOLATE"], None, None, None, "Options")
     @parameter("add_attributes", "Add Raster Attributes", "GPString", "Optional", False, "Input", ["VALUE_ONLY", "ALL"], None, None, None, "Options")
+    @parameter("output_layout", "Output Layout", "GPString", "Optional", False, "Input", output_layouts, None, None, output_layouts[0], "Options")
     @input_output_table(affixing=True)
     def getParameterInfo(self):
         """
@@ -62,6 +71,12 @@ class ExtractValuesToPointsRasterTool(BaseTool):
 
         self.info("{} points found in '{}'".format(len(self.point_rows), self.points))
 
+        if self.output_layout in point_value_layouts:
+            if self.interpolate == "INTERPOLATE" or self.add_attributes == "ALL":
+                raise ValueError("Interpolation and raster attributes need the PER_RASTER output layout")
+            self.supports_workers = False  # rasters are accumulated in self.stacks
+            self.info("Point values will be written to the result table in the {} layout".format(self.output_layout))
+
         return
 
     def iterate(self):
@@ -71,7 +86,7 @@ class ExtractValuesToPointsRasterTool(BaseTool):
 
         """
 
-        self.iterate_function_on_tableview(self.process, return_to_results=True)
+        self.iterate_function_on_tableview(self.process, return_to_results=self.output_layout not in point_value_layouts)
 
         return
 
@@ -96,6 +111,11 @@ class ExtractValuesToPointsRasterTool(BaseTool):
         if ras_srs != self.points_srs:  # hack!! needs doing properly
             raise ValueError("Spatial reference systems do not match ({0} != {1})".format(ras_srs, self.points_srs))
 
+        if self.output_layout in point_value_layouts:  # sampled in stacks later
+            grid = blocks.RasterGrid(ras)
+            self.stacks.setdefault(grid.signature, []).append((data, r_base, grid, qry))
+            return
+
         pts_out = make_vector_name(self.points, self.output_file_workspace, "", self.output_filename_prefix, self.output_filename_suffix + "_{}".format(r_base))
 
         self.info("Extracting point values from {} to {}...".format(ras, pts_out))
@@ -110,3 +130,77 @@ class ExtractValuesToPointsRasterTool(BaseTool):
             ExtractValuesToPoints(self.points, ras, pts_out, self.interpolate, self.add_attributes)
 
         return {"geodata": pts_out, "source_points": self.points, "source_raster": ras}
+
+    def get_point_sampler(self, qry):
+        """ Points (optionally queried) read once and shared by every raster with the same query
+
+        Args:
+            qry: Query on the points or None
+
+        Returns:
+            PointSampler
+
+        """
+
+        if qry not in self.point_samplers:
+            self.point_samplers[qry] = blocks.PointSampler(self.points, qry)
+
+        return self.point_samplers[qry]
+
+    def sample(self):
+        """ Sample each stack of rasters sharing a grid, the point cells are found once per stack
+
+        Returns:
+
+        """
+
+        for stack in self.stacks.itervalues():
+
+            self.info("Extracting point values from {} raster(s) on the grid of {}...".format(len(stack), stack[0][2].raster))
+
+            for data, r_base, grid, qry in stack:
+                try:
+                    sampler = self.get_point_sampler(qry)
+                    values = sampler.sample(grid).tolist()  # NoData and points off the raster are None
+
+                except Exception as e:
+                    self.error("error sampling {}: {}".format(grid.raster, e))
+                    self.result.add_fail(data)
+                    continue
+
+                if self.output_layout == "LONG":
+                    self.result.add_pass([OrderedDict([("source_pt_id", oid), ("raster", r_base), ("source_raster", grid.raster), ("value", val)])
+                                          for oid, val in zip(sampler.ids, values)])
+                    continue
+
+                for oid, val in zip(sampler.ids, values):
+                    self.result_dict.setdefault(oid, OrderedDict())[r_base] = val
+
+        return
+
+    def finish(self):
+        """ Write the WIDE layout, one row per point with a column per raster
+
+        Returns:
+
+        """
+
+        if not self.result_dict:
+            return
+
+        names = OrderedDict((k, None) for val_dict in self.result_dict.itervalues() for k in val_dict)  # queries can leave gaps
+
+        result_list = []
+
+        for oid, val_dict in sorted(self.result_dict.iteritems()):
+
+            row_dict = OrderedDict()
+            row_dict["source_pt_id"] = oid
+            for k in names:
+                row_dict[k] = val_dict.get(k, None)
+
+            result_list.append(row_dict)
+
+        self.result.add_pass(result_list)
+
+        return
@@ -0,0 +1,113 @@
+from base.base_tool import BaseTool
+
+from base import blocks
+from base.focal import focal_statistics, focal_raster
+from base.decorators import input_tableview, input_output_table, parameter, stats_type, data_nodata, raster_formats
+from arcpy.sa import FocalStatistics
+from base.utils import validate_geodata, make_raster_name, rectangle_cells
+
+tool_settings = {"label": "Focal Statistics",
+                 "description": "Focal Statistics...",
+                 "can_run_background": "True",
+                 "category": "Raster"}
+
+
+class FocalStatisticsRasterTool(BaseTool):
+    """
+    """
+
+    def __init__(self):
+        """
+
+        Returns:
+
+        """
+
+        BaseTool.__init__(self, tool_settings)
+
+        self.execution_list = [self.initialise, self.iterate]
+        self.statistics = []
+        self.window_shape = None
+
+        return
+
+    @input_tableview(data_type="raster")
+    @parameter("neighbourhood", "Neighbourhood", "GPSANeighborhood", "Required", False, "Input", None, None, None, None)
+    @parameter("statistics_type", "Statistics", "GPString", "Optional", True, "Input", stats_type, None, None, stats_type[0], "Options")
+    @parameter("ignore_nodata", "No Data Treatment", "GPString", "Optional", False, "Input", data_nodata, None, None, data_nodata[0], "Options")
+    @parameter("raster_format", "Format for output rasters", "GPString", "Required", False, "Input", raster_formats, None, None, raster_formats[0])
+    @input_output_table(affixing=True)
+    def getParameterInfo(self):
+        """
+
+        Returns:
+
+        """
+
+        return BaseTool.getParameterInfo(self)
+
+    def initialise(self):
+        """ Decide which statistics are calculated from summed-area tables, in one read of each raster
+
+        SUM, MEAN and STD over rectangular neighbourhoods in cells use NumPy,
+        other neighbourhoods and statistics go to arcpy.sa.FocalStatistics
+
+        Returns:
+
+        """
+
+        stats = self.statistics_type.split(";") if self.statistics_type not in [None, "#"] else ["ALL"]
+        self.statistics = [s for s in stats if s != "ALL"] + [s for s in focal_statistics if "ALL" in stats and s not in stats]
+
+        self.window_shape = rectangle_cells(self.neighbourhood)
+        if not self.window_shape:
+            self.info("Neighbourhood '{}' is calculated with arcpy.sa.FocalStatistics".format(self.neighbourhood))
+
+        return
+
+    def iterate(self):
+        """
+
+        Returns:
+
+        """
+
+        self.iterate_function_on_tableview(self.focal_statistics, return_to_results=True)
+
+        return
+
+    def focal_statistics(self, data):
+        """
+
+        Args:
+            data:
+
+        Returns:
+
+        """
+
+        ras = data["raster"]
+
+        validate_geodata(ras, raster=True)
+
+        outputs = []
+        for stat in self.statistics:
+            suffix = self.output_filename_suffix if len(self.statistics) == 1 else "{}_{}".format(self.output_filename_suffix or "", stat.lower())
+            outputs.append((stat, make_raster_name(ras, self.output_file_workspace, self.raster_format, self.output_filename_prefix, suffix)))
+
+        self.info("Calculating focal statistics on {0}...".format(ras))
+
+        tables = [(stat, ras_out) for stat, ras_out in outputs if self.window_shape and stat in focal_statistics]
+        if tables:
+            focal_raster(blocks.RasterGrid(ras), tables, self.window_shape[0], self.window_shape[1], self.ignore_nodata)
+
+        for stat, ras_out in outputs:
+            if (stat, ras_out) not in tables:
+                out = FocalStatistics(ras, self.neighbourhood, stat, self.ignore_nodata)
+                self.info("Saving to {0}...".format(ras_out))
+                out.save(ras_out)
+
+        return [{"geodata": ras_out, "source_geodata": ras, "statistics_type": stat} for stat, ras_out in outputs]
+
+
+# "http://desktop.arcgis.com/en/arcmap/latest/tools/spatial-analyst-toolbox/focal-statistics.htm"
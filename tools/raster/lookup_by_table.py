@@ -1,8 +1,9 @@
 from base.base_tool import BaseTool
 
-from base import utils
+from base import utils, blocks, remap
 from base.decorators import input_tableview, input_output_table, parameter, raster_formats
 from arcpy.sa import *
+import arcpy
 
 
 tool_settings = {"label": "Lookup by Table",
@@ -30,6 +31,7 @@ class LookupByTableRasterTool(BaseTool):
 
     @input_tableview(data_type="raster", other_fields="table_fields Lookup_Fields Required table_fields")
     @parameter("raster_format", "Format for output rasters", "GPString", "Required", False, "Input", raster_formats, None, None, "Esri Grid")
+    @parameter("single_pass", "Read each raster once for all fields", "GPBoolean", "Optional", False, "Input", None, None, None, True, "Options")
     @input_output_table(affixing=True)
     def getParameterInfo(self):
         """
@@ -66,20 +68,113 @@ class LookupByTableRasterTool(BaseTool):
         utils.validate_geodata(ras, raster=True)
 
         lookup_fields = data["table_fields"].replace(" ", "").split(",")
+
+        if self.single_pass:
+            self.lookup_single_pass(data, ras, lookup_fields)
+            return
+
+        for f in lookup_fields:
+            self.lookup_field(data, ras, f)
+
+        return
+
+    def lookup_field(self, data, ras, f):
+        """ Look up one field with Lookup
+
+        Args:
+            data: The row
+            ras: The raster
+            f: Attribute table field to look up
+
+        Returns:
+
+        """
+
+        try:
+            self.info("Lookup field '{0}' in '{1}'".format(f, ras))
+            out = Lookup(ras, f)
+            ras_out = utils.make_raster_name(ras, self.output_file_workspace, self.raster_format, self.output_filename_prefix, self.output_filename_suffix + "_" + f)
+            out.save(ras_out)
+            self.info("Saved to {0}".format(ras_out))
+
+            self.result.add_pass({"raster": ras_out, "source_geodata": ras})
+        except:
+            self.warn("Failed on field '{}'".format(f))
+            data["raster"] = ras
+            data["failure_field"] = f
+            self.result.add_fail(data)
+
+        return
+
+    def lookup_single_pass(self, data, ras, lookup_fields):
+        """ Read the attribute table once, then the raster once per block for all numeric fields
+
+        Text fields (and VALUE) are looked up one by one with Lookup.
+
+        Args:
+            data: The row
+            ras: The raster
+            lookup_fields: Attribute table fields to look up
+
+        Returns:
+
+        """
+
+        numeric_fields = {f.name.upper() for f in arcpy.ListFields(ras) if f.type in ["SmallInteger", "Integer", "Single", "Double"]}
+
+        def fail(f, msg):
+            self.warn("Failed on field '{}': {}".format(f, msg))
+            row = dict(data)
+            row["failure_field"] = f
+            self.result.add_fail(row, msg)
+
+        fields = []
         for f in lookup_fields:
+            if f.upper() in numeric_fields and f.upper() != "VALUE":
+                fields.append(f)
+            else:
+                self.lookup_field(data, ras, f)
+
+        if not fields:
+            return
+
+        self.info("Reading attribute table fields {0} of '{1}'".format(fields, ras))
+        with arcpy.da.SearchCursor(ras, ["VALUE"] + fields) as cursor:
+            rat = [row for row in cursor if row[0] is not None]
+
+        if not rat:
+            raise ValueError("'{}' has no attribute table rows".format(ras))
+
+        grid = blocks.RasterGrid(ras)
+
+        # one compiled remap and one writer per field
+        lookups = []
+        for i, f in enumerate(fields, start=1):
+            lut = remap.Remap([(row[0], row[0], row[i]) for row in rat])
+            lut.compile_lookup(max(2 ** 16, 4 * len(rat)))  # dense unless the values are very sparse
+            ras_out = utils.make_raster_name(ras, self.output_file_workspace, self.raster_format, self.output_filename_prefix, self.output_filename_suffix + "_" + f)
+            lookups.append([f, lut, blocks.BlockWriter(ras_out, grid, lut.output_dtype(grid.dtype))])
+
+        for window, block in blocks.iter_blocks(grid):
+            for item in lookups:
+                f, lut, writer = item
+                if not writer:
+                    continue
+                try:
+                    writer.write(window, lut.apply(block))
+                except Exception as e:
+                    fail(f, str(e))
+                    item[2] = None
+
+        for f, lut, writer in lookups:
+            if not writer:
+                continue
             try:
-                self.info("Lookup field '{0}' in '{1}'".format(f, ras))
-                out = Lookup(ras, f)
-                ras_out = utils.make_raster_name(ras, self.output_file_workspace, self.raster_format, self.output_filename_prefix, self.output_filename_suffix + "_" + f)
-                out.save(ras_out)
-                self.info("Saved to {0}".format(ras_out))
-
-                self.result.add_pass({"raster": ras_out, "source_geodata": ras})
-            except:
-                self.warn("Failed on field '{}'".format(f))
-                data["raster"] = ras
-                data["failure_field"] = f
-                self.result.add_fail(data)
+                writer.close()
+                self.info("Saved to {0}".format(writer.out_raster))
+                self.result.add_pass({"raster": writer.out_raster, "source_geodata": ras})
+            except Exception as e:
+                fail(f, str(e))
 
         return
 
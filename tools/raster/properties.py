@@ -1,5 +1,6 @@
 from base.base_tool import BaseTool
 
+from base import blocks
 from base.utils import validate_geodata
 from base.decorators import input_output_table, input_tableview
 from arcpy import Describe, GetRasterProperties_management
@@ -18,6 +19,13 @@ describe_field_groups = dict(
                                "COLUMNCOUNT", "ROWCOUNT", "BANDCOUNT", "ANYNODATA", "ALLNODATA", "SENSORNAME", "PRODUCTNAME", "ACQUSITIONDATE", "SOURCETYPE",
                                "SUNELEVATION", "CLOUDCOVER", "SUNAZIMUTH", "SENSORAZIMUTH", "SENSORELEVATION", "OFFNADIR", "WAVELENGTH"])
 
+# properties only GetRasterProperties knows, read from the key metadata of the raster rather than its cells
+metadata_properties = ["SENSORNAME", "PRODUCTNAME", "ACQUSITIONDATE", "SOURCETYPE", "SUNELEVATION", "CLOUDCOVER", "SUNAZIMUTH",
+                       "SENSORAZIMUTH", "SENSORELEVATION", "OFFNADIR"]
+
+# GetRasterProperties VALUETYPE codes
+value_types = {"U1": 0, "U2": 1, "U4": 2, "U8": 3, "S8": 4, "U16": 5, "S16": 6, "U32": 7, "S32": 8, "F32": 9, "F64": 10}
+
 
 class BandPropertiesRasterTool(BaseTool):
     """
@@ -58,7 +66,7 @@ class BandPropertiesRasterTool(BaseTool):
         return
 
     def describe(self, data):
-        """
+        """ Describe a raster once and read each band once
 
         Args:
             data:
@@ -77,22 +85,20 @@ class BandPropertiesRasterTool(BaseTool):
 
         desc = {"raster_{}".format(p): getattr(r, p, None) for p in describe_field_groups["raster"]}
 
-        bands = [b.name for b in getattr(r, "children", [])]
+        bands = getattr(r, "children", [])
+
+        metadata = {p: get_raster_property(ras, p) for p in metadata_properties}
+
+        for rb in bands:
+            band = rb.name
+            summary = blocks.band_summary(blocks.RasterGrid(join(ras, band)))
+            desc.update({"{}_{}".format(band, att): getattr(rb, att, None) for att in describe_field_groups["raster_band_properties"]})
 
-        for band in bands:
-            b = join(ras, band)
-            rb = Describe(b)
-            desc2 = {"{}_{}".format(band, att): getattr(rb, att, None) for att in describe_field_groups["raster_band_properties"]}
-            desc.update(desc2)
-            desc2 = {}
-            for p in describe_field_groups["raster_band_properties_ex"]:  #have to wrap this, UNIQUEVALUECOUNT not present for floats
-                try:
-                    desc2["{}_{}".format(band, p)] = GetRasterProperties_management(ras, p, band).getOutput(0)
-                except:
-                    desc2["{}_{}".format(band, p)] = None
+            props = band_properties(r, rb, summary)
+            props.update(metadata)
+            props["WAVELENGTH"] = get_raster_property(ras, "WAVELENGTH", band)
 
-            # desc2 = {"{}_{}".format(band, p): GetRasterProperties_management(ras, p, band).getOutput(0) for p in describe_field_groups["raster_band_properties_ex"]}
-            desc.update(desc2)
+            desc.update({"{}_{}".format(band, p): props.get(p, None) for p in describe_field_groups["raster_band_properties_ex"]})
 
         # return an ordered dictionary
         od = OrderedDict()
@@ -101,3 +107,46 @@ class BandPropertiesRasterTool(BaseTool):
             od[i] = attributes
 
         return od
+
+
+def get_raster_property(ras, prop, band=None):
+    """ A property from GetRasterProperties
+
+    Args:
+        ras: The raster
+        prop: The property name
+        band: The band name, the first band if None
+
+    Returns:
+        The property, None if the raster doesn't have it
+
+    """
+
+    try:
+        return GetRasterProperties_management(ras, prop, band or "").getOutput(0)
+    except:
+        return None
+
+
+def band_properties(r, rb, summary):
+    """ The GetRasterProperties properties of a band, from its description and one read of its cells
+
+    Args:
+        r: Describe object of the raster
+        rb: Describe object of the band
+        summary: (statistics, distinct value count, NoData count) from blocks.band_summary
+
+    Returns:
+        dict
+
+    """
+
+    stats, unique, nodata = summary
+    extent = r.extent
+
+    return {"MINIMUM": stats.minimum, "MAXIMUM": stats.maximum, "MEAN": stats.mean if stats.count else None, "STD": stats.std,
+            "UNIQUEVALUECOUNT": unique,
+            "TOP": extent.YMax, "LEFT": extent.XMin, "RIGHT": extent.XMax, "BOTTOM": extent.YMin,
+            "CELLSIZEX": rb.meanCellWidth, "CELLSIZEY": rb.meanCellHeight, "VALUETYPE": value_types.get(rb.pixelType, None),
+            "COLUMNCOUNT": rb.width, "ROWCOUNT": rb.height, "BANDCOUNT": r.bandCount,
+            "ANYNODATA": int(nodata > 0), "ALLNODATA": int(stats.count == 0)}
@@ -1,8 +1,7 @@
 from base.base_tool import BaseTool
 
-from base import utils
+from base import utils, blocks, remap
 from base.decorators import input_tableview, input_output_table, parameter, data_nodata, raster_formats
-import arcpy
 
 tool_settings = {"label": "Reclass by Table",
                  "description": "Reclass by table...",
@@ -23,11 +22,12 @@ class ReclassByTableRasterTool(BaseTool):
 
         BaseTool.__init__(self, tool_settings)
 
-        self.execution_list = [self.iterate]
+        self.execution_list = [self.initialise, self.iterate]
 
         self.from_value_field = None
         self.to_value_field = None
         self.output_value_field = None
+        self.remap = None
 
         return
 
@@ -45,8 +45,8 @@ class ReclassByTableRasterTool(BaseTool):
 
         return BaseTool.getParameterInfo(self)
 
-    def iterate(self):
-        """
+    def initialise(self):
+        """ Read the remap table once and compile it for every raster
 
         Returns:
 
@@ -58,6 +58,26 @@ class ReclassByTableRasterTool(BaseTool):
         self.to_value_field = p["to_value_field"]
         self.output_value_field = p["output_value_field"]
 
+        ranges = remap.read_remap_table(self.in_remap_table, self.from_value_field, self.to_value_field, self.output_value_field)
+        self.remap = remap.Remap(ranges)
+
+        if self.remap.compile_lookup():
+            self.info("{} remap ranges compiled to a lookup table of {} values".format(len(ranges), self.remap.lookup_index.size))
+        else:
+            self.info("{} remap ranges compiled".format(len(ranges)))
+
+        if self.missing_values != "NODATA":
+            self.missing_values = "DATA"
+
+        return
+
+    def iterate(self):
+        """
+
+        Returns:
+
+        """
+
         self.iterate_function_on_tableview(self.reclass, return_to_results=True)
 
         return
@@ -80,7 +100,9 @@ class ReclassByTableRasterTool(BaseTool):
 
         self.info("Reclassifying {0} -->> {1}...".format(ras, ras_out))
 
-        arcpy.ReclassByTable_3d(ras, self.in_remap_table, self.from_value_field, self.to_value_field, self.output_value_field, ras_out, self.missing_values)
+        grid = blocks.RasterGrid(ras)
+
+        blocks.map_blocks(grid, ras_out, lambda a: self.remap.apply(a, self.missing_values), self.remap.output_dtype(grid.dtype, self.missing_values))
 
         return {"raster": ras_out, "source_geodata": ras}
 
@@ -1,7 +1,6 @@
 from base.base_tool import BaseTool
-from base import utils
+from base import utils, blocks, remap
 from base.decorators import input_tableview, input_output_table, parameter, data_nodata, raster_formats
-import arcpy
 from collections import OrderedDict
 
 
@@ -108,25 +107,26 @@ class ReclassByThresholdRasterTool(BaseTool):
         if not data["thresholds"]:
             raise ValueError("\tNo thresholds set")
 
-        self.info("\tUpdating RAT...")
-        arcpy.BuildRasterAttributeTable_management(ras, "Overwrite")
-
-        self.info("\tUpdating statistics...")
-        arcpy.CalculateStatistics_management(ras)
-
         # "0 5 1;5.01 7.5 2;7.5 10 3"  from, to, new
-        minv = float(arcpy.GetRasterProperties_management(ras, "MINIMUM").getOutput(0))
-        maxv = float(arcpy.GetRasterProperties_management(ras, "MAXIMUM").getOutput(0))
-        mean = float(arcpy.GetRasterProperties_management(ras, "MEAN").getOutput(0))
-        std = float(arcpy.GetRasterProperties_management(ras, "STD").getOutput(0))
+        grid = blocks.RasterGrid(ras)
 
-        remap = data["thresholds"].replace("MIN", str(minv)).replace("MAX", str(maxv))
+        minv = maxv = mean = std = None
+        if remap.uses_statistics(data["thresholds"]):  # one read for MIN/MAX, without touching the source statistics
+            self.info("\tCalculating statistics...")
+            stats = blocks.raster_statistics(grid)
+            minv, maxv, mean, std = stats.minimum, stats.maximum, stats.as_dict()["mean"], stats.std
 
-        self.info(["Args=", ras, "Value", remap, ras_out, "NODATA"])
+        ranges = remap.parse_remap_string(data["thresholds"], minv, maxv)
+        remap_string = data["thresholds"].replace("MIN", str(minv)).replace("MAX", str(maxv))
+        compiled = remap.Remap(ranges)
+        if grid.is_integer:
+            compiled.compile_lookup()
+
+        self.info(["Args=", ras, "Value", remap_string, ras_out, "NODATA"])
 
         self.info("Reclassifying...")
 
-        arcpy.Reclassify_3d(ras, "Value", remap, ras_out, "NODATA")
+        blocks.map_blocks(grid, ras_out, compiled.apply, compiled.output_dtype(grid.dtype))
 
         self.info("Done")
         # self.info("Adding ")
@@ -141,5 +141,7 @@ class ReclassByThresholdRasterTool(BaseTool):
         #         row[0] = v[row[1]]
         #         cursor.updateRow(row)
 
-        return {"raster": ras_out, "source_geodata": ras, "min_max_mean_std": "{}_{}_{}_{}".format(minv, maxv, mean, std), "remap": remap}
+        min_max_mean_std = None if minv is None else "{}_{}_{}_{}".format(minv, maxv, mean, std)  # None when no statistics were needed
+
+        return {"raster": ras_out, "source_geodata": ras, "min_max_mean_std": min_max_mean_std, "remap": remap_string}
 
@@ -50,6 +50,7 @@ class ReprojectRasterTool(BaseTool):
         """
 
         self.output_cs = self.parameters[2].value  # need the object for later code to work
+        self.output_cs_string = self.output_cs.exportToString()  # for worker processes
         self.cell_size = str(self.cell_size)  # this seemed to solve an issue with unicode... strange
 
         if self.overrides != "#":
@@ -63,6 +64,18 @@ class ReprojectRasterTool(BaseTool):
 
         return
 
+    def initialise_worker(self):
+        """
+
+        Returns:
+
+        """
+
+        self.output_cs = arcpy.SpatialReference()
+        self.output_cs.loadFromString(self.output_cs_string)
+
+        return
+
     def iterate(self):
         """
 
@@ -1,8 +1,8 @@
 from base.base_tool import BaseTool
 
-from base import utils
+from base import utils, blocks
 from base.decorators import input_tableview, input_output_table, parameter, raster_formats
-import arcpy
+import numpy as np
 
 
 tool_settings = {"label": "Set NoData Value",
@@ -31,6 +31,7 @@ class SetNodataValueRasterTool(BaseTool):
     @input_tableview(data_type="raster")
     @parameter("ndv", "NoData Value", "GPDouble", "Required", False, "Input", None, None, None, None)
     @parameter("raster_format", "Format for output rasters", "GPString", "Required", False, "Input", raster_formats, None, None, "Esri Grid")
+    @parameter("header_only", "Only Change the NoData Value (in place)", "GPBoolean", "Optional", False, "Input", None, None, None, False, "Options")
     @input_output_table(affixing=True)
     def getParameterInfo(self):
         """
@@ -53,7 +54,7 @@ class SetNodataValueRasterTool(BaseTool):
         return
 
     def set_ndv(self, data):
-        """
+        """ Rewrite the raster block by block with a new NoData value, or just re-tag it in place
 
         Args:
             data:
@@ -66,14 +67,28 @@ class SetNodataValueRasterTool(BaseTool):
 
         utils.validate_geodata(ras, raster=True)
 
+        grid = blocks.RasterGrid(ras)
+
+        if self.header_only:
+            if grid.nodata is None or grid.nodata == self.ndv:
+                self.info("Setting NDV {0} on {1} in place".format(self.ndv, ras))
+                utils.set_nodata_tag(ras, self.ndv)
+                return {"raster": ras, "source_geodata": ras, "header_only": True}
+            # re-tagging would turn the existing NoData cells into values, for good
+            self.warn("{0} already has NoData value {1}, writing a new raster instead of changing it in place".format(ras, grid.nodata))
+
         r_out = utils.make_raster_name(ras, self.output_file_workspace, self.raster_format, self.output_filename_prefix, self.output_filename_suffix)
 
         self.info("Setting NDV {0} on {1} -> {2}".format(self.ndv, ras, r_out))
 
-        null_ras = arcpy.sa.IsNull(ras)
-
-        out_ras = arcpy.sa.Con(null_ras, self.ndv, ras, "#")
+        ndv = self.ndv
+        if grid.is_integer:
+            limits = np.iinfo(grid.dtype)
+            if not float(ndv).is_integer() or not limits.min <= ndv <= limits.max:
+                raise ValueError("NoData value {} does not fit pixel type {} of {}".format(ndv, grid.pixel_type, ras))
+            ndv = int(ndv)
 
-        out_ras.save(r_out)
+        # NoData cells are written as the new value, which is tagged as NoData
+        blocks.map_blocks(grid, r_out, lambda a: a, grid.dtype, ndv)
 
-        return {"raster": r_out, "source_geodata": ras}
+        return {"raster": r_out, "source_geodata": ras, "header_only": False}
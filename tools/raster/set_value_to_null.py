@@ -2,9 +2,9 @@
 
 """
 from base.base_tool import BaseTool
-from base import utils
+from base import utils, blocks
 from base.decorators import input_tableview, input_output_table, parameter, raster_formats
-from arcpy.sa import SetNull
+import numpy as np
 
 
 tool_settings = {"label": "Set Value to Null",
@@ -31,8 +31,9 @@ class SetValueToNullRasterTool(BaseTool):
         return
 
     @input_tableview(data_type="raster")
-    @parameter("val_to_null", "Value to Set Null", "GPDouble", "Required", False, "Input", None, None, None, None)
+    @parameter("val_to_null", "Values to Set Null", "GPDouble", "Required", True, "Input", None, None, None, None)
     @parameter("raster_format", "Format for output rasters", "GPString", "Required", False, "Input", raster_formats, None, None, "Esri Grid")
+    @parameter("header_only", "Only Change the NoData Value (in place)", "GPBoolean", "Optional", False, "Input", None, None, None, False, "Options")
     @input_output_table(affixing=True)
     def getParameterInfo(self):
         """
@@ -55,7 +56,7 @@ class SetValueToNullRasterTool(BaseTool):
         return
 
     def set_null(self, data):
-        """
+        """ Null the values block by block, or just re-tag the NoData value in place
 
         Args:
             data:
@@ -68,14 +69,34 @@ class SetValueToNullRasterTool(BaseTool):
 
         utils.validate_geodata(r_in, raster=True)
 
+        values = utils.make_tuple(self.val_to_null)
+        grid = blocks.RasterGrid(r_in)
+
+        if self.header_only:
+            if len(values) != 1:
+                raise ValueError("Only one value can be set null by changing the NoData value, not {}".format(values))
+            if grid.nodata is None or grid.nodata == values[0]:
+                self.info("Setting the NoData value of {0} to {1} in place".format(r_in, values[0]))
+                utils.set_nodata_tag(r_in, values[0])
+                return {"raster": r_in, "source_geodata": r_in, "header_only": True}
+            # re-tagging would turn the existing NoData cells into values, for good
+            self.warn("{0} already has NoData value {1}, writing a new raster instead of changing it in place".format(r_in, grid.nodata))
+
         r_out = utils.make_raster_name(r_in, self.output_file_workspace, self.raster_format, self.output_filename_prefix, self.output_filename_suffix)
 
-        self.info("Setting values of {0} to Null in {1} -> {2}".format(self.val_to_null, r_in, r_out))
+        self.info("Setting values of {0} to Null in {1} -> {2}".format(values, r_in, r_out))
 
-        out_ras = SetNull(r_in, r_in, 'VALUE = {0}'.format(self.val_to_null))
+        if grid.is_integer:  # fractional and out of range values can't be in an integer raster
+            limits = np.iinfo(grid.dtype)
+            values = [v for v in values if float(v).is_integer() and limits.min <= v <= limits.max]
+        nulls = np.array(values, dtype=grid.dtype)  # rounded as the cells are, e.g. -3.4028235e38 in float32
 
-        out_ras.save(r_out)
+        def set_null_block(a):
+            a = np.ma.array(a, copy=False)
+            a[np.in1d(np.ma.getdata(a).ravel(), nulls).reshape(a.shape)] = np.ma.masked
+            return a
 
-        return {"raster": r_out, "source_geodata": r_in}
+        blocks.map_blocks(grid, r_out, set_null_block, grid.dtype, grid.nodata)
 
+        return {"raster": r_out, "source_geodata": r_in, "header_only": False}
 
@@ -1,8 +1,10 @@
 from base.base_tool import BaseTool
 
-from base import utils
+from base import utils, blocks
+from base.histogram import raster_sketch
 from base.decorators import input_tableview, input_output_table, parameter, data_nodata, raster_formats
 import arcpy
+import numpy as np
 
 tool_settings = {"label": "Slice",
                  "description": "Slice raster",
@@ -60,7 +62,9 @@ class SliceRasterTool(BaseTool):
         return
 
     def slice(self, data):
-        """
+        """ Slice a raster in two reads, one to find the breaks and one to apply them
+
+        NATURAL_BREAKS is left to Slice_3d
 
         Args:
             data:
@@ -77,8 +81,52 @@ class SliceRasterTool(BaseTool):
 
         self.info("Slicing {0} -->> {1}...".format(ras, ras_out))
 
-        arcpy.Slice_3d(ras, ras_out, self.num_zones, self.slice_type, self.base_output_zone)
+        if self.slice_type == "NATURAL_BREAKS":
+            arcpy.Slice_3d(ras, ras_out, self.num_zones, self.slice_type, self.base_output_zone)
+            return {"raster": ras_out, "source_geodata": ras, "breaks": None}
+
+        grid = blocks.RasterGrid(ras)
+        breaks = self.slice_breaks(grid)
+
+        self.info("Slice breaks are {}".format(breaks))
+
+        base_zone = self.base_output_zone
+
+        def slice_block(a):
+            return np.ma.masked_array(np.searchsorted(breaks, np.ma.getdata(a), side="left") + base_zone, mask=np.ma.getmaskarray(a))
+
+        blocks.map_blocks(grid, ras_out, slice_block, "int32")
+
+        return {"raster": ras_out, "source_geodata": ras, "breaks": ";".join(repr(b) for b in breaks)}
+
+    def slice_breaks(self, grid):
+        """ The upper limits of all zones but the last, a value on a limit is in the lower zone
+
+        EQUAL_INTERVAL needs only the range, EQUAL_AREA uses the quantiles of a
+        streaming histogram (exact for integer rasters)
+
+        Args:
+            grid: RasterGrid of the raster to slice
+
+        Returns:
+            list of num_zones - 1 values
+
+        """
+
+        fractions = [float(k) / self.num_zones for k in range(1, self.num_zones)]
+
+        if self.slice_type == "EQUAL_INTERVAL":
+            stats = blocks.raster_statistics(grid)
+            if not stats.count:
+                raise ValueError("Raster '{}' has no values to slice".format(grid.raster))
+            return [stats.minimum + f * (stats.maximum - stats.minimum) for f in fractions]
+
+        if self.slice_type == "EQUAL_AREA":
+            breaks = raster_sketch(grid).quantiles(fractions)
+            if breaks is None:
+                raise ValueError("Raster '{}' has no values to slice".format(grid.raster))
+            return breaks
 
-        return {"raster": ras_out, "source_geodata": ras}
+        raise ValueError("Unknown slice type '{}'".format(self.slice_type))
 
 #  Slice_3d (in_raster, out_raster, number_zones, {slice_type}, {base_output_zone})
@@ -1,8 +1,8 @@
 from base.base_tool import BaseTool
 
-from base import utils
+from base import utils, blocks
 from base.decorators import input_tableview, input_output_table, parameter, transform_methods, raster_formats
-import arcpy
+import numpy as np
 
 tool_settings = {"label": "Transform",
                  "description": "Transforms rasters...",
@@ -99,162 +99,84 @@ class TransformRasterTool(BaseTool):
 
         return
 
-    def get_property(self, raster, property):
+    def transform(self, data):
         """
 
         Args:
-            raster:
-            property:
+            data:
 
         Returns:
 
         """
 
-        v = arcpy.GetRasterProperties_management(raster, property)
-        v = v.getOutput(0)
-        self.debug("for raster {} property {} has type {} ".format(raster, property, type(v)))
+        r_in = data["raster"]
+        utils.validate_geodata(r_in, raster=True)
 
-        return float(v)
+        r_out = utils.make_raster_name(r_in, self.output_file_workspace, self.raster_format, self.output_filename_prefix, self.output_filename_suffix)
 
-    def transform(self, data):
-        """
+        grid = blocks.RasterGrid(r_in)
+
+        if self.method in ["LOG", "SQUAREROOT"]:  # cell by cell, no statistics needed
+            stats = None
+
+        else:
+            self.info("\tCalculating statistics")
+            stats = blocks.raster_statistics(grid)
+            if not stats.count:
+                raise ValueError("Raster {} has no data values".format(r_in))
+            self.info("\tStatistics Mean/Std/Min/Max: {}/{}/{}/{}".format(stats.mean, stats.std, stats.minimum, stats.maximum))
+
+        self.info("Transforming raster {} using method {}".format(r_in, self.method))
+        func = self.block_function(stats)
+        dtype = np.result_type(grid.dtype, np.int16) if (self.method == "INVERT" and grid.is_integer) else "float32"  # inverted values can be negative
+
+        # save and exit
+        self.info('\tSaving to {0}'.format(r_out))
+        blocks.map_blocks(grid, r_out, func, dtype)
+
+        data["method"] = self.method
+
+        return {"raster": r_out, "source_geodata": r_in, "transform": data}
+
+    def block_function(self, stats):
+        """ The transform for the tool method as a function of a block
 
         Args:
-            data:
+            stats: StreamingStatistics of the input, None for LOG and SQUAREROOT
 
         Returns:
+            function taking and returning a masked array
 
         """
 
-        r_in = data["raster"]
-        utils.validate_geodata(r_in, raster=True)
-
-        r_out = utils.make_raster_name(r_in, self.output_file_workspace, self.raster_format, self.output_filename_prefix, self.output_filename_suffix)
-
-        self.info("\tCalculating statistics")
-        arcpy.CalculateStatistics_management(r_in)
+        if self.method == "LOG":
+            return lambda a: np.ma.log(a.astype("float64"))  # cells <= 0 are masked
 
-        raster_mean = self.get_property(r_in, "MEAN")
-        raster_std = self.get_property(r_in, "STD")
-        raster_min = self.get_property(r_in, "MINIMUM")
-        raster_max = self.get_property(r_in, "MAXIMUM")
-        self.info("\tStatistics Mean/Std/Min/Max: {}/{}/{}/{}".format(raster_mean, raster_std, raster_min, raster_max))
+        if self.method == "SQUAREROOT":
+            return lambda a: np.ma.sqrt(a.astype("float64"))  # cells < 0 are masked
 
-        self.info("Transforming raster {} using method {}".format(r_in, self.method))
-        ras = arcpy.Raster(r_in)
+        raster_mean, raster_std, raster_min, raster_max = stats.mean, stats.std, stats.minimum, stats.maximum
 
         if self.method == "STANDARDISE":
-            ras = (ras - raster_mean) / raster_std
+            if not raster_std:
+                raise ValueError("Standard deviation is 0, standardising is not applicable")
+            return lambda a: (a - raster_mean) / raster_std
 
         elif self.method == "STRETCH":  # (INVAL - INLO) * ((OUTUP-OUTLO)/(INUP-INLO)) + OUTLO
             if raster_min == raster_max:
                 raise ValueError("Minimum value = Maximum value, stretching is not applicable")
-            else:
-                scale = (self.max_stretch - self.min_stretch) / (raster_max - raster_min)
-                ras = (ras - raster_min) * scale + self.min_stretch
+            scale = (self.max_stretch - self.min_stretch) / (raster_max - raster_min)
+            return lambda a: (a - raster_min) * scale + self.min_stretch
 
         elif self.method == "NORMALISE":
             if raster_min == raster_max:
                 raise ValueError("Minimum value = Maximum value, normalising is not applicable")
-            else:
-                ras = (ras - raster_min) / (raster_max - raster_min)
-
-        elif self.method == "LOG":
-            ras = arcpy.sa.Ln(r_in)
-
-        elif self.method == "SQUAREROOT":
-            ras = arcpy.sa.SquareRoot(r_in)
+            return lambda a: (a - raster_min) / float(raster_max - raster_min)
 
         elif self.method == "INVERT":
-            ras = (ras - (raster_max - raster_min)) * -1
-
-        # save and exit
-        self.info('\tSaving to {0}'.format(r_out))
-        ras.save(r_out)
-
-        data["method"] = self.method
-
-        return {"raster": r_out, "source_geodata": r_in, "transform": data}
-
-        # this numpy stuff.. numpyarraytoraster just not behaving
-        # self.send_info(data)
-        # r_in = data["raster"]
-        # if not self.geodata.exists(r_in):
-        #     raise DoesNotExistError(r_in)
-        #
-        # _, __, ras_name, ras_ext = split_up_filename(r_in)
-        # r_out = self.geodata.make_raster_name(r_in, self.results.output_workspace, self.raster_format)
-        # self.send_info("Transforming raster {0} -->> {1} using method {2}".format(r_in, r_out, self.method))
-        #
-        # # get some properties
-        # np_type_map = {"U1": "uint8", "U2": "uint8", "U4": "uint8", "U8": "uint8", "S8": "int8", "U16": "uint16", "S16": "int16", "U32": "uint32", "S32": "int32", "F32": "float32", "F64": "float64"}
-        # rast = ap.Raster(r_in)
-        # np_type = np_type_map[rast.pixelType]
-        # xmin_in, ymin_in = rast.extent.XMin, rast.extent.YMin
-        # xwidth_in, ywidth_in = rast.meanCellWidth, rast.meanCellHeight
-        # ndv_in = rast.noDataValue
-        # del rast
-        #
-        # self.send_info("...reading raster array...")
-        # array_in = ap.RasterToNumPyArray(r_in)
-        # array_in = np.array(array_in, dtype=np_type)
-        # self.send_info(array_in)
-        #
-        # self.send_info("...masking array with '{}'...".format(ndv_in))
-        # mask = np.where(array_in == ndv_in, True, False)
-        # array_masked = np.ma.array(array_in, mask=mask)
-        # self.send_info(array_masked)
-        #
-        # mean, stdv, minv, maxv = array_masked.mean(), array_masked.std(), array_masked.min(), array_masked.max()
-        # self.send_info('mean={} stdv={} max={} min={}'.format(mean, stdv, maxv, minv))
-        #
-        # array_out = array_masked
-        # if self.method == "STANDARDISE":
-        #     array_out = (array_masked - mean) / stdv
-        #
-        # elif self.method == "STRETCH":  # (INVAL - INLO) * ((OUTUP-OUTLO)/(INUP-INLO)) + OUTLO
-        #     if minv == maxv:
-        #         raise ValueError("Minimum value = Maximum value, normalising is not applicable")
-        #     else:
-        #         scale = (self.max_stretch - self.min_stretch) / (maxv - minv)
-        #         array_out = (array_masked - minv) * scale + self.min_stretch
-        #
-        # elif self.method == "NORMALISE":
-        #     if minv == maxv:
-        #         raise ValueError("Minimum value = Maximum value, normalising is not applicable")
-        #     else:
-        #         array_out = (array_masked - minv) / (maxv - minv)
-        #
-        # elif self.method == "LOG":
-        #     array_out = array_masked.log()
-        #
-        # elif self.method == "SQUAREROOT":
-        #     array_out = array_masked.sqrt()
-        #
-        # elif self.method == "INVERT":
-        #     array_out = (array_masked - (maxv + minv)) * -1
-        #
-        # minv_qc, maxv_qc = array_out.min(), array_out.max()
-        # self.send_info('{}, {}) --> ({}, {})\n{}'.format(minv, maxv, minv_qc, maxv_qc, array_out))
-        #
-        # self.send_info("...casting to original data type...")
-        # array_out = array_out.data.astype(np_type)
-        # minv_qc, maxv_qc = array_out.min(), array_out.max()
-        # self.send_info('{}, {}) --> ({}, {})\n{}'.format(minv, maxv, minv_qc, maxv_qc, array_out))
-        #
-        # self.send_info("...saving to '{}'...".format(r_out))
-        # ap.env.overwriteOutput = True
-        # ap.env.outputCoordinateSystem = r_in
-        # ap.env.cellSize = r_in
-        # ap.env.Extent = r_in
-        # ap.env.snapRaster = r_in
-        # ras_out = ap.NumPyArrayToRaster(array_out, ap.Point(xmin_in, ymin_in), xwidth_in, ywidth_in, ndv_in)
-        # ras_out.save(r_out)
-        # data["method"] = self.method
-        # self.result.add({"geodata": r_out, "source_geodata": r_in, "transform": data})
-
-        # return
+            return lambda a: (a - (raster_max - raster_min)) * -1
 
+        raise ValueError("Unknown transform method '{}'".format(self.method))
 
 
     # def set_nodata():
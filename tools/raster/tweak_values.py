@@ -1,8 +1,8 @@
 from base.base_tool import BaseTool
 
-from base import utils
+from base import utils, blocks
 from base.decorators import input_tableview, input_output_table, parameter, raster_formats
-import arcpy
+import numpy as np
 
 tool_settings = {"label": "Tweak Values",
                  "description": "Tweaks raster cell values with simple mathematics and can integerise result",
@@ -52,7 +52,7 @@ class TweakValuesRasterTool(BaseTool):
 
         """
 
-        if not (self.min_val or self.max_val or self.constant or self.scalar or self.integerise):
+        if self.min_val is None and self.max_val is None and not (self.constant or self.scalar or self.integerise):
             raise ValueError("No tweaks specified")
 
         return
@@ -69,7 +69,7 @@ class TweakValuesRasterTool(BaseTool):
         return
 
     def tweak(self, data):
-        """
+        """ Apply all the tweaks in one pass, one read and one write per raster
 
         Args:
             data:
@@ -83,23 +83,14 @@ class TweakValuesRasterTool(BaseTool):
 
         r_out = utils.make_raster_name(r_in, self.output_file_workspace, self.raster_format, self.output_filename_prefix, self.output_filename_suffix)
 
-        ras = arcpy.Raster(r_in)
-        ndv = ras.noDataValue
-        pix_type = ras.pixelType
-        if any(x in pix_type for x in ["S", "U"]):
-            self.info("Raster pixel type is '{}' (integer)".format(pix_type))
-            try:
-                ndv = int(ndv)
-            except:
-                pass
-            try:
-                self.min_val = int(self.min_val)
-            except:
-                pass
-            try:
-                self.max_val = int(self.max_val)
-            except:
-                pass
+        grid = blocks.RasterGrid(r_in)
+        ndv = grid.nodata
+        min_val, max_val = self.min_val, self.max_val
+
+        if grid.is_integer:
+            self.info("Raster pixel type is '{}' (integer)".format(grid.pixel_type))
+            min_val = int(min_val) if min_val is not None else None
+            max_val = int(max_val) if max_val is not None else None
 
         self.info(["Tweaking raster {}".format(r_in), "\tNoData Value is {}".format(ndv)])
 
@@ -107,39 +98,84 @@ class TweakValuesRasterTool(BaseTool):
 
         if self.scalar:
             self.info('\tScaling by {}'.format(self.scalar))
-            ras *= float(self.scalar)
             tweaks.append('scaled by {}'.format(self.scalar))
 
         if self.constant:
             self.info('\tTranslating by {}'.format(self.constant))
-            ras += float(self.constant)
             tweaks.append('translated by {}'.format(self.constant))
 
-        if self.min_val:
-            self.info('\tSetting minimum to {} values under will go to {}'.format(self.min_val, self.under_min))
-            under = self.min_val if self.under_min == 'Minimum' else ndv
-            if under == "#":
-                raise ValueError("Raster '{}' does not have a nodata value".format(r_in))
-            ras = arcpy.sa.Con(ras >= self.min_val, ras, under)
-            tweaks.append('Minimum set to {} under set to {}'.format(self.min_val, under))
-
-        if self.max_val:
-            self.info('\tSetting maximum to {} values over will go to {}'.format(self.max_val, self.over_max))
-            over = self.max_val if self.over_max == 'Maximum' else ndv
-            if over == "#":
-                raise ValueError("Raster '{}' does not have a nodata value".format(r_in))
-            ras = arcpy.sa.Con(ras <= self.max_val, ras, over)
-            tweaks.append('Maximum set to {} over set to {}'.format(self.max_val, over))
+        if min_val is not None:
+            self.info('\tSetting minimum to {} values under will go to {}'.format(min_val, self.under_min))
+            tweaks.append('Minimum set to {} under set to {}'.format(min_val, min_val if self.under_min == 'Minimum' else ndv))
+
+        if max_val is not None:
+            self.info('\tSetting maximum to {} values over will go to {}'.format(max_val, self.over_max))
+            tweaks.append('Maximum set to {} over set to {}'.format(max_val, max_val if self.over_max == 'Maximum' else ndv))
 
         if self.integerise:
             self.info('\tIntegerising...')
-            ras = arcpy.sa.Int(ras)
             tweaks.append('integerised (truncation)')
+            dtype = np.dtype("int32")
+        elif grid.is_integer and not (self.scalar or self.constant):
+            dtype = grid.dtype
+        else:
+            dtype = np.dtype("float32")
 
         # save and exit
         self.info('\tSaving to {}'.format(r_out))
-        ras.save(r_out)
+        blocks.map_blocks(grid, r_out, self.block_function(min_val, max_val), dtype, ndv if dtype == grid.dtype else None)
 
         return {"raster": r_out, "source_geodata": r_in, "tweaks": ' & '.join(tweaks)}
 
-# Con (in_conditional_raster, in_true_raster_or_constant, {in_false_raster_or_constant}, {where_clause})
+    def block_function(self, min_val, max_val):
+        """ The tweaks fused into one function of a block
+
+        Scale, shift, clamp (or null) and truncate are applied in place on one
+        float64 buffer, reused from block to block
+
+        Args:
+            min_val: Minimum value, None for no minimum
+            max_val: Maximum value, None for no maximum
+
+        Returns:
+            function taking and returning a masked array
+
+        """
+
+        scalar, constant, integerise = self.scalar, self.constant, self.integerise
+        under_nodata, over_nodata = self.under_min == "NoData", self.over_max == "NoData"
+        buffers = {}
+
+        def tweak_block(block):
+
+            buf = buffers.get(block.shape)
+            if buf is None:
+                buf = buffers[block.shape] = np.empty(block.shape, dtype="float64")
+
+            np.copyto(buf, np.ma.getdata(block), casting="unsafe")
+            mask = np.ma.getmaskarray(block).copy()
+
+            if scalar:
+                np.multiply(buf, scalar, out=buf)
+
+            if constant:
+                np.add(buf, constant, out=buf)
+
+            if min_val is not None:
+                if under_nodata:
+                    mask |= buf < min_val
+                else:
+                    np.maximum(buf, min_val, out=buf)
+
+            if max_val is not None:
+                if over_nodata:
+                    mask |= buf > max_val
+                else:
+                    np.minimum(buf, max_val, out=buf)
+
+            if integerise:
+                np.trunc(buf, out=buf)
+
+            return np.ma.masked_array(buf, mask=mask, copy=False)
+
+        return tweak_block
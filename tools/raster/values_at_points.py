@@ -1,9 +1,8 @@
 from base.base_tool import BaseTool
 
-from base import utils
+from base import utils, blocks
 from base.decorators import input_tableview, input_output_table, parameter
-from arcpy import GetCellValue_management, GetCount_management
-import arcpy.sa
+from base.utils import point_value_layouts
 from collections import OrderedDict
 
 
@@ -16,6 +15,9 @@ tool_settings = {"label": "Values at Points",
 class ValuesAtPointsRasterTool(BaseTool):
     """
     """
+
+    supports_workers = False  # values are accumulated in self.result_dict
+
     def __init__(self):
         """
 
@@ -24,15 +26,17 @@ class ValuesAtPointsRasterTool(BaseTool):
         """
 
         BaseTool.__init__(self, tool_settings)
-        self.execution_list = [self.initialise, self.iterate, self.finish]
-        self.point_rows = None
+        self.execution_list = [self.initialise, self.iterate, self.sample, self.finish]
+        self.point_sampler = None
         self.points_srs = None
-        self.result_dict = {}
+        self.stacks = OrderedDict()
+        self.result_dict = OrderedDict()
 
         return
 
     @input_tableview(data_type="raster")
     @parameter("points", "Point Features", "GPFeatureLayer", "Required", False, "Input", ["Point"], None, None, None)
+    @parameter("output_layout", "Output Layout", "GPString", "Optional", False, "Input", point_value_layouts, None, None, point_value_layouts[0], "Options")
     @input_output_table()
     def getParameterInfo(self):
         """
@@ -57,10 +61,9 @@ class ValuesAtPointsRasterTool(BaseTool):
         if "unknown" in self.points_srs.lower():
             raise ValueError("Point dataset '{0}'has unknown spatial reference system ({1})".format(source, self.points_srs))
 
-        c = GetCount_management(self.points).getOutput(0)
-
-        self.point_rows = arcpy.da.SearchCursor(self.points, ("SHAPE@XY", "OID@"))
-        self.info("{0} points found in '{1}'".format(c, self.points))
+        # read the points once, they are reused for every raster
+        self.point_sampler = blocks.PointSampler(self.points)
+        self.info("{0} points found in '{1}'".format(len(self.point_sampler.ids), self.points))
 
         return
 
@@ -76,7 +79,7 @@ class ValuesAtPointsRasterTool(BaseTool):
         return
 
     def process(self, data):
-        """
+        """ Validate a raster and add it to the stack for its grid
 
         Args:
             data:
@@ -95,30 +98,41 @@ class ValuesAtPointsRasterTool(BaseTool):
         if ras_srs != self.points_srs:  # hack!! needs doing properly
             raise ValueError("Spatial reference systems do not match ({0} != {1})".format(ras_srs, self.points_srs))
 
-        self.info("Extracting point values from {0}...".format(ras))
-
-        for row in self.point_rows:
-            oid = row[1]
-            # calc
-            xy = "{0} {1}".format(row[0][0], row[0][1])
-            res = GetCellValue_management(ras, xy)
-            val = res.getOutput(0)
-
-            # get the storage
-            id_res = self.result_dict.get(oid, None)
-            if not id_res:  # init needed
-                id_res = {}
-                self.result_dict[oid] = id_res
-
-            # store it
-            id_res[r_base] = val
-
-        # Get the Band_2 and Band_3 cell value of certain point in a RGB image
-        # result = arcpy.GetCellValue_management("rgb.img", "480785 3807335", "2;3")
-        # cellSize = int(result.getOutput(0)) TODO
-        #
-        # individual results are being accumulated not added on by one
-        # as they are nested and need unravelling... see below ::finish()
+        grid = blocks.RasterGrid(ras)
+        self.stacks.setdefault(grid.signature, []).append((data, r_base, grid))
+
+        return
+
+    def sample(self):
+        """ Sample each stack of rasters sharing a grid, the point cells are found once per stack
+
+        Returns:
+
+        """
+
+        for stack in self.stacks.itervalues():
+
+            self.info("Extracting point values from {0} raster(s) on the grid of {1}...".format(len(stack), stack[0][2].raster))
+
+            for data, r_base, grid in stack:
+                try:
+                    values = self.point_sampler.sample(grid).tolist()  # NoData and points off the raster are None
+
+                except Exception as e:
+                    self.error("error sampling {}: {}".format(grid.raster, e))
+                    self.result.add_fail(data)
+                    continue
+
+                if self.output_layout == "LONG":
+                    self.result.add_pass([OrderedDict([("source_pt_id", oid), ("raster", r_base), ("source_raster", grid.raster), ("value", val)])
+                                          for oid, val in zip(self.point_sampler.ids, values)])
+                    continue
+
+                # individual results are being accumulated not added one by one
+                # as they are nested and need unravelling... see below ::finish()
+                for oid, val in zip(self.point_sampler.ids, values):
+                    self.result_dict.setdefault(oid, OrderedDict())[r_base] = val
+
         return
 
     def finish(self):
@@ -128,6 +142,9 @@ class ValuesAtPointsRasterTool(BaseTool):
 
         """
 
+        if not self.result_dict:  # LONG layout, or nothing sampled
+            return
+
         result_list = []
 
         for oid, val_dict in self.result_dict.iteritems():
@@ -0,0 +1,125 @@
+from base.base_tool import BaseTool
+
+from base import blocks, zonal
+from base.decorators import input_tableview, input_output_table, parameter
+from base.utils import validate_geodata
+from collections import OrderedDict
+import numpy as np
+
+
+tool_settings = {"label": "Zonal Counts",
+                 "description": "Counts the cells of each value in zones and reports into a table",
+                 "can_run_background": "True",
+                 "category": "Raster"}
+
+
+class ZonalCountsRasterTool(BaseTool):
+    """
+    """
+
+    supports_workers = False  # the zone index is cached in self.zone_index
+
+    def __init__(self):
+        """
+
+        Returns:
+
+        """
+
+        BaseTool.__init__(self, tool_settings)
+        self.execution_list = [self.iterate]
+        self.zone_index = zonal.ZoneIndexCache()
+
+        return
+
+    @input_tableview(data_type="raster")
+    @parameter("zone", "Zone Features", ["DERasterDataset", "GPFeatureLayer"], "Required", False, "Input", None, None, None, None, None)
+    @parameter("zone_field", "Zone Field", "Field", "Required", False, "Input", None, None, ["zone"], None, None)
+    @parameter("zone_vals", "Zone Values", "GPString", "Optional", True, "Input", None, None, None, None, "Options")
+    @input_output_table()
+    def getParameterInfo(self):
+        """
+
+        Returns:
+
+        """
+
+        return BaseTool.getParameterInfo(self)
+
+    def iterate(self):
+        """
+
+        Returns:
+
+        """
+
+        try:
+            self.iterate_function_on_tableview(self.count, return_to_results=True)
+        finally:
+            self.zone_index.close()  # delete the aligned zone raster, whether or not the run finished
+
+        return
+
+    def zone_filter(self, index):
+        """ Flag the zones to count
+
+        Args:
+            index: The ZoneIndex
+
+        Returns:
+            Boolean array by zone id, None for all zones
+
+        """
+
+        if self.zone_vals in [None, "", "#"]:
+            return None
+
+        wanted = set(v.strip().strip("'") for v in self.zone_vals.split(";"))
+
+        numbers = set()  # numeric zone values are compared as numbers, "1" matches 1.0
+        for v in wanted:
+            try:
+                numbers.add(float(v))
+            except ValueError:
+                pass
+
+        def is_wanted(v):
+            if isinstance(v, (int, long, float, np.number)):
+                return float(v) in numbers
+            return unicode(v) in wanted
+
+        return np.array([is_wanted(v) for v in index.values], dtype=bool)
+
+    def count(self, data):
+        """ Count the cells of each value in each zone, one result row per zone and value
+
+        Args:
+            data:
+
+        Returns:
+
+        """
+
+        ras = data["raster"]
+
+        validate_geodata(ras, raster=True)
+
+        grid = blocks.RasterGrid(ras)
+
+        if not self.zone_index.holds(grid):
+            self.info("Aligning zones '{0}' to the grid of '{1}' ...".format(self.zone, ras))
+        index = self.zone_index.get(self.zone, self.zone_field, grid)
+
+        self.info("Counting values of raster '{0}' in {1} zones ...".format(ras, index.count))
+
+        cell_area = grid.cell_width * grid.cell_height
+
+        rows = [OrderedDict([("source_geodata", ras), ("zone_field", self.zone_field), ("zone", index.values[z]),
+                             ("value", v), ("count", n), ("area", n * cell_area)])
+                for z, v, n in zonal.zonal_counts_table(index, grid, self.zone_filter(index))]
+
+        if not rows:
+            raise ValueError("No zones of '{0}' overlap values of raster '{1}'".format(self.zone, ras))
+
+        return rows
+
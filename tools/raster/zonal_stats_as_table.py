@@ -1,6 +1,8 @@
 from base.base_tool import BaseTool
 
+from base import blocks, zonal
 from base.decorators import input_tableview, input_output_table, parameter
+from collections import OrderedDict
 import arcpy
 from base.utils import validate_geodata, make_table_name, stats_type
 
@@ -23,8 +25,10 @@ class ZonalStatisticsAsTableTool(BaseTool):
         """
 
         BaseTool.__init__(self, tool_settings)
-        self.execution_list = [self.iterate]
+        self.execution_list = [self.initialise, self.iterate]
         self.polygon_srs = None
+        self.statistics = None
+        self.zone_index = zonal.ZoneIndexCache()
 
         return
 
@@ -43,6 +47,30 @@ class ZonalStatisticsAsTableTool(BaseTool):
 
         return BaseTool.getParameterInfo(self)
 
+    def initialise(self):
+        """ Decide which statistics the NumPy engine calculates
+
+        MAJORITY and MEDIAN are left to arcpy.sa.ZonalStatisticsAsTable
+
+        Returns:
+
+        """
+
+        stat = self.statistics_type if self.statistics_type not in [None, "#"] else "ALL"
+
+        if stat == "ALL":
+            self.statistics = zonal.zonal_statistics
+        elif stat in zonal.zonal_statistics:
+            self.statistics = ["COUNT", "AREA", stat]
+        else:
+            self.statistics = None
+            self.info("{} is calculated with arcpy.sa.ZonalStatisticsAsTable".format(stat))
+
+        if self.statistics:
+            self.supports_workers = False  # the zone index is cached in self.zone_index
+
+        return
+
     def iterate(self):
         """
 
@@ -50,7 +78,10 @@ class ZonalStatisticsAsTableTool(BaseTool):
 
         """
 
-        self.iterate_function_on_tableview(self.calc, return_to_results=True)
+        try:
+            self.iterate_function_on_tableview(self.calc, return_to_results=True)
+        finally:
+            self.zone_index.close()  # delete the aligned zone raster, whether or not the run finished
 
         return
 
@@ -68,6 +99,9 @@ class ZonalStatisticsAsTableTool(BaseTool):
 
         validate_geodata(ras, raster=True)
 
+        if self.statistics:
+            return self.zonal_statistics(ras)
+
         tab_out = make_table_name(ras, self.output_file_workspace, None, self.output_file_workspace, self. output_filename_suffix)
 
         self.info("Extracting statistics from raster '{0}' into table '{1}' ...".format(ras, tab_out))
@@ -75,3 +109,41 @@ class ZonalStatisticsAsTableTool(BaseTool):
         arcpy.sa.ZonalStatisticsAsTable(self.zones, self.zone_field, ras, tab_out, self.ignore_no_data, self.statistics_type)
 
         return {"geodata": tab_out, "source_geodata": ras, "zones": self.zones, "zone_field": self.zone_field, "no_data_handling": self.ignore_no_data, "statistics_type": self.statistics_type}
+
+    def zonal_statistics(self, ras):
+        """ Summarise a raster by zone with NumPy, one result row per zone
+
+        The zones are aligned to the grid of each raster, consecutive rasters on the same grid reuse them
+
+        Args:
+            ras: The value raster
+
+        Returns:
+            list of result rows
+
+        """
+
+        grid = blocks.RasterGrid(ras)
+
+        if not self.zone_index.holds(grid):
+            self.info("Aligning zones '{0}' to the grid of '{1}' ...".format(self.zones, ras))
+        index = self.zone_index.get(self.zones, self.zone_field, grid)
+
+        self.info("Extracting statistics from raster '{0}' for {1} zones ...".format(ras, index.count))
+
+        nodata = "NODATA" if self.ignore_no_data == "NODATA" else "DATA"
+        stats = zonal.zonal_statistics_table(index, grid, self.statistics, nodata)
+
+        rows = []
+        for zone, zone_stats in zip(index.values, stats):
+            if zone_stats is None:  # no cells of the raster in the zone
+                continue
+            row = OrderedDict([("source_geodata", ras), ("zone_field", self.zone_field), ("zone", zone)])
+            row.update((k.lower(), zone_stats[k]) for k in self.statistics)
+            rows.append(row)
+
+        if not rows:
+            raise ValueError("No zones of '{0}' overlap raster '{1}'".format(self.zones, ras))
+
+        return rows
+
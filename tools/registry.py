@@ -0,0 +1,237 @@
+""" This module declares the toolbox contents without importing them
+
+Every tool is listed by the module that implements it, its class name and its
+tool settings (label, description, category), which must match the
+tool_settings of its module. The 'Grid Garage.pyt' toolbox hands ArcGIS a
+light-weight stand-in class for each entry. ArcGIS instantiates every tool to
+read its label, category and description, the stand-in answers those from the
+registry, and the real tool module (and with it arcpy, arcpy.sa and any third
+party packages it needs) is only imported when ArcGIS asks for the tool's
+parameters or runs it.
+
+Keep this module free of arcpy and base imports, it is evaluated every time
+ArcGIS refreshes the toolbox.
+
+"""
+from importlib import import_module
+
+
+geodata_tools = [("tools.geodata.search", "SearchGeodataTool", {"label": "Search", "description": "Search for identifiable geodata", "can_run_background": "True", "category": "Geodata"}),
+                 ("tools.geodata.copy", "CopyGeodataTool", {"label": "Copy", "description": "Make a simple copy of geodata", "can_run_background": "True", "category": "Geodata"}),
+                 ("tools.geodata.describe", "DescribeGeodataTool", {"label": "Describe", "description": "Describes geodata", "can_run_background": "True", "category": "Geodata"}),
+                 ("tools.geodata.select", "SelectGeodataTool", {"label": "Select", "description": "Feed selected geodata into a table", "can_run_background": "True", "category": "Geodata"}),
+                 ("tools.geodata.display", "DisplayGeodataTool", {"label": "Display", "description": "Adds geodata to ArcMap document", "can_run_background": False, "category": "Geodata"}),
+                 ("tools.geodata.compare_extents", "CompareExtentsGeodataTool", {"label": "Compare Extents", "description": "Compare Extents...", "can_run_background": "True", "category": "Geodata"}),
+                 ("tools.geodata.delete", "DeleteGeodataTool", {"label": "Delete", "description": "Deletes geodata...", "can_run_background": "True", "category": "Geodata"}),
+                 ("tools.geodata.generate_names", "GenerateNamesGeodataTool", {"label": "Generate Names", "description": "Generates candidate dataset names for later use in the 'Rename' Tool...", "can_run_background": "True", "category": "Geodata"}),
+                 ("tools.geodata.rename", "RenameGeodataTool", {"label": "Rename", "description": "Renames datasets to a new name specified in the 'new name' field...", "can_run_background": "True", "category": "Geodata"}),
+                 ("tools.geodata.list_workspace_tables", "ListWorkspaceTablesGeodataTool", {"label": "List Workspace Tables", "description": "List tables within a workspace", "can_run_background": "True", "category": "Geodata"})]
+
+feature_tools = [("tools.feature.feature_to_raster", "FeatureToRasterTool", {"label": "Feature to Raster", "description": "Rasterise features by a 'field of fields'", "can_run_background": "True", "category": "Feature"}),
+                 ("tools.feature.polygon_to_raster", "PolygonToRasterTool", {"label": "Polygon to Raster", "description": "Rasterise polygon features by a 'field of fields' and additional geometry options", "can_run_background": "True", "category": "Feature"}),
+                 ("tools.feature.copy", "CopyFeatureTool", {"label": "Copy", "description": "Copies...", "can_run_background": "True", "category": "Feature"}),
+                 ("tools.feature.clip", "ClipFeatureTool", {"label": "Clip", "description": "Clips...", "can_run_background": "True", "category": "Feature"})]
+
+raster_tools = [("tools.raster.aggregate", "AggregateRasterTool", {"label": "Aggregate", "description": "Aggegate raster values...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.properties", "BandPropertiesRasterTool", {"label": "Band Properties", "description": "Reports raster band properties", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.block_statistics", "BlockStatisticsRasterTool", {"label": "Block Statistics", "description": "Block Statistics...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.build_attribute_table", "BuildAttributeTableRasterTool", {"label": "Build Attribute Table", "description": "Builds attribute tables for rasters", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.calculate_statistics", "CalculateStatisticsRasterTool", {"label": "Calculate Statistics", "description": "Calculates raster band statistics", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.clip", "ClipRasterTool", {"label": "Clip", "description": "Clips raster datasets", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.copy", "CopyRasterTool", {"label": "Copy", "description": "Copy rasters...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.focal_statistics", "FocalStatisticsRasterTool", {"label": "Focal Statistics", "description": "Focal Statistics...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.lookup_by_table", "LookupByTableRasterTool", {"label": "Lookup by Table", "description": "Lookup by table..", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.reproject", "ReprojectRasterTool", {"label": "Reproject", "description": "Reproject rasters...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.reclass_by_table", "ReclassByTableRasterTool", {"label": "Reclass by Table", "description": "Reclass by table...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.reclass_by_threshold", "ReclassByThresholdRasterTool", {"label": "Reclass by Threshold", "description": "Reclass by threshold values found in fields...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.resample", "ResampleRasterTool", {"label": "Resample", "description": "Resample rasters...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.set_no_data_value", "SetNodataValueRasterTool", {"label": "Set NoData Value", "description": "Set NoData Value...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.set_value_to_null", "SetValueToNullRasterTool", {"label": "Set Value to Null", "description": "Sets...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.slice", "SliceRasterTool", {"label": "Slice", "description": "Slice raster", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.to_ascii", "ToAsciiRasterTool", {"label": "To ASCII", "description": "Convert rasters to ASCII format...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.transform", "TransformRasterTool", {"label": "Transform", "description": "Transforms rasters...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.tweak_values", "TweakValuesRasterTool", {"label": "Tweak Values", "description": "Tweaks raster cell values with simple mathematics and can integerise result", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.extract_values_to_points", "ExtractValuesToPointsRasterTool", {"label": "Extract Values to Points", "description": "Extracts cell values of a raster at specified points into a new feature class", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.values_at_points", "ValuesAtPointsRasterTool", {"label": "Values at Points", "description": "Retrieves the values of rasters at specified points...", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.zonal_stats_as_table", "ZonalStatisticsAsTableTool", {"label": "Zonal Statistics As Table", "description": "Calculate zonal statistics and report into a table", "can_run_background": "True", "category": "Raster"}),
+                ("tools.raster.zonal_counts", "ZonalCountsRasterTool", {"label": "Zonal Counts", "description": "Counts the cells of each value in zones and reports into a table", "can_run_background": "True", "category": "Raster"})]
+
+metadata_tools = [("tools.metadata.create_tips", "CreateTipsTableMetadataTool", {"label": "Create Tips Table", "description": "Create a table of tips from a tip file template", "can_run_background": "False", "category": "Metadata"}),
+                  ("tools.metadata.import_tips", "ImportTipFilesToTableMetadataTool", {"label": "Import Tip Files to Table", "description": "Create a table of tips from existing tip files", "can_run_background": "False", "category": "Metadata"}),
+                  ("tools.metadata.export_tips", "ExportTipsToFileMetadataTool", {"label": "Export tips", "description": "Exports tips...", "can_run_background": "False", "category": "Metadata"}),
+                  ("tools.metadata.export_xml", "ExportXmlMetadataTool", {"label": "Export Metadata", "description": "Exports data source metadata to xml/html", "can_run_background": "False", "category": "Metadata"})]
+
+cdf_tools = [("tools.cdf.search_cdf", "SearchCdfTool", {"label": "Search", "description": "Search for CDF files", "can_run_background": "True", "category": "NetCDF"}),
+             ("tools.cdf.describe_cdf", "DescribeCdfTool", {"label": "Describe", "description": "Describe a CDF file", "can_run_background": "True", "category": "NetCDF"}),
+             # ("tools.cdf.to_standard_grid", "ToStandardGridCdfTool", {"label": "To Standard Grid", "description": "Exports CDF files with a standard grid", "can_run_background": "True", "category": "NetCDF"}),
+             ("tools.cdf.extract_timeslices", "ExtractTimeslicesCdfTool", {"label": "Extract Timeslices", "description": "Extracts timeslices from CDF files", "can_run_background": "True", "category": "NetCDF"}),
+             # ("tools.cdf.export_cdf", "ExportCdfTool", {"label": "Export CDF", "description": "Exports a CDF file to another format", "can_run_background": "True", "category": "NetCDF"}),
+             ]
+
+registered_tools = geodata_tools + feature_tools + raster_tools + metadata_tools + cdf_tools
+
+_lazy_classes = {}
+
+
+def load_tool(module_name, class_name):
+    """ Import a tool module and return the real tool class
+
+    Args:
+        module_name: Dotted path of the module implementing the tool
+        class_name: Name of the tool class in that module
+
+    Returns:
+        The tool class
+
+    """
+
+    return getattr(import_module(module_name), class_name)
+
+
+class LazyTool(object):
+    """ Stands in for a tool, importing it only when its parameters are needed or it is run
+    """
+
+    tool_module = None
+    tool_settings = {}
+
+    def __init__(self):
+        """ Set the attributes ArcGIS reads from every tool when it loads the toolbox
+
+        Returns:
+
+        """
+
+        self.label = self.tool_settings.get("label", "label not set")
+        self.description = self.tool_settings.get("description", "description not set")
+        self.canRunInBackground = self.tool_settings.get("can_run_background", False)
+        self.category = self.tool_settings.get("category", False)
+
+        self.tool = None
+
+        return
+
+    def real_tool(self):
+        """ The real tool, imported and instantiated on first use
+
+        Returns:
+            The tool instance
+
+        """
+
+        if self.tool is None:
+            self.tool = load_tool(self.tool_module, type(self).__name__)()
+
+        return self.tool
+
+    def getParameterInfo(self):
+        """ See ESRI docs
+
+        Returns:
+
+        """
+
+        return self.real_tool().getParameterInfo()
+
+    def isLicensed(self):
+        """ See ESRI docs
+
+        Returns:
+
+        """
+
+        return True
+
+    def updateParameters(self, parameters):
+        """ See ESRI docs
+
+        Args:
+            parameters:
+
+        Returns:
+
+        """
+
+        return self.real_tool().updateParameters(parameters)
+
+    def updateMessages(self, parameters):
+        """ See ESRI docs, only some tools validate their messages
+
+        Args:
+            parameters:
+
+        Returns:
+
+        """
+
+        update_messages = getattr(self.real_tool(), "updateMessages", None)
+
+        return update_messages(parameters) if update_messages else None
+
+    def execute(self, parameters, messages):
+        """ See ESRI docs
+
+        Args:
+            parameters:
+            messages:
+
+        Returns:
+
+        """
+
+        return self.real_tool().execute(parameters, messages)
+
+
+def lazy_tool(module_name, class_name, settings):
+    """ Make a stand-in class for a tool
+
+    The stand-in carries the real class name, which is what ArcGIS uses to name
+    the tool and find its '.pyt.xml' documentation.
+
+    Args:
+        module_name: Dotted path of the module implementing the tool
+        class_name: Name of the tool class in that module
+        settings: The tool's label, description, can_run_background and category
+
+    Returns:
+        The stand-in class, a LazyTool
+
+    """
+
+    key = (module_name, class_name)
+
+    if key not in _lazy_classes:
+        _lazy_classes[key] = type(class_name, (LazyTool,), {"__doc__": "Deferred '{}.{}'".format(module_name, class_name),
+                                                            "tool_module": module_name,
+                                                            "tool_settings": settings})
+
+    return _lazy_classes[key]
+
+
+def toolbox_tools():
+    """ The stand-in classes for every registered tool
+
+    Returns:
+        A list of classes suitable for Toolbox.tools
+
+    """
+
+    return [lazy_tool(m, c, settings) for m, c, settings in registered_tools]
+
+
+def find_tool(name):
+    """ Look up a registered tool by class name
+
+    Args:
+        name: The tool class name, e.g. 'CopyRasterTool'
+
+    Returns:
+        The real tool class
+
+    """
+
+    for m, c, settings in registered_tools:
+        if c == name:
+            return load_tool(m, c)
+
+    raise ValueError("Tool '{}' is not registered".format(name))